@@ -1,4 +1,5 @@
 # Author: Prashant Srivastava
+import asyncio
 import json
 import logging
 
@@ -13,7 +14,9 @@ from telegram.ext import filters
 from telegram.ext import InvalidCallbackData
 from telegram.ext import MessageHandler
 
+from src.clients.async_client_manager import SyncClientAdapter
 from src.clients.client_5paisa import Client
+from src.clients.rate_limiter import RateLimitedClient, RequestScheduler
 
 
 logging.basicConfig(
@@ -27,13 +30,17 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 with open("creds.json", encoding="utf8") as cred_fh:
     cred = json.load(cred_fh)
 API_TOKEN = cred["telegram_token"]
-client = Client(cred_file="creds.json")
-client.login()
+# The bot polls in the background, keep it within the broker rate limits.
+# Broker calls run on the adapter's thread pool, off the bot's event loop
+client = SyncClientAdapter(
+    RateLimitedClient(Client(cred_file="creds.json").login(), RequestScheduler())
+)
 
 
-def get_update_from_client():
-    tags = client.get_todays_tags()
-    order_book = client.order_book()
+async def get_update_from_client():
+    tags, order_book = await asyncio.gather(
+        client.get_todays_tags(), client.order_book()
+    )
     info = ""
     for item in order_book:
         if item["RemoteOrderID"] in tags:
@@ -48,7 +55,7 @@ def get_update_from_client():
 
 async def send_updates(update: Update, _context: ContextTypes.DEFAULT_TYPE) -> None:
     # Replace these with actual updates from client - sample only
-    info = get_update_from_client()
+    info = await get_update_from_client()
     overall_pnl_button = InlineKeyboardButton(
         "Overall PnL", callback_data="overall_pnl"
     )
@@ -67,14 +74,14 @@ async def send_updates(update: Update, _context: ContextTypes.DEFAULT_TYPE) -> N
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if query.data == "overall_pnl":
-        total_pnl, _ = get_pnl_text()
+        total_pnl, _ = await get_pnl_text()
         await query.answer(text="Fetching overall PnL...")
         # Replace with actual overall PnL calculation and send the result
         await context.bot.send_message(
             chat_id=query.message.chat_id, text=f"Overall PnL: {total_pnl:.2f} INR "
         )
     elif query.data == "individual_pnl":
-        _, individual_pnl = get_pnl_text()
+        _, individual_pnl = await get_pnl_text()
         await query.answer(text="Fetching individual PnL...")
         # Replace with actual individual PnL calculation and send the result
         await context.bot.send_message(
@@ -142,8 +149,8 @@ async def handle_invalid_button(
     )
 
 
-def get_pnl_text():
-    positions = client.get_pnl_summary()
+async def get_pnl_text():
+    positions = await client.get_pnl_summary()
     total = 0.0
     individual_pnl = ""
     if positions:
@@ -159,7 +166,7 @@ def get_pnl_text():
 async def send_pnl_update(context: ContextTypes.DEFAULT_TYPE) -> None:
     # Replace with actual PnL calculations from client
     job = context.job
-    total_pnl, individual_pnl = get_pnl_text()
+    total_pnl, individual_pnl = await get_pnl_text()
     pnl_message = (
         f"Overall MTM: {total_pnl} INR\nIndividual Legs MTM:\n{individual_pnl}"
     )
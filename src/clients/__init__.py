@@ -6,3 +6,9 @@ from . import client_zerodha
 from . import client_fyers
 from . import client_shoonya
 from . import log_decorator
+from . import response_cache
+from . import http_transport
+from . import rate_limiter
+from . import async_client_manager
+from . import async_client_dummy
+from . import client_paper
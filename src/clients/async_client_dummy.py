@@ -0,0 +1,221 @@
+# Author: Prashant Srivastava
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import List
+
+import websockets
+
+from .async_client_manager import AsyncClientManager
+
+
+# asyncio flavour of client_dummy. Orders are kept in memory instead of MongoDB,
+# entry orders fill at once, stop loss orders (StopLossPrice set) stay pending
+# until cancelled. Fills are announced to the simulator feed server like the
+# blocking dummy does, when one is listening.
+# pylint: disable=too-many-public-methods
+class Client(AsyncClientManager):
+    def __init__(self, latency: float = 0.0, notify_feed: bool = True):
+        self.host = "localhost"
+        self.port = 8765
+        self.logger = logging.getLogger(__name__)
+        # simulated round trip of every call in seconds
+        self.latency = latency
+        self.notify_feed = notify_feed
+        self.exch_order_ids = itertools.count(int(time.time()) * 1000)
+        self.orders = []
+        self.lock = asyncio.Lock()
+        self.web_sock = None
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency)
+
+    async def _notify(self, order):
+        if not self.notify_feed:
+            return
+        try:
+            if self.web_sock is None:
+                self.web_sock = await websockets.connect(self.get_feed_url())
+            await self.web_sock.send(
+                json.dumps(
+                    {
+                        "placed": order["ScripCode"],
+                        "Price": order["Rate"],
+                        "Qty": order["Qty"],
+                        "RemoteOrderID": order["RemoteOrderID"],
+                    }
+                )
+            )
+        except (OSError, websockets.exceptions.WebSocketException) as exp:
+            self.logger.debug("No feed server to notify: %s", exp)
+            self.notify_feed = False
+
+    async def login(self):
+        return self
+
+    def get_feed_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    # pylint: disable=invalid-name
+    def Request_Feed(self, _method: str, operation: str, req_list: List):
+        return {"Method": "mf", "Operation": operation, "MarketFeedData": req_list}
+
+    async def place_order(self, **order):
+        await self._round_trip()
+        tag = order.get("RemoteOrderID", order.get("RemoteOrderId", ""))
+        is_sl = order.get("StopLossPrice", 0.0) > 0
+        record = {
+            "ExchOrderID": next(self.exch_order_ids),
+            "RemoteOrderID": tag,
+            "ScripCode": order["ScripCode"],
+            "Qty": order["Qty"],
+            "Rate": order["Price"],
+            "BuySell": order["OrderType"],
+            "DelvIntra": "I" if order.get("IsIntraday", True) else "D",
+            "ExchType": order["ExchangeType"],
+            "ScripName": "Dummy",
+            "Status": "Pending" if is_sl else "Fully Executed",
+            "PendingQty": order["Qty"] if is_sl else 0,
+        }
+        async with self.lock:
+            self.orders.append(record)
+        if not is_sl:
+            await self._notify(record)
+        return {"Message": "Success", "ExchOrderID": record["ExchOrderID"]}
+
+    async def fetch_order_status(self, req_list: List):
+        await self._round_trip()
+        tags = {req.get("RemoteOrderID", req.get("RemoteOrderId")) for req in req_list}
+        return {
+            "OrdStatusResLst": [
+                {
+                    "ExchOrderID": order["ExchOrderID"],
+                    "RemoteOrderID": order["RemoteOrderID"],
+                    "ScripCode": order["ScripCode"],
+                    "Status": order["Status"],
+                    "PendingQty": order["PendingQty"],
+                    "OrderQty": order["Qty"],
+                    "OrderRate": order["Rate"],
+                }
+                for order in self.orders
+                if order["RemoteOrderID"] in tags
+            ]
+        }
+
+    async def modify_order(self, **order):
+        await self._round_trip()
+        async with self.lock:
+            for record in self.orders:
+                if record["ExchOrderID"] == int(order["ExchOrderID"]):
+                    record["Rate"] = order.get("Price", record["Rate"])
+                    return {"Message": "Success"}
+        return {"Message": "Order not found"}
+
+    async def cancel_order(self, **order):
+        return await self.cancel_bulk_order([order])
+
+    async def get_tradebook(self):
+        await self._round_trip()
+        return {
+            "TradeBookDetail": [
+                {
+                    "ExchOrderID": str(order["ExchOrderID"]),
+                    "ScripCode": order["ScripCode"],
+                    "Qty": order["Qty"],
+                    "Rate": order["Rate"],
+                    "BuySell": order["BuySell"],
+                    "ExchType": order["ExchType"],
+                    "DelvIntra": order["DelvIntra"],
+                    "ScripName": order["ScripName"],
+                }
+                for order in self.orders
+                if order["Status"] == "Fully Executed"
+            ]
+        }
+
+    async def order_book(self):
+        await self._round_trip()
+        return [
+            {
+                "ExchOrderID": order["ExchOrderID"],
+                "RemoteOrderID": order["RemoteOrderID"],
+                "ScripCode": order["ScripCode"],
+                "ScripName": order["ScripName"],
+                "BuySell": order["BuySell"],
+                "Qty": order["Qty"],
+                "AveragePrice": order["Rate"],
+                "OrderStatus": order["Status"],
+            }
+            for order in self.orders
+        ]
+
+    async def positions(self):
+        await self._round_trip()
+        return []
+
+    async def cancel_bulk_order(self, exch_order_ids: List):
+        await self._round_trip()
+        ids = {int(item["ExchOrderID"]) for item in exch_order_ids}
+        async with self.lock:
+            for record in self.orders:
+                if record["ExchOrderID"] in ids and record["Status"] == "Pending":
+                    record["Status"] = "Cancelled"
+                    record["PendingQty"] = 0
+        return {"Message": "Success"}
+
+    async def get_option_chain(self, exch: str, symbol: str, expire: int):
+        await self._round_trip()
+        return {
+            "Options": [
+                {
+                    "LastRate": 8.5,
+                    "ScripCode": 201945003,
+                    "Name": "NIFTY23AUG19600CE",
+                    "CPType": "CE",
+                    "StrikeRate": 19600.0,
+                },
+                {
+                    "LastRate": 8.1,
+                    "ScripCode": 301945003,
+                    "Name": "NIFTY23AUG19100PE",
+                    "CPType": "PE",
+                    "StrikeRate": 19100.0,
+                },
+            ]
+        }
+
+    async def get_expiry(self, exch: str, symbol: str):
+        await self._round_trip()
+        return {"Expiry": []}
+
+    async def get_pnl_summary(self, tag: str = None):
+        await self._round_trip()
+        return []
+
+    async def get_todays_tags(self):
+        await self._round_trip()
+        return list(dict.fromkeys(order["RemoteOrderID"] for order in self.orders))
+
+    async def fetch_market_depth(self, req_list: List):
+        await self._round_trip()
+        return {"Data": []}
+
+    # pylint: disable=too-many-arguments
+    async def historical_data(
+        self,
+        exch: str,
+        exchange_segment: str,
+        scrip_code: int,
+        time_val: str,
+        from_val: str,
+        to_val: str,
+    ):
+        await self._round_trip()
+        return {}
+
+    async def close(self) -> None:
+        if self.web_sock is not None:
+            await self.web_sock.close()
+            self.web_sock = None
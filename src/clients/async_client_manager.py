@@ -0,0 +1,211 @@
+# Author: Prashant Srivastava
+import asyncio
+import functools
+from abc import ABC
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from . import iclientmanager
+
+
+# Awaitable counterpart of IClientManager for the order, book, chain, depth
+# and history calls, for asyncio code (AsyncLiveFeedManager, the bot) that must
+# not block its event loop on broker round trips.
+# Same arguments and same response shapes as the blocking interface.
+# pylint: disable=too-many-public-methods
+class AsyncClientManager(ABC):
+    @abstractmethod
+    async def login(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_option_chain(self, exch: str, symbol: str, expire: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_expiry(self, exch: str, symbol: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def place_order(self, **order):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_order_status(self, req_list: List):
+        raise NotImplementedError
+
+    # See IClientManager.fetch_order_status_by_tags
+    async def fetch_order_status_by_tags(self, tags: List[str]) -> Dict[str, List]:
+        if not tags:
+            return {}
+        orders = iclientmanager.status_rows(
+            await self.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": tag} for tag in dict.fromkeys(tags)]
+            )
+        )
+        by_tag = iclientmanager.split_order_status(tags, orders)
+        if by_tag is None:
+            by_tag = iclientmanager.split_order_status(
+                tags, orders, await self.order_book()
+            )
+        if by_tag is None:
+            by_tag = {
+                tag: iclientmanager.status_rows(
+                    await self.fetch_order_status([{"Exch": "N", "RemoteOrderID": tag}])
+                )
+                for tag in tags
+            }
+        return by_tag
+
+    @abstractmethod
+    async def modify_order(self, **order):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cancel_order(self, **order):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_tradebook(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def order_book(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def positions(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cancel_bulk_order(self, exch_order_ids: List):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_pnl_summary(self, tag: str = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_todays_tags(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_market_depth(self, req_list: List):
+        raise NotImplementedError
+
+    @abstractmethod
+    # pylint: disable=too-many-arguments
+    async def historical_data(
+        self,
+        exch: str,
+        exchange_segment: str,
+        scrip_code: int,
+        time_val: str,
+        from_val: str,
+        to_val: str,
+    ):
+        raise NotImplementedError
+
+    # Websocket url of the market feed, see AsyncLiveFeedManager
+    def get_feed_url(self) -> str:
+        raise NotImplementedError
+
+    # pylint: disable=invalid-name
+    def Request_Feed(self, method: str, operation: str, req_list: List):
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+# Runs any blocking IClientManager on a bounded thread pool, so at most
+# max_workers broker calls are in flight and the event loop never blocks.
+class SyncClientAdapter(AsyncClientManager):
+    def __init__(self, client: iclientmanager.IClientManager, max_workers: int = 4):
+        self.client = client
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="broker"
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def login(self):
+        await self._run(self.client.login)
+        return self
+
+    async def get_option_chain(self, exch: str, symbol: str, expire: int):
+        return await self._run(self.client.get_option_chain, exch, symbol, expire)
+
+    async def get_expiry(self, exch: str, symbol: str):
+        return await self._run(self.client.get_expiry, exch, symbol)
+
+    async def place_order(self, **order):
+        return await self._run(self.client.place_order, **order)
+
+    async def fetch_order_status(self, req_list: List):
+        return await self._run(self.client.fetch_order_status, req_list)
+
+    async def fetch_order_status_by_tags(self, tags: List[str]) -> Dict[str, List]:
+        return await self._run(self.client.fetch_order_status_by_tags, tags)
+
+    async def modify_order(self, **order):
+        return await self._run(self.client.modify_order, **order)
+
+    async def cancel_order(self, **order):
+        return await self._run(self.client.cancel_order, **order)
+
+    async def get_tradebook(self):
+        return await self._run(self.client.get_tradebook)
+
+    async def order_book(self):
+        return await self._run(self.client.order_book)
+
+    async def positions(self):
+        return await self._run(self.client.positions)
+
+    async def cancel_bulk_order(self, exch_order_ids: List):
+        return await self._run(self.client.cancel_bulk_order, exch_order_ids)
+
+    async def get_pnl_summary(self, tag: str = None):
+        return await self._run(self.client.get_pnl_summary, tag)
+
+    async def get_todays_tags(self):
+        return await self._run(self.client.get_todays_tags)
+
+    async def fetch_market_depth(self, req_list: List):
+        return await self._run(self.client.fetch_market_depth, req_list)
+
+    # pylint: disable=too-many-arguments
+    async def historical_data(
+        self,
+        exch: str,
+        exchange_segment: str,
+        scrip_code: int,
+        time_val: str,
+        from_val: str,
+        to_val: str,
+    ):
+        return await self._run(
+            self.client.historical_data,
+            exch,
+            exchange_segment,
+            scrip_code,
+            time_val,
+            from_val,
+            to_val,
+        )
+
+    def get_feed_url(self) -> str:
+        return self.client.get_feed_url()
+
+    # pylint: disable=invalid-name
+    def Request_Feed(self, method: str, operation: str, req_list: List):
+        return self.client.Request_Feed(method, operation, req_list)
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False)
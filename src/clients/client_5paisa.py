@@ -8,9 +8,13 @@ from typing import Dict, List
 
 import pyotp
 import redis
+import requests
 from py5paisa import FivePaisaClient
 
+from src.common.trade_book_index import TradeBookIndex
 from . import iclientmanager
+from .http_transport import PooledSession
+from .response_cache import cached_read, invalidates_reads
 from .log_decorator import log_function_call
 
 
@@ -19,15 +23,25 @@ class Client(iclientmanager.IClientManager):
     ACCESS_TOKEN_KEY = "access_token_5paisa"
 
     # implement all the abstract methods here
-    def __init__(self, cred_file: str = "creds.json"):
+    # session: HTTP session used for every REST call of the SDK, by default a
+    # PooledSession built from http_config (see http_transport.PooledSession)
+    def __init__(
+        self,
+        cred_file: str = "creds.json",
+        session: requests.Session = None,
+        http_config: Dict = None,
+    ):
         with open(cred_file, encoding="utf-8") as cred_fh:
             self.cred = json.load(cred_fh)
         self._client = None
+        self.session = session if session is not None else PooledSession(http_config)
 
     # @override - @TODO: Move redis to base class
     def login(self):
         logger = logging.getLogger(__name__)
         self._client = FivePaisaClient(self.cred)
+        # py5paisa sends all its REST calls through its session attribute
+        self._client.session = self.session
         try:
             redis_client = redis.Redis()
             access_token = redis_client.get(Client.ACCESS_TOKEN_KEY)
@@ -54,6 +68,12 @@ class Client(iclientmanager.IClientManager):
                 pass
         return self
 
+    # Per endpoint latency histograms, available with a PooledSession
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        if isinstance(self.session, PooledSession):
+            return self.session.get_latency_stats()
+        return {}
+
     # @override
     def get_option_chain(self, exch: str, symbol: str, expire: int):
         return self._client.get_option_chain(exch, symbol, expire)
@@ -64,28 +84,34 @@ class Client(iclientmanager.IClientManager):
 
     # @override
     @log_function_call
+    @invalidates_reads
     def place_order(self, **order):
         return self._client.place_order(**order)
 
     # @override
+    @cached_read
     def fetch_order_status(self, req_list: List):
         return self._client.fetch_order_status(req_list)
 
     # @override
     @log_function_call
+    @invalidates_reads
     def modify_order(self, **order):
         return self._client.modify_order(**order)
 
     # @override
     @log_function_call
+    @invalidates_reads
     def cancel_order(self, **order):
         return self._client.cancel_order(**order)
 
     # @override
+    @cached_read
     def get_tradebook(self):
         return self._client.get_tradebook()
 
     # @override
+    @cached_read
     def order_book(self):
         return self._client.order_book()
 
@@ -95,6 +121,7 @@ class Client(iclientmanager.IClientManager):
 
     # @override
     @log_function_call
+    @invalidates_reads
     def cancel_bulk_order(self, exch_order_ids: List):
         return self._client.cancel_bulk_order(exch_order_ids)
 
@@ -126,21 +153,31 @@ class Client(iclientmanager.IClientManager):
             return self._client.ws.send(json.dumps(wspayload))
         return None
 
+    # @override
+    def get_feed_url(self) -> str:
+        # Same url py5paisa builds in FivePaisaClient.connect
+        return (
+            "wss://openfeed.5paisa.com/Feeds/api/chat?"
+            f"Value1={self._client.Jwt_token}|{self._client.client_code}"
+        )
+
     # @override
     def get_pnl_summary(self, tag: str = None):
         if not tag:
             tags = self.get_todays_tags()
         else:
             tags = [tag]
-        order_status = self._client.fetch_order_status(
-            [{"Exch": "N", "RemoteOrderID": tag} for tag in tags]
-        )["OrdStatusResLst"]
+        order_status = [
+            order
+            for orders in self.fetch_order_status_by_tags(tags).values()
+            for order in orders
+        ]
         exch_order_ids = [
-            int(x["ExchOrderID"])
+            x["ExchOrderID"]
             for x in order_status
             if x["PendingQty"] == 0 and x["Status"] == "Fully Executed"
         ]
-        trade_book = self._client.get_tradebook()["TradeBookDetail"]
+        trade_book = TradeBookIndex(self.get_tradebook()["TradeBookDetail"])
         matching_orders = [
             {
                 "ExchOrderID": trade["ExchOrderID"],
@@ -152,8 +189,7 @@ class Client(iclientmanager.IClientManager):
                 "LastTradedPrice": None,
                 "Pnl": None,
             }
-            for trade in trade_book
-            if int(trade["ExchOrderID"]) in exch_order_ids
+            for trade in trade_book.for_exch_orders(exch_order_ids)
         ]
 
         request_prices = list(
@@ -180,7 +216,7 @@ class Client(iclientmanager.IClientManager):
 
     # @override
     def get_todays_tags(self):
-        order_book = self._client.order_book()
+        order_book = self.order_book()
         tags = []
         for order in order_book:
             if "RemoteOrderID" not in order:
@@ -6,6 +6,7 @@ import websocket
 from pymongo import MongoClient
 
 from . import iclientmanager
+from .response_cache import cached_read, invalidates_reads
 
 
 # pylint: disable=too-many-public-methods
@@ -54,6 +55,9 @@ class Client(iclientmanager.IClientManager):
         except Exception as e:
             self.logger.error(e)
 
+    def get_feed_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
     def send_data(self, wspayload: any):
         try:
             self.web_sock.send(json.dumps(wspayload))
@@ -79,6 +83,7 @@ class Client(iclientmanager.IClientManager):
         except Exception as exp:
             self.logger.error(exp)
 
+    @invalidates_reads
     def place_order(self, **order):
         # Send the order placed message after 1 second
         time.sleep(1)
@@ -112,6 +117,7 @@ class Client(iclientmanager.IClientManager):
             )
         return {"Message": "Success"}
 
+    @cached_read
     def fetch_order_status(self, req_list: list):
         response = {"OrdStatusResLst": []}
         # find the order in the database with each items in req_list matching
@@ -125,12 +131,15 @@ class Client(iclientmanager.IClientManager):
                 response["OrdStatusResLst"].append(order)
         return response
 
+    @invalidates_reads
     def modify_order(self, **order):
         self.logger.info("modify_order %s", order)
 
+    @invalidates_reads
     def cancel_order(self, **order):
         self.logger.info("cancel_order %s", order)
 
+    @cached_read
     def get_tradebook(self):
         response = {"TradeBookDetail": []}
         # find all orders in the database with status "Fully Executed"
@@ -138,16 +147,19 @@ class Client(iclientmanager.IClientManager):
             response["TradeBookDetail"].append(order)
         return response
 
+    @cached_read
     def order_book(self):
-        response = self.get_tradebook()["TradeBookDetail"]
-        # add "OrderStatus" same as "Status"
-        for order in response:
-            order["OrderStatus"] = order["Status"]
-        return response
+        # add "OrderStatus" same as "Status", on copies: the trade book rows
+        # are the cached get_tradebook response
+        return [
+            dict(order, OrderStatus=order["Status"])
+            for order in self.get_tradebook()["TradeBookDetail"]
+        ]
 
     def positions(self):
         self.logger.info("positions")
 
+    @invalidates_reads
     def cancel_bulk_order(self, exch_order_ids: list):
         # update the database with status "Cancelled" for each ExchOrderID in
         # ExchOrderIDs
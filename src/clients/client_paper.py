@@ -0,0 +1,463 @@
+# Author: Prashant Srivastava
+import datetime
+import itertools
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+from . import iclientmanager
+
+
+# In-process paper broker: orders are matched against the ticks pushed in
+# (simulated or recorded, 5paisa feed format) instead of a MongoDB round trip,
+# and the order updates and subscribed ticks are served to LiveFeedManager
+# through connect/receive_data without a websocket.
+# Stores are indexed by ExchOrderID, by tag and open orders by scrip, so a tick
+# only looks at the open orders of its own scrip.
+# Order rules:
+#   Price 0 is a market order, else a limit order filled when marketable
+#   StopLossPrice > 0 is a stop, triggered when the last price crosses it
+#   (>= for buy, <= for sell) and then handled as the limit order at Price
+#   An order can fill only on ticks at or after its arrival time (placed
+#   time + latency)
+# Config keys:
+#   latency            seconds from place_order to the exchange (default 0)
+#   latency_jitter     extra uniform random latency in seconds (default 0)
+#   slippage_ticks     ticks of slippage against the trader on fills (default 0)
+#   slippage_pct       slippage against the trader in percent of price (default 0)
+#   tick_size          default 0.05
+#   fill_without_tick  fill limit orders at their price when the scrip has
+#                      not ticked yet (default True, like client_dummy)
+#   seed               seed of the latency jitter
+# pylint: disable=too-many-public-methods,too-many-instance-attributes
+class Client(iclientmanager.IClientManager):
+    def __init__(self, config: Dict = None, clock: Callable[[], float] = time.time):
+        config = config if isinstance(config, dict) else {}
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+        self.latency = config.get("latency", 0.0)
+        self.latency_jitter = config.get("latency_jitter", 0.0)
+        self.slippage_ticks = config.get("slippage_ticks", 0)
+        self.slippage_pct = config.get("slippage_pct", 0.0)
+        self.tick_size = config.get("tick_size", 0.05)
+        self.fill_without_tick = config.get("fill_without_tick", True)
+        self.random = random.Random(config.get("seed"))
+
+        self.lock = threading.RLock()
+        self.exch_order_ids = itertools.count(int(clock()) * 1000)
+        self.orders: Dict[int, Dict] = {}
+        self.orders_by_tag: Dict[str, List[int]] = {}
+        self.open_by_scrip: Dict[int, Dict[int, Dict]] = {}
+        self.trades: List[Dict] = []
+        self.last_price: Dict[int, float] = {}
+        self.scrip_names: Dict[int, str] = {}
+
+        # In-process feed
+        self.subscribed = set()
+        self.feed_queue = None
+        self.on_error = None
+
+    def login(self):
+        return self
+
+    ## Order entry
+
+    def _arrival_time(self) -> float:
+        latency = self.latency
+        if self.latency_jitter:
+            latency += self.random.uniform(0.0, self.latency_jitter)
+        return self.clock() + latency
+
+    def place_order(self, **order):
+        tag = order.get("RemoteOrderID", order.get("RemoteOrderId", ""))
+        code = order["ScripCode"]
+        with self.lock:
+            exch_order_id = next(self.exch_order_ids)
+            record = {
+                "ExchOrderID": exch_order_id,
+                "RemoteOrderID": tag,
+                "ScripCode": code,
+                "ScripName": self.scrip_names.get(code, str(code)),
+                "BuySell": order["OrderType"],
+                "Exch": order.get("Exchange", "N"),
+                "ExchType": order.get("ExchangeType", "D"),
+                "DelvIntra": "I" if order.get("IsIntraday", True) else "D",
+                "Qty": order["Qty"],
+                "Price": order["Price"],
+                "StopLossPrice": order.get("StopLossPrice", 0.0),
+                "Triggered": order.get("StopLossPrice", 0.0) <= 0,
+                "Status": "Pending",
+                "PendingQty": order["Qty"],
+                "AveragePrice": 0.0,
+                "ArrivalTime": self._arrival_time(),
+            }
+            self.orders[exch_order_id] = record
+            self.orders_by_tag.setdefault(tag, []).append(exch_order_id)
+            self.open_by_scrip.setdefault(code, {})[exch_order_id] = record
+            if record["ArrivalTime"] <= self.clock():
+                self._match(record, self.last_price.get(code), self.clock())
+        return {"Message": "Success", "ExchOrderID": exch_order_id}
+
+    def modify_order(self, **order):
+        with self.lock:
+            record = self.orders.get(int(order["ExchOrderID"]))
+            if record is None or record["Status"] != "Pending":
+                return {"Message": "Order not found or not pending"}
+            record["Price"] = order.get("Price", record["Price"])
+            if "StopLossPrice" in order:
+                record["StopLossPrice"] = order["StopLossPrice"]
+                record["Triggered"] = order["StopLossPrice"] <= 0
+            if "Qty" in order:
+                record["Qty"] = record["PendingQty"] = order["Qty"]
+            code = record["ScripCode"]
+            if record["ArrivalTime"] <= self.clock():
+                self._match(record, self.last_price.get(code), self.clock())
+        return {"Message": "Success"}
+
+    def cancel_order(self, **order):
+        return self.cancel_bulk_order([order])
+
+    def cancel_bulk_order(self, exch_order_ids: List):
+        with self.lock:
+            for item in exch_order_ids:
+                record = self.orders.get(int(item["ExchOrderID"]))
+                if record is None or record["Status"] != "Pending":
+                    continue
+                record["Status"] = "Cancelled"
+                record["PendingQty"] = 0
+                del self.open_by_scrip[record["ScripCode"]][record["ExchOrderID"]]
+                self._publish(self._order_message(record))
+        return {"Message": "Success"}
+
+    ## Matching
+
+    def _slipped(self, side: str, price: float) -> float:
+        slippage = self.slippage_ticks * self.tick_size
+        slippage += price * self.slippage_pct / 100.0
+        price = price + slippage if side == "B" else price - slippage
+        return round(round(price / self.tick_size) * self.tick_size, 2)
+
+    # Under the lock: fills record if price makes it marketable. price is the
+    # last traded price, None when the scrip has not ticked yet
+    def _match(self, record: Dict, price: float, now: float) -> bool:
+        side = record["BuySell"]
+        limit = record["Price"]
+        if price is None:
+            if not self.fill_without_tick or limit <= 0 or not record["Triggered"]:
+                return False
+            price = limit
+        if not record["Triggered"]:
+            trigger = record["StopLossPrice"]
+            if (side == "B" and price < trigger) or (side == "S" and price > trigger):
+                return False
+            record["Triggered"] = True
+            self._publish(dict(self._order_message(record), Status="SL Triggered"))
+        fill = self._slipped(side, price)
+        if limit > 0:
+            if (side == "B" and price > limit) or (side == "S" and price < limit):
+                return False
+            # slippage never crosses the limit price
+            fill = min(fill, limit) if side == "B" else max(fill, limit)
+        self._fill(record, fill, now)
+        return True
+
+    def _fill(self, record: Dict, price: float, now: float) -> None:
+        record["Status"] = "Fully Executed"
+        record["PendingQty"] = 0
+        record["AveragePrice"] = price
+        del self.open_by_scrip[record["ScripCode"]][record["ExchOrderID"]]
+        self.trades.append(
+            {
+                "ExchOrderID": str(record["ExchOrderID"]),
+                "ScripCode": record["ScripCode"],
+                "ScripName": record["ScripName"],
+                "Qty": record["Qty"],
+                "Rate": price,
+                "BuySell": record["BuySell"],
+                "Exch": record["Exch"],
+                "ExchType": record["ExchType"],
+                "DelvIntra": record["DelvIntra"],
+                "TradeTime": now,
+            }
+        )
+        self._publish(self._order_message(record))
+
+    ## Ticks
+
+    def set_scrip_names(self, names: Dict[int, str]) -> None:
+        self.scrip_names.update(names)
+
+    # tick in the 5paisa feed format: Token, LastRate and optionally TickDt,
+    # as produced by simulator.feeds or recorded. Its time is tick_time, else
+    # TickDt, else the clock
+    def feed_tick(self, tick: Dict, tick_time: float = None) -> None:
+        code = tick["Token"]
+        price = tick["LastRate"]
+        now = tick_time
+        if now is None:
+            tick_dt = tick.get("TickDt")
+            now = int(tick_dt[6:-2]) / 1000 if tick_dt else self.clock()
+        with self.lock:
+            self.match_price(code, price, now)
+            if code in self.subscribed:
+                self._publish(tick)
+
+    # Matches the open orders of code against a trade at price, without
+    # publishing a tick (backtests feed the strategies themselves)
+    def match_price(self, code: int, price: float, now: float) -> None:
+        with self.lock:
+            self.last_price[code] = price
+            open_orders = self.open_by_scrip.get(code)
+            if open_orders:
+                for record in list(open_orders.values()):
+                    if record["ArrivalTime"] <= now:
+                        self._match(record, price, now)
+
+    def push_price(self, code: int, price: float, tick_time: float = None) -> None:
+        tick_time = self.clock() if tick_time is None else tick_time
+        self.feed_tick(
+            {
+                "Exch": "N",
+                "ExchType": "D",
+                "Token": code,
+                "LastRate": price,
+                "LastQty": 0,
+                "TotalQty": 0,
+                "High": price,
+                "Low": price,
+                "OpenRate": price,
+                "PClose": price,
+                "AvgRate": price,
+                "Time": int(tick_time),
+                "TickDt": f"/Date({int(tick_time * 1000)})/",
+                "ChgPcnt": 0.0,
+            },
+            tick_time,
+        )
+
+    # Feeds recorded ticks in order. speed 0 replays as fast as possible, else
+    # the gaps between tick times are slept, divided by speed
+    def replay(self, ticks: Iterable[Dict], speed: float = 0.0) -> int:
+        count = 0
+        last_time = None
+        for tick in ticks:
+            if speed > 0 and "TickDt" in tick:
+                tick_time = int(tick["TickDt"][6:-2]) / 1000
+                if last_time is not None and tick_time > last_time:
+                    time.sleep((tick_time - last_time) / speed)
+                last_time = tick_time
+            self.feed_tick(tick)
+            count += 1
+        return count
+
+    ## In-process feed, see LiveFeedManager
+
+    def _order_message(self, record: Dict) -> Dict:
+        return {
+            "Status": record["Status"],
+            "ScripCode": record["ScripCode"],
+            "ExchOrderID": record["ExchOrderID"],
+            "RemoteOrderId": record["RemoteOrderID"],
+            "BuySell": record["BuySell"],
+            "Qty": record["Qty"],
+            "Price": record["AveragePrice"] or record["Price"],
+        }
+
+    def _publish(self, message: Dict) -> None:
+        if self.feed_queue is not None:
+            self.feed_queue.put(json.dumps([message]))
+
+    # pylint: disable=invalid-name
+    def Request_Feed(self, _method: str, operation: str, req_list: List):
+        return {"Method": "mf", "Operation": operation, "MarketFeedData": req_list}
+
+    def connect(self, wspayload: Dict):
+        with self.lock:
+            self.feed_queue = queue.Queue()
+            self.send_data(wspayload)
+
+    def send_data(self, wspayload: any):
+        codes = [item["ScripCode"] for item in wspayload.get("MarketFeedData", [])]
+        with self.lock:
+            if wspayload.get("Operation") == "s":
+                self.subscribed.update(codes)
+            elif wspayload.get("Operation") == "u":
+                self.subscribed.difference_update(codes)
+
+    def receive_data(self, msg: any):
+        feed_queue = self.feed_queue
+        while feed_queue is not None:
+            message = feed_queue.get()
+            if message is None:
+                break
+            msg(None, message)
+
+    def close_data(self):
+        with self.lock:
+            if self.feed_queue is not None:
+                self.feed_queue.put(None)
+                self.feed_queue = None
+            self.subscribed.clear()
+
+    def error_data(self, err: any):
+        self.on_error = err
+
+    ## Reads
+
+    def _status_row(self, record: Dict) -> Dict:
+        return {
+            "Exch": record["Exch"],
+            "ExchType": record["ExchType"],
+            "ExchOrderID": record["ExchOrderID"],
+            "RemoteOrderID": record["RemoteOrderID"],
+            "ScripCode": record["ScripCode"],
+            "Status": record["Status"],
+            "PendingQty": record["PendingQty"],
+            "OrderQty": record["Qty"],
+            "OrderRate": record["Price"],
+        }
+
+    def fetch_order_status(self, req_list: List):
+        with self.lock:
+            rows = [
+                self._status_row(self.orders[exch_order_id])
+                for req in req_list
+                for exch_order_id in self.orders_by_tag.get(
+                    req.get("RemoteOrderID", req.get("RemoteOrderId")), ()
+                )
+            ]
+        return {"OrdStatusResLst": rows}
+
+    def get_tradebook(self):
+        with self.lock:
+            return {"TradeBookDetail": [dict(trade) for trade in self.trades]}
+
+    def order_book(self):
+        with self.lock:
+            return [
+                {
+                    "ExchOrderID": record["ExchOrderID"],
+                    "RemoteOrderID": record["RemoteOrderID"],
+                    "ScripCode": record["ScripCode"],
+                    "ScripName": record["ScripName"],
+                    "BuySell": record["BuySell"],
+                    "Qty": record["Qty"],
+                    "Rate": record["Price"],
+                    "AveragePrice": record["AveragePrice"],
+                    "OrderStatus": record["Status"],
+                }
+                for record in self.orders.values()
+            ]
+
+    # Net position per scrip from the trades, marked to the last price
+    def positions(self):
+        with self.lock:
+            net = {}
+            for trade in self.trades:
+                item = net.setdefault(
+                    trade["ScripCode"],
+                    {
+                        "ScripCode": trade["ScripCode"],
+                        "ScripName": trade["ScripName"],
+                        "BuyQty": 0,
+                        "SellQty": 0,
+                        "BuyValue": 0.0,
+                        "SellValue": 0.0,
+                    },
+                )
+                if trade["BuySell"] == "B":
+                    item["BuyQty"] += trade["Qty"]
+                    item["BuyValue"] += trade["Qty"] * trade["Rate"]
+                else:
+                    item["SellQty"] += trade["Qty"]
+                    item["SellValue"] += trade["Qty"] * trade["Rate"]
+            for code, item in net.items():
+                item["NetQty"] = item["BuyQty"] - item["SellQty"]
+                item["LTP"] = self.last_price.get(code, 0.0)
+                item["MTOM"] = (
+                    item["SellValue"] - item["BuyValue"] + item["NetQty"] * item["LTP"]
+                )
+            return list(net.values())
+
+    # Same rows as client_5paisa: executed trades of the tags with their Pnl
+    def get_pnl_summary(self, tag: str = None):
+        tags = [tag] if tag else self.get_todays_tags()
+        with self.lock:
+            summary = []
+            for item in tags:
+                for exch_order_id in self.orders_by_tag.get(item, ()):
+                    record = self.orders[exch_order_id]
+                    if record["Status"] != "Fully Executed":
+                        continue
+                    ltp = self.last_price.get(
+                        record["ScripCode"], record["AveragePrice"]
+                    )
+                    summary.append(
+                        {
+                            "ExchOrderID": str(exch_order_id),
+                            "ScripCode": record["ScripCode"],
+                            "Rate": record["AveragePrice"],
+                            "Qty": record["Qty"],
+                            "BuySell": record["BuySell"],
+                            "ScripName": record["ScripName"],
+                            "LastTradedPrice": ltp,
+                            "Pnl": (ltp - record["AveragePrice"])
+                            * record["Qty"]
+                            * (1 if record["BuySell"] == "B" else -1),
+                        }
+                    )
+            return summary
+
+    def get_todays_tags(self):
+        with self.lock:
+            return list(self.orders_by_tag.keys())
+
+    def fetch_market_depth(self, req_list: List):
+        with self.lock:
+            return {
+                "Data": [
+                    {
+                        "ScripCode": req["ScripCode"],
+                        "LastTradedPrice": self.last_price.get(req["ScripCode"], 0.0),
+                    }
+                    for req in req_list
+                ]
+            }
+
+    def get_option_chain(self, exch: str, symbol: str, expire: int):
+        with self.lock:
+            return {
+                "Options": [
+                    {
+                        "LastRate": price,
+                        "ScripCode": code,
+                        "Name": self.scrip_names.get(code, str(code)),
+                        "CPType": "PE" if code >= 300000000 else "CE",
+                        "StrikeRate": float((code % 100000000) // 100),
+                    }
+                    # simulator.feeds scrip codes, 20/30 + strike + days
+                    for code, price in self.last_price.items()
+                    if code >= 200000000
+                ]
+            }
+
+    # A single expiry, today
+    def get_expiry(self, exch: str, symbol: str):
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        return {"Expiry": [{"ExpiryDate": f"/Date({int(today.timestamp())}000+0530)/"}]}
+
+    # pylint: disable=too-many-arguments
+    def historical_data(
+        self,
+        exch: str,
+        exchange_segment: str,
+        scrip_code: int,
+        time_val: str,
+        from_val: str,
+        to_val: str,
+    ):
+        return {}
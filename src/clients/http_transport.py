@@ -0,0 +1,85 @@
+# Author: Prashant Srivastava
+import logging
+import re
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.common import metrics
+
+
+# requests.Session with a sized keep-alive connection pool, a timeout per
+# endpoint and a latency histogram per endpoint. Injected into the broker SDKs
+# that talk HTTP through a requests session.
+# Config keys:
+#   pool_size        connections kept alive per host (default 10)
+#   pool_block       wait for a free connection instead of opening extra ones
+#   max_retries      connection level retries (default 0)
+#   default_timeout  seconds, (connect, read) tuple allowed (default 10)
+#   timeouts         {endpoint: seconds}, endpoint as named by endpoint_name
+# scheduler: rate_limiter.RequestScheduler every request waits on for a token
+# of its endpoint, see rate_limiter.RateLimitedClient
+# Note: requests/urllib3 do not pipeline HTTP/1.1, concurrency comes from
+# the pool, one request in flight per pooled connection.
+class PooledSession(requests.Session):
+    def __init__(self, config: Dict = None, scheduler=None):
+        super().__init__()
+        config = config if isinstance(config, dict) else {}
+        self.logger = logging.getLogger(__name__)
+        self.pool_size = config.get("pool_size", 10)
+        self.default_timeout = config.get("default_timeout", 10.0)
+        self.timeouts = dict(config.get("timeouts", {}))
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=config.get("max_retries", 0),
+            pool_block=config.get("pool_block", False),
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.latency_lock = threading.Lock()
+        self.latency: Dict[str, metrics.Histogram] = {}
+        self.scheduler = scheduler
+
+    # Last path segment naming the API, skipping scrip codes, intervals and
+    # the like: ".../V1/PlaceOrderRequest" -> "PlaceOrderRequest",
+    # ".../historical/N/D/1660/1m" -> "historical"
+    @staticmethod
+    def endpoint_name(url: str) -> str:
+        segments = [
+            segment
+            for segment in urlparse(url).path.split("/")
+            if len(segment) > 3 and re.search("[A-Za-z]", segment)
+        ]
+        return segments[-1] if segments else urlparse(url).netloc
+
+    def _histogram(self, endpoint: str) -> metrics.Histogram:
+        histogram = self.latency.get(endpoint)
+        if histogram is None:
+            with self.latency_lock:
+                histogram = self.latency.setdefault(
+                    endpoint, metrics.Histogram(endpoint, metrics.LATENCY_BOUNDS)
+                )
+        return histogram
+
+    # pylint: disable=arguments-differ
+    def request(self, method, url, *args, **kwargs):
+        endpoint = PooledSession.endpoint_name(url)
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeouts.get(endpoint, self.default_timeout)
+        if self.scheduler is not None:
+            self.scheduler.acquire(endpoint)
+        start = time.perf_counter()
+        try:
+            return super().request(method, url, *args, **kwargs)
+        finally:
+            self._histogram(endpoint).record(time.perf_counter() - start)
+
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        with self.latency_lock:
+            histograms = list(self.latency.values())
+        return {histogram.name: histogram.snapshot() for histogram in histograms}
@@ -7,6 +7,40 @@ from typing import List, Dict
 from abc import ABC
 from abc import abstractmethod
 
+from . import response_cache
+
+
+def status_rows(response: Dict) -> List[Dict]:
+    return (
+        response["OrdStatusResLst"] if response and response["OrdStatusResLst"] else []
+    )
+
+
+# Splits the order status rows of a request for several tags by tag. 5paisa
+# rows carry no RemoteOrderID (only the dummy and paper clients add it), they
+# are joined on ExchOrderID against order_book, whose rows do. Returns None
+# when a row can't be placed: order_book is needed, or the order is not at the
+# exchange yet (no ExchOrderID) and the tags have to be asked one by one
+def split_order_status(
+    tags: List[str], orders: List[Dict], order_book: List[Dict] = None
+) -> Dict[str, List]:
+    by_tag = {tag: [] for tag in tags}
+    if len(by_tag) == 1:
+        by_tag[tags[0]].extend(orders)
+        return by_tag
+    tag_of = {}
+    for order in order_book if order_book else []:
+        if str(order.get("ExchOrderID", "0")) not in ("", "0"):
+            tag_of[str(order["ExchOrderID"])] = order.get("RemoteOrderID")
+    for order in orders:
+        tag = order.get("RemoteOrderID", order.get("RemoteOrderId"))
+        if tag is None:
+            tag = tag_of.get(str(order.get("ExchOrderID", "0")))
+        if tag not in by_tag:
+            return None
+        by_tag[tag].append(order)
+    return by_tag
+
 
 # pylint: disable=too-many-public-methods
 class IClientManager(ABC):
@@ -21,15 +55,25 @@ class IClientManager(ABC):
             f"{prefix_log_file}_{datetime.datetime.now().strftime('%Y%m%d')}.log"
         )
         # pylint: disable=line-too-long
-        logging.basicConfig(
-            format="%(asctime)s.%(msecs)d %(filename)s:%(lineno)d:%(funcName)s() %(levelname)s %(message)s",
+        formatter = logging.Formatter(
+            fmt="%(asctime)s.%(msecs)d %(filename)s:%(lineno)d:%(funcName)s() %(levelname)s %(message)s",
             datefmt="%A,%d/%m/%Y|%H:%M:%S",
-            handlers=[
-                logging.StreamHandler(sys.stdout),
-                logging.FileHandler(log_file),
-            ],
-            level=log_level,
         )
+        handlers = [logging.StreamHandler(sys.stdout), logging.FileHandler(log_file)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        # Both handlers block, they are written from a listener thread so a
+        # log call never holds up the caller (e.g. an order being placed).
+        # log_decorator needs src.common, which needs this module: import here
+        # pylint: disable=import-outside-toplevel
+        from . import log_decorator
+
+        log_decorator.start_queue_logging(handlers, log_level)
+
+    # Reads within the scope are served once per distinct call, see
+    # response_cache. Polling loops must stay outside of a scope
+    def request_scope(self):
+        return response_cache.request_scope()
 
     @abstractmethod
     def login(self):
@@ -51,6 +95,29 @@ class IClientManager(ABC):
     def fetch_order_status(self, req_list: List):
         raise NotImplementedError
 
+    # Order status of several tags in one request, the response is split
+    # locally by tag, see split_order_status. Returns {tag: [order status]} for
+    # every tag
+    def fetch_order_status_by_tags(self, tags: List[str]) -> Dict[str, List]:
+        if not tags:
+            return {}
+        orders = status_rows(
+            self.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": tag} for tag in dict.fromkeys(tags)]
+            )
+        )
+        by_tag = split_order_status(tags, orders)
+        if by_tag is None:
+            by_tag = split_order_status(tags, orders, self.order_book())
+        if by_tag is None:
+            by_tag = {
+                tag: status_rows(
+                    self.fetch_order_status([{"Exch": "N", "RemoteOrderID": tag}])
+                )
+                for tag in tags
+            }
+        return by_tag
+
     @abstractmethod
     def modify_order(self, **order):
         raise NotImplementedError
@@ -100,6 +167,11 @@ class IClientManager(ABC):
     def send_data(self, wspayload: any):
         raise NotImplementedError
 
+    # Websocket url of the market feed, used by the asyncio feed manager which
+    # owns the connection itself instead of going through connect/receive_data
+    def get_feed_url(self) -> str:
+        raise NotImplementedError
+
     @abstractmethod
     def get_pnl_summary(self, tag: str = None):
         raise NotImplementedError
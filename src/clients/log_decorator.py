@@ -1,19 +1,130 @@
+# Author: Prashant Srivastava
+import atexit
+import functools
+import itertools
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Dict, List
 
-logging = logging.getLogger(__name__)
+from src.common import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Arguments of a logged call, turned into text only when a record is emitted
+# (see log_function_call), merged with the message when it is queued
+class CallArgs:
+    __slots__ = ("args", "kwargs")
+
+    def __init__(self, args: tuple, kwargs: Dict):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        arg_list = [repr(arg) for arg in self.args]
+        kwarg_list = [f"{key}={value!r}" for key, value in self.kwargs.items()]
+        return ", ".join(arg_list + kwarg_list)
+
+
+call_latency: Dict[str, metrics.Histogram] = {}
+call_latency_lock = threading.Lock()
+
+
+def _histogram(name: str) -> metrics.Histogram:
+    histogram = call_latency.get(name)
+    if histogram is None:
+        with call_latency_lock:
+            histogram = call_latency.setdefault(
+                name, metrics.Histogram(name, metrics.LATENCY_BOUNDS)
+            )
+    return histogram
+
+
+# Latency of every decorated function so far, {qualified name: snapshot}
+def get_call_stats() -> Dict[str, Dict]:
+    with call_latency_lock:
+        histograms = list(call_latency.values())
+    return {histogram.name: histogram.snapshot() for histogram in histograms}
 
 
 def log_function_call(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        arg_list = (
-            [repr(arg) for arg in args[1:]]
-            if args and args[0] == "self"
-            else [repr(arg) for arg in args]
-        )
-        kwarg_list = [f"{key}={value!r}" for key, value in kwargs.items()]
-        all_args = ", ".join(arg_list + kwarg_list)
-        logging.info("Calling %s(%s)", func.__name__, all_args)
-        result = func(*args, **kwargs)
-        return result
+        if logger.isEnabledFor(logging.INFO):
+            # methods: leave self out
+            call_args = args[1:] if args and hasattr(args[0], func.__name__) else args
+            logger.info("Calling %s(%s)", name, CallArgs(call_args, dict(kwargs)))
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _histogram(name).record(elapsed)
+            logger.debug("%s took %.3f ms", name, elapsed * 1000)
 
     return wrapper
+
+
+# Lets one in every n records of a hot path through, e.g. queue sizes per tick.
+# Check sample() before computing what is logged
+class LogSampler:
+    def __init__(self, sampled_logger: logging.Logger, every: int = 100):
+        self.logger = sampled_logger
+        self.every = max(1, every)
+        self.counter = itertools.count()
+
+    def sample(self, level: int = logging.DEBUG) -> bool:
+        return self.logger.isEnabledFor(level) and next(self.counter) % self.every == 0
+
+    def log(self, level: int, msg: str, *args) -> None:
+        if self.sample(level):
+            self.logger.log(level, msg, *args)
+
+    def debug(self, msg: str, *args) -> None:
+        self.log(logging.DEBUG, msg, *args)
+
+
+# QueueHandler of the pipeline. Its (stdlib) prepare merges the message with
+# its arguments on the caller's thread: arguments may be mutated after the
+# call, e.g. an order dict, only the handlers' formatting and I/O are deferred
+class PipelineQueueHandler(logging.handlers.QueueHandler):
+    pass
+
+
+queue_listener = None
+
+
+# Puts a queue in front of handlers: logging calls only enqueue, a listener
+# thread writes to the (blocking) handlers. Replaces a previous pipeline.
+def start_queue_logging(handlers: List[logging.Handler], level) -> None:
+    # pylint: disable=global-statement
+    global queue_listener
+    stop_queue_logging()
+    log_queue = queue.SimpleQueue()
+    queue_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    queue_listener.start()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, PipelineQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(PipelineQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+# Writes out the queued records and stops the listener thread
+def stop_queue_logging() -> None:
+    # pylint: disable=global-statement
+    global queue_listener
+    if queue_listener is not None:
+        queue_listener.stop()
+        queue_listener = None
+
+
+atexit.register(stop_queue_logging)
@@ -0,0 +1,292 @@
+# Author: Prashant Srivastava
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from src.common import metrics
+
+from . import iclientmanager
+
+# Priority classes, lower goes first
+CRITICAL = 0  # square off / stop loss orders, modifications and cancellations
+ORDER = 1  # entry orders
+READ = 2  # order book, trade book, order status, quotes
+BULK = 3  # history and option chain downloads
+
+# Priority class of the broker call in progress, so the HTTP requests it sends
+# are queued with it, see priority_scope
+_priority = contextvars.ContextVar("request_priority", default=READ)
+
+
+@contextlib.contextmanager
+def priority_scope(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    # pylint: disable=too-few-public-methods
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    # Takes a token if available and returns 0, else the seconds until one is
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+# Token buckets with callers queued by priority class, so when the quota is
+# short a square off goes ahead of every queued history download.
+# Endpoints with a quota of their own get their own bucket, all the others
+# share the default one (and so are prioritized against each other).
+# Blocking callers (acquire) and coroutines (acquire_async) share the queues.
+# Without a priority, callers are queued with the one of their priority_scope.
+# Config keys:
+#   quotas        {endpoint: [requests per second, burst]}
+#   default_quota [requests per second, burst] shared by other endpoints (10, 10)
+class RequestScheduler:
+    def __init__(self, config: Dict = None):
+        config = config if isinstance(config, dict) else {}
+        self.logger = logging.getLogger(__name__)
+        self.quotas = dict(config.get("quotas", {}))
+        self.default_quota = config.get("default_quota", [10.0, 10.0])
+        self.cond = threading.Condition(threading.Lock())
+        self.seq = itertools.count()
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waiting: Dict[str, List[Tuple[int, int]]] = {}
+        self.max_depth: Dict[str, int] = {}
+        self.wait_histogram = metrics.Histogram("wait", metrics.LATENCY_BOUNDS)
+
+    def bucket_name(self, endpoint: str) -> str:
+        return endpoint if endpoint in self.quotas else "default"
+
+    def _enqueue(self, endpoint: str, priority: int) -> Tuple[int, int]:
+        if endpoint not in self.buckets:
+            rate, burst = self.quotas.get(endpoint, self.default_quota)
+            self.buckets[endpoint] = TokenBucket(rate, burst)
+            self.waiting[endpoint] = []
+            self.max_depth[endpoint] = 0
+        ticket = (priority, next(self.seq))
+        heapq.heappush(self.waiting[endpoint], ticket)
+        self.max_depth[endpoint] = max(
+            self.max_depth[endpoint], len(self.waiting[endpoint])
+        )
+        return ticket
+
+    # Under the lock: grants the token to ticket if it heads the queue and a
+    # token is there. Returns 0 when granted, else how long to wait
+    def _try_take(self, endpoint: str, ticket: Tuple[int, int]) -> float:
+        if self.waiting[endpoint][0] != ticket:
+            return None  # not our turn, wait to be notified
+        delay = self.buckets[endpoint].take()
+        if delay == 0.0:
+            heapq.heappop(self.waiting[endpoint])
+            self.cond.notify_all()
+        return delay
+
+    def acquire(self, endpoint: str, priority: int = None) -> None:
+        priority = _priority.get() if priority is None else priority
+        endpoint = self.bucket_name(endpoint)
+        start = time.perf_counter()
+        with self.cond:
+            ticket = self._enqueue(endpoint, priority)
+            while True:
+                delay = self._try_take(endpoint, ticket)
+                if delay == 0.0:
+                    break
+                self.cond.wait(delay)
+        self.wait_histogram.record(time.perf_counter() - start)
+
+    async def acquire_async(self, endpoint: str, priority: int = None) -> None:
+        priority = _priority.get() if priority is None else priority
+        endpoint = self.bucket_name(endpoint)
+        start = time.perf_counter()
+        with self.cond:
+            ticket = self._enqueue(endpoint, priority)
+        try:
+            while True:
+                with self.cond:
+                    delay = self._try_take(endpoint, ticket)
+                if delay == 0.0:
+                    break
+                # never block the event loop on the condition, poll instead
+                await asyncio.sleep(delay if delay is not None else 0.005)
+        except asyncio.CancelledError:
+            with self.cond:
+                self.waiting[endpoint].remove(ticket)
+                heapq.heapify(self.waiting[endpoint])
+                self.cond.notify_all()
+            raise
+        self.wait_histogram.record(time.perf_counter() - start)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "queue_depth": {key: len(value) for key, value in self.waiting.items()},
+                "max_queue_depth": dict(self.max_depth),
+                "wait": self.wait_histogram.snapshot(),
+            }
+
+
+# IClientManager proxy rate limiting the broker calls of a client.
+# One scheduler can be shared by all clients/components talking to a broker.
+# When the client sends its REST calls through a PooledSession (client.session)
+# the limit is applied there, per HTTP request: a composite call such as
+# get_pnl_summary takes a token for each request it makes, queued with the
+# priority class of the call. Quotas are then keyed by the HTTP endpoint
+# (PooledSession.endpoint_name, e.g. "historical"). Other clients take one
+# token per call, quotas keyed by the method name.
+class RateLimitedClient(iclientmanager.IClientManager):
+    # broker calls -> default priority class, websocket calls are not limited
+    PRIORITIES = {
+        "place_order": ORDER,
+        "modify_order": CRITICAL,
+        "cancel_order": CRITICAL,
+        "cancel_bulk_order": CRITICAL,
+        "fetch_order_status": READ,
+        "fetch_order_status_by_tags": READ,
+        "get_tradebook": READ,
+        "order_book": READ,
+        "positions": READ,
+        "get_pnl_summary": READ,
+        "get_todays_tags": READ,
+        "fetch_market_depth": READ,
+        "get_expiry": READ,
+        "get_option_chain": BULK,
+        "historical_data": BULK,
+    }
+
+    def __init__(
+        self, client: iclientmanager.IClientManager, scheduler: RequestScheduler
+    ):
+        self.client = client
+        self.scheduler = scheduler
+        session = getattr(client, "session", None)
+        # PooledSession takes a scheduler, see http_transport
+        if hasattr(session, "scheduler") and session.scheduler is None:
+            session.scheduler = scheduler
+        self.per_request = getattr(session, "scheduler", None) is scheduler
+
+    @staticmethod
+    def priority(name: str, kwargs: Dict) -> int:
+        if name == "place_order":
+            tag = kwargs.get("RemoteOrderID", "")
+            if tag.startswith("sq") or tag.startswith("sl"):
+                return CRITICAL
+        return RateLimitedClient.PRIORITIES[name]
+
+    def _call(self, name: str, *args, **kwargs):
+        priority = RateLimitedClient.priority(name, kwargs)
+        if not self.per_request:
+            self.scheduler.acquire(name, priority)
+        with priority_scope(priority):
+            return getattr(self.client, name)(*args, **kwargs)
+
+    # Anything else of the client (session, latency stats, ...) as is
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def login(self):
+        self.client.login()
+        return self
+
+    def get_option_chain(self, exch: str, symbol: str, expire: int):
+        return self._call("get_option_chain", exch, symbol, expire)
+
+    def get_expiry(self, exch: str, symbol: str):
+        return self._call("get_expiry", exch, symbol)
+
+    def place_order(self, **order):
+        return self._call("place_order", **order)
+
+    def fetch_order_status(self, req_list: List):
+        return self._call("fetch_order_status", req_list)
+
+    def fetch_order_status_by_tags(self, tags: List[str]) -> Dict[str, List]:
+        return self._call("fetch_order_status_by_tags", tags)
+
+    def modify_order(self, **order):
+        return self._call("modify_order", **order)
+
+    def cancel_order(self, **order):
+        return self._call("cancel_order", **order)
+
+    def get_tradebook(self):
+        return self._call("get_tradebook")
+
+    def order_book(self):
+        return self._call("order_book")
+
+    def positions(self):
+        return self._call("positions")
+
+    def cancel_bulk_order(self, exch_order_ids: List):
+        return self._call("cancel_bulk_order", exch_order_ids)
+
+    # pylint: disable=invalid-name
+    def Request_Feed(self, method: str, operation: str, req_list: List):
+        return self.client.Request_Feed(method, operation, req_list)
+
+    def connect(self, wspayload: Dict):
+        return self.client.connect(wspayload)
+
+    def error_data(self, err: any):
+        return self.client.error_data(err)
+
+    def close_data(self):
+        return self.client.close_data()
+
+    def receive_data(self, msg: any):
+        return self.client.receive_data(msg)
+
+    def send_data(self, wspayload: any):
+        return self.client.send_data(wspayload)
+
+    def get_feed_url(self) -> str:
+        return self.client.get_feed_url()
+
+    def get_pnl_summary(self, tag: str = None):
+        return self._call("get_pnl_summary", tag)
+
+    def get_todays_tags(self):
+        return self._call("get_todays_tags")
+
+    def fetch_market_depth(self, req_list: List):
+        return self._call("fetch_market_depth", req_list)
+
+    # pylint: disable=too-many-arguments
+    def historical_data(
+        self,
+        exch: str,
+        exchange_segment: str,
+        scrip_code: int,
+        time_val: str,
+        from_val: str,
+        to_val: str,
+    ):
+        return self._call(
+            "historical_data",
+            exch,
+            exchange_segment,
+            scrip_code,
+            time_val,
+            from_val,
+            to_val,
+        )
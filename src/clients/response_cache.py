@@ -0,0 +1,64 @@
+# Author: Prashant Srivastava
+import contextlib
+import functools
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Read-through cache of broker responses bound to a request scope.
+# Inside "with client.request_scope():" the reads decorated with cached_read
+# hit the broker once per distinct call, later calls get the same response
+# object back (treat it as read only). Scopes are per thread and nest, the
+# outermost one owns the cache. Outside a scope nothing is cached.
+# Any write decorated with invalidates_reads, from any thread, bumps the
+# generation and so expires every cached response.
+_scope = threading.local()
+_generation = itertools.count(1)
+_current_generation = [0]
+
+
+@contextlib.contextmanager
+def request_scope():
+    outermost = getattr(_scope, "cache", None) is None
+    if outermost:
+        _scope.cache = {}
+        _scope.stats = {"hits": 0, "misses": 0}
+    try:
+        yield _scope.stats
+    finally:
+        if outermost:
+            logger.debug("Request scope done %s", _scope.stats)
+            _scope.cache = None
+
+
+def cached_read(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(_scope, "cache", None)
+        if cache is None:
+            return func(self, *args, **kwargs)
+        key = (id(self), func.__name__, repr(args), repr(sorted(kwargs.items())))
+        generation = _current_generation[0]
+        entry = cache.get(key)
+        if entry is not None and entry[0] == generation:
+            _scope.stats["hits"] += 1
+            return entry[1]
+        _scope.stats["misses"] += 1
+        result = func(self, *args, **kwargs)
+        cache[key] = (generation, result)
+        return result
+
+    return wrapper
+
+
+def invalidates_reads(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_generation[0] = next(_generation)
+
+    return wrapper
@@ -1,3 +1,15 @@
 from . import live_feed_manager
 from . import order_manager
 from . import strikes_manager
+from . import tick_decoder
+from . import metrics
+from . import conflating_queue
+from . import async_live_feed_manager
+from . import feed_hub
+from . import option_chain
+from . import ttl_cache
+from . import live_option_chain
+from . import order_tracker
+from . import trade_book_index
+from . import position_ledger
+from . import position_book
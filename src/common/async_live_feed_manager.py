@@ -0,0 +1,271 @@
+# Author : Prashant Srivastava
+import asyncio
+import inspect
+import json
+import logging
+import time
+import traceback
+from typing import Callable
+from typing import List, Dict
+
+import websockets
+
+from src.clients.iclientmanager import IClientManager
+from src.common import tick_decoder
+
+
+# asyncio flavour of LiveFeedManager: the websocket receiver, the tick
+# dispatcher and the order update dispatcher are coroutines on a single event
+# loop, no OS threads and no blocking queue timeouts.
+# Callbacks may be plain functions or coroutines.
+class AsyncLiveFeedManager:
+    NIFTY_INDEX = 999920000
+    BANKNIFTY_INDEX = 999920005
+
+    def __init__(self, client: IClientManager, config: Dict = None):
+        self.client = client
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.req_list = []
+        self.monitoring_active = False
+        self.web_sock = None
+        self.tick_queue = None
+        self.order_queue = None
+        self.stopped = None
+        self.tasks = []
+        # Frame decoder, see tick_decoder.create_decoder for the config keys
+        self.tick_decoder = tick_decoder.create_decoder(config)
+        if isinstance(config, dict):
+            self.exchange_type = (
+                config["exchangeType"] if "exchangeType" in config else "D"
+            )
+            self.feed_url = config.get("feed_url", None)
+            self.idle_timeout = config.get("idle_timeout", 5.0)
+        else:
+            self.exchange_type = "D"
+            self.feed_url = None
+            self.idle_timeout = 5.0
+
+    @staticmethod
+    async def _invoke(callback: Callable, *args):
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _receiver(self):
+        try:
+            async for message in self.web_sock:
+                ticks, orders = self.tick_decoder.decode(message)
+                for order in orders:
+                    self.order_queue.put_nowait(order)
+                for tick in ticks:
+                    self.tick_queue.put_nowait(tick)
+        except websockets.exceptions.ConnectionClosed as exp:
+            if not self.stopped.is_set():
+                self.logger.error("WebSocket closed: %s", exp)
+        except Exception as exp:
+            self.logger.error("Error processing message: %s", exp)
+            self.logger.error("Stack Trace :%s", traceback.format_exc())
+        if not self.stopped.is_set():
+            await self.stop()
+
+    async def _tick_dispatcher(
+        self,
+        callback: Callable[[Dict, Dict], None],
+        user_data: Dict = None,
+    ):
+        while not self.stopped.is_set():
+            try:
+                tick = await asyncio.wait_for(
+                    self.tick_queue.get(), timeout=self.idle_timeout
+                )
+            except asyncio.TimeoutError:
+                self.logger.warning(
+                    "No live feed data received in the last %.2f seconds. \
+                     Stoping the monitoring session.",
+                    self.idle_timeout,
+                )
+                await self.stop()
+                return
+            try:
+                await AsyncLiveFeedManager._invoke(callback, tick, user_data)
+            except Exception as exp:
+                self.logger.error("Error in scrip data callback: %s", exp)
+                self.logger.error("Stack Trace :%s", traceback.format_exc())
+                await self.stop()
+
+    async def _order_dispatcher(
+        self,
+        user_data: Dict = None,
+        user_callback: Callable[[Dict, list, Dict], None] = None,
+    ):
+        while not self.stopped.is_set():
+            order_data = await self.order_queue.get()
+            await self._on_order_update(order_data, user_data, user_callback)
+
+    async def monitor(
+        self,
+        scrip_codes: List[int],
+        on_scrip_data: Callable[[Dict, Dict], None],
+        on_order_update: Callable[[Dict, list, Dict], None] = None,
+        user_data: Dict = None,
+    ) -> None:
+        self.logger.info("Starting monitoring session for scrips %s", scrip_codes)
+        if self.monitoring_active:
+            self.logger.warning(
+                "Monitoring is already active. Not starting a new session."
+            )
+            return
+        self.stopped = asyncio.Event()
+        self.tick_queue = asyncio.Queue()
+        self.order_queue = asyncio.Queue()
+
+        scrip_codes = list(scrip_codes)
+        if AsyncLiveFeedManager.NIFTY_INDEX in scrip_codes:
+            self.req_list.append(
+                {
+                    "Exch": "N",
+                    "ExchType": "C",
+                    "ScripCode": AsyncLiveFeedManager.NIFTY_INDEX,
+                }
+            )
+            scrip_codes.remove(AsyncLiveFeedManager.NIFTY_INDEX)
+        self.req_list.extend(
+            [
+                {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
+                for x in scrip_codes
+            ]
+        )
+
+        feed_url = self.feed_url if self.feed_url else self.client.get_feed_url()
+        self.logger.info("Connecting to %s", feed_url)
+        self.web_sock = await websockets.connect(feed_url)
+        await self.web_sock.send(
+            json.dumps(self.client.Request_Feed("mf", "s", self.req_list))
+        )
+        self.monitoring_active = True
+
+        self.tasks = [
+            asyncio.create_task(self._receiver()),
+            asyncio.create_task(self._tick_dispatcher(on_scrip_data, user_data)),
+            asyncio.create_task(self._order_dispatcher(user_data, on_order_update)),
+        ]
+
+    def is_active(self):
+        return self.monitoring_active
+
+    # Resolves once the session is over, either by stop() or idle timeout
+    async def wait_closed(self):
+        if self.stopped:
+            await self.stopped.wait()
+
+    async def stop(self):
+        if not self.monitoring_active:
+            self.logger.warning("Monitoring is not active. Cannot stop.")
+            return
+        self.monitoring_active = False
+        self.stopped.set()
+        self.logger.info("Stopping monitoring session.")
+        try:
+            await self.web_sock.send(
+                json.dumps(self.client.Request_Feed("mf", "u", self.req_list))
+            )
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        await self.web_sock.close()
+        self.req_list = []
+
+        self.logger.debug("Order Queue Size:%d", self.order_queue.qsize())
+        self.logger.debug("Tick Queue Size:%d", self.tick_queue.qsize())
+
+        # stop() may be invoked from one of the session tasks itself
+        current = asyncio.current_task()
+        pending = [task for task in self.tasks if task is not current]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.tasks = []
+        self.logger.debug("All completed.")
+
+    async def subscribe(self, scrip_codes: List[int]) -> bool:
+        new_list = [
+            {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
+            for x in scrip_codes
+        ]
+        self.req_list.extend(new_list)
+        await self.web_sock.send(
+            json.dumps(self.client.Request_Feed("mf", "s", new_list))
+        )
+        self.logger.info("Subscribed to scrips:%s", scrip_codes)
+        return True
+
+    async def unsubscribe(self, scrip_codes: List[int]) -> bool:
+        try:
+            unsubscribe_list = [
+                {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
+                for x in scrip_codes
+            ]
+            await self.web_sock.send(
+                json.dumps(self.client.Request_Feed("mf", "u", unsubscribe_list))
+            )
+            self.req_list = [
+                item for item in self.req_list if item["ScripCode"] not in scrip_codes
+            ]
+            self.logger.info("Unsubscribed from scrips:%s", scrip_codes)
+            return True
+        except Exception as exp:
+            self.logger.error("Error unsubscribing from scrips:%s", scrip_codes)
+            self.logger.error(exp)
+            await self.stop()
+            return False
+
+    async def _on_order_update(
+        self,
+        message: Dict,
+        user_data: Dict = None,
+        user_callback: Callable[[Dict, list, Dict], None] = None,
+    ):
+        start_time = time.time()
+        try:
+            if user_data is None:
+                user_data = {}
+            if "order_update" not in user_data:
+                user_data["order_update"] = []
+            if message["Status"] == "Fully Executed":
+                scrip_codes = [item["ScripCode"] for item in self.req_list]
+                if "RemoteOrderId" in message:
+                    if message["ScripCode"] in scrip_codes and message[
+                        "RemoteOrderId"
+                    ].startswith(
+                        "sl"
+                    ):  # Unsubscribe from the scrip only if sl is hit
+                        if await self.unsubscribe([message["ScripCode"]]):
+                            user_data["order_update"].append(message["ScripCode"])
+                else:
+                    self.logger.debug(
+                        "RemoteOrderId not found in order update:%s",
+                        json.dumps(message, indent=2, sort_keys=True),
+                    )
+            elif message["Status"] == "Cancelled":
+                self.logger.info("Order cancelled:%s", json.dumps(message, indent=2))
+            elif message["Status"] == "SL Triggered":
+                self.logger.info("Stop loss order:%s", json.dumps(message, indent=2))
+            else:
+                self.logger.info("Order update:%s", message)
+            if user_callback:
+                await AsyncLiveFeedManager._invoke(
+                    user_callback, message, self.req_list, user_data
+                )
+        except Exception as exp:
+            self.logger.error(
+                "Error processing order update:%s on subscription_list %s",
+                json.dumps(message, indent=2),
+                self.req_list,
+            )
+            self.logger.error(exp)
+            self.logger.error("Stack Trace :%s", traceback.format_exc())
+            await self.stop()
+        finally:
+            self.logger.debug(
+                "Order update processed in %.2f seconds", time.time() - start_time
+            )
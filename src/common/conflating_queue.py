@@ -0,0 +1,67 @@
+# Author : Prashant Srivastava
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+# Latest value queue: holds at most one pending item per key, a newer item
+# replaces the pending one for the same key (the replaced item is counted as
+# dropped). Items are handed out in the order their key first became pending.
+# Exposes the subset of queue.Queue used by LiveFeedManager.
+class ConflatingQueue:
+    def __init__(self, key: Callable[[Any], Any] = None):
+        self.key = key if key else lambda item: item["code"]
+        self.pending: Dict[Any, Any] = {}
+        self.not_empty = threading.Condition(threading.Lock())
+        self.dropped = 0
+
+    def put(self, item: Any, _block: bool = True, _timeout: float = None) -> None:
+        key = self.key(item)
+        with self.not_empty:
+            if key in self.pending:
+                self.dropped += 1
+            self.pending[key] = item
+            self.not_empty.notify()
+
+    def put_nowait(self, item: Any) -> None:
+        self.put(item)
+
+    # Queued in order like put, but never replaced nor replacing, e.g. the
+    # backfilled ticks of a scrip which all matter
+    def put_unconflated(self, item: Any) -> None:
+        with self.not_empty:
+            self.pending[object()] = item
+            self.not_empty.notify()
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        with self.not_empty:
+            if not block:
+                if not self.pending:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self.pending:
+                    self.not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self.pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            key = next(iter(self.pending))
+            return self.pending.pop(key)
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self.not_empty:
+            return len(self.pending)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def task_done(self) -> None:
+        # Nothing joins on this queue, kept for queue.Queue compatibility
+        pass
@@ -0,0 +1,295 @@
+# Author : Prashant Srivastava
+import itertools
+import logging
+import threading
+import traceback
+import weakref
+from typing import Any, Callable
+from typing import List, Dict
+
+from src.clients.iclientmanager import IClientManager
+from src.common.live_feed_manager import LiveFeedManager
+
+
+class FeedConsumer:
+    # pylint: disable=too-few-public-methods
+    def __init__(
+        self,
+        consumer_id: int,
+        on_scrip_data: Callable[[Dict, Dict], None],
+        on_order_update: Callable[[Dict, list, Dict], None] = None,
+        user_data: Dict = None,
+    ):
+        self.consumer_id = consumer_id
+        self.on_scrip_data = on_scrip_data
+        self.on_order_update = on_order_update
+        self.user_data = user_data if user_data is not None else {}
+        self.scrip_codes = set()
+        # Tags of the orders placed by the consumer, see FeedHub.consumer_for_tag
+        self.tags = set()
+
+
+# Shares one LiveFeedManager (one broker websocket) per client between any
+# number of consumers. Subscriptions are reference counted per scrip, so a scrip
+# is subscribed once however many consumers want it and unsubscribed only when
+# the last one lets go. Each tick is decoded once and fanned out to the
+# consumers of its scrip.
+# A consumer registered with its order tags only gets the order updates of
+# those tags (and of their "sl"/"sq" orders), and a stop loss fill only drops
+# the scrip for the consumer owning the tag. Consumers without tags get every
+# order update and keep their scrips.
+# In batch mode a consumer gets the latest tick of each of its scrips in the
+# batch, like BaseStrategy.run_batch. Tick listeners get every tick, or every
+# whole batch, before the consumers, e.g. to update a PositionBook once.
+# Config: LiveFeedManager config, plus
+#   auto_start  start the feed with the first scrip (default True), else on
+#               start(); a hub never started can be driven through dispatch
+#               and on_order_update, e.g. by the backtester
+class FeedHub:
+    # Keyed by the client itself, an id() may be reused by a later client
+    _hubs = weakref.WeakKeyDictionary()
+    _hubs_lock = threading.Lock()
+
+    def __init__(self, client: IClientManager, config: Dict = None):
+        self.client = client
+        self.logger = logging.getLogger(__name__)
+        config = dict(config) if isinstance(config, dict) else {}
+        # Stop loss unsubscription is handled per consumer by the hub
+        config["unsubscribe_on_sl"] = False
+        # Consumers come and go in bursts, coalesce their subscription changes
+        config.setdefault("subscription_batch_delay", 0.05)
+        self.auto_start = config.get("auto_start", True)
+        self.feed = LiveFeedManager(client, config)
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.consumers: Dict[int, FeedConsumer] = {}
+        self.ref_counts: Dict[int, int] = {}
+        # scrip code -> consumers, rebuilt on changes so dispatch needs no lock
+        self.routes: Dict[int, tuple] = {}
+        self.by_tag: Dict[str, FeedConsumer] = {}
+        self.tick_listeners: List[Callable[[Any], None]] = []
+        self.user_data = {}
+
+    @staticmethod
+    def for_client(client: IClientManager, config: Dict = None) -> "FeedHub":
+        # config is only used when the hub for this client is created
+        with FeedHub._hubs_lock:
+            hub = FeedHub._hubs.get(client)
+            if hub is None:
+                hub = FeedHub(client, config)
+                FeedHub._hubs[client] = hub
+            return hub
+
+    def register(
+        self,
+        scrip_codes: List[int],
+        on_scrip_data: Callable[[Dict, Dict], None],
+        on_order_update: Callable[[Dict, list, Dict], None] = None,
+        user_data: Dict = None,
+        tags: List[str] = None,
+    ) -> int:
+        with self.lock:
+            consumer = FeedConsumer(
+                next(self.ids), on_scrip_data, on_order_update, user_data
+            )
+            self.consumers[consumer.consumer_id] = consumer
+            for tag in tags or []:
+                self._add_tag(consumer, tag)
+            self.logger.info(
+                "Registered feed consumer %d for scrips %s",
+                consumer.consumer_id,
+                scrip_codes,
+            )
+            self.add_scrips(consumer.consumer_id, scrip_codes)
+            return consumer.consumer_id
+
+    def unregister(self, consumer_id: int) -> None:
+        with self.lock:
+            consumer = self.consumers.get(consumer_id)
+            if consumer is None:
+                return
+            self.remove_scrips(consumer_id, list(consumer.scrip_codes))
+            del self.consumers[consumer_id]
+            for tag in consumer.tags:
+                if self.by_tag.get(tag) is consumer:
+                    del self.by_tag[tag]
+            self.logger.info("Unregistered feed consumer %d", consumer_id)
+            if not self.consumers:
+                if self.feed.is_active():
+                    self.logger.info("No feed consumers left, stopping the feed")
+                self.stop()
+                # The hub holds the client, drop it so both can be collected
+                with FeedHub._hubs_lock:
+                    if FeedHub._hubs.get(self.client) is self:
+                        del FeedHub._hubs[self.client]
+
+    def _add_tag(self, consumer: FeedConsumer, tag: str) -> None:
+        owner = self.by_tag.get(tag)
+        if owner is not None and owner is not consumer:
+            self.logger.warning(
+                "Tag %s of feed consumer %d already owned by consumer %d",
+                tag,
+                consumer.consumer_id,
+                owner.consumer_id,
+            )
+            return
+        consumer.tags.add(tag)
+        self.by_tag[tag] = consumer
+
+    # For a consumer placing orders under a new tag after registering
+    def add_tags(self, consumer_id: int, tags: List[str]) -> None:
+        with self.lock:
+            consumer = self.consumers[consumer_id]
+            for tag in tags:
+                self._add_tag(consumer, tag)
+
+    # Consumer owning an order tag, its entry tag for "sl"/"sq" tags
+    def consumer_for_tag(self, tag: str) -> FeedConsumer:
+        consumer = self.by_tag.get(tag)
+        if consumer is None and tag[:2] in ("sl", "sq"):
+            consumer = self.by_tag.get(tag[2:])
+        return consumer
+
+    def add_scrips(self, consumer_id: int, scrip_codes: List[int]) -> None:
+        with self.lock:
+            consumer = self.consumers[consumer_id]
+            new_codes = []
+            for code in scrip_codes:
+                if code in consumer.scrip_codes:
+                    continue
+                consumer.scrip_codes.add(code)
+                self.ref_counts[code] = self.ref_counts.get(code, 0) + 1
+                if self.ref_counts[code] == 1:
+                    new_codes.append(code)
+                self._update_route(code)
+            if not self.feed.is_active():
+                if self.auto_start:
+                    self.start()
+            elif new_codes:
+                self.feed.subscribe(new_codes)
+
+    # (Re)starts the session with everything wanted so far
+    def start(self) -> None:
+        with self.lock:
+            if self.feed.is_active():
+                return
+            self.feed.monitor(
+                scrip_codes=list(self.ref_counts.keys()),
+                on_scrip_data=self.dispatch,
+                on_order_update=self.on_order_update,
+                user_data=self.user_data,
+            )
+
+    def stop(self) -> None:
+        if self.feed.is_active():
+            self.feed.stop()
+
+    def add_tick_listener(self, listener: Callable[[Any], None]) -> None:
+        self.tick_listeners.append(listener)
+
+    def remove_tick_listener(self, listener: Callable[[Any], None]) -> None:
+        if listener in self.tick_listeners:
+            self.tick_listeners.remove(listener)
+
+    def remove_scrips(self, consumer_id: int, scrip_codes: List[int]) -> None:
+        with self.lock:
+            consumer = self.consumers[consumer_id]
+            unused_codes = []
+            for code in scrip_codes:
+                if code not in consumer.scrip_codes:
+                    continue
+                consumer.scrip_codes.discard(code)
+                self.ref_counts[code] -= 1
+                if self.ref_counts[code] == 0:
+                    del self.ref_counts[code]
+                    unused_codes.append(code)
+                self._update_route(code)
+            if unused_codes and self.feed.is_active():
+                self.feed.unsubscribe(unused_codes)
+
+    def get_subscriptions(self) -> Dict[int, int]:
+        with self.lock:
+            return dict(self.ref_counts)
+
+    def _update_route(self, code: int) -> None:
+        consumers = tuple(
+            consumer
+            for consumer in self.consumers.values()
+            if code in consumer.scrip_codes
+        )
+        if consumers:
+            self.routes[code] = consumers
+        else:
+            self.routes.pop(code, None)
+
+    # on_scrip_data of the feed: a tick, or a list of ticks in batch mode
+    def dispatch(self, ticks: Any, _user_data: Dict = None) -> None:
+        for listener in self.tick_listeners:
+            try:
+                listener(ticks)
+            except Exception as exp:
+                self.logger.error("Tick listener failed: %s", exp)
+                self.logger.error("Stack Trace :%s", traceback.format_exc())
+        if isinstance(ticks, list):
+            latest = {}
+            for tick in ticks:
+                latest[tick["code"]] = tick
+            for tick in latest.values():
+                self._route(tick)
+        else:
+            self._route(ticks)
+
+    def _route(self, ohlcvt: Dict) -> None:
+        for consumer in self.routes.get(ohlcvt["code"], ()):
+            try:
+                consumer.on_scrip_data(ohlcvt, consumer.user_data)
+            except Exception as exp:
+                self.logger.error(
+                    "Feed consumer %d failed on tick: %s", consumer.consumer_id, exp
+                )
+                self.logger.error("Stack Trace :%s", traceback.format_exc())
+
+    def on_order_update(
+        self, message: Dict, subscription_list: list, _user_data: Dict = None
+    ) -> None:
+        tag = message.get("RemoteOrderId", message.get("RemoteOrderID", ""))
+        with self.lock:
+            owner = self.consumer_for_tag(tag)
+            consumers = [
+                consumer
+                for consumer in self.consumers.values()
+                if consumer is owner or not consumer.tags
+            ]
+            if (
+                owner is not None
+                and message.get("Status") == "Fully Executed"
+                and tag.startswith("sl")
+                and message["ScripCode"] in owner.scrip_codes
+            ):
+                # Same behaviour as a dedicated LiveFeedManager, the owner of
+                # the stop loss stops receiving its scrip, the others keep it
+                self.remove_scrips(owner.consumer_id, [message["ScripCode"]])
+                owner.user_data.setdefault("order_update", []).append(
+                    message["ScripCode"]
+                )
+        for consumer in consumers:
+            if "order_update" not in consumer.user_data:
+                consumer.user_data["order_update"] = []
+            if consumer.on_order_update:
+                try:
+                    consumer.on_order_update(
+                        message,
+                        [
+                            item
+                            for item in subscription_list
+                            if item["ScripCode"] in consumer.scrip_codes
+                        ],
+                        consumer.user_data,
+                    )
+                except Exception as exp:
+                    self.logger.error(
+                        "Feed consumer %d failed on order update: %s",
+                        consumer.consumer_id,
+                        exp,
+                    )
+                    self.logger.error("Stack Trace :%s", traceback.format_exc())
@@ -1,14 +1,20 @@
 # Author : Prashant Srivastava
+import datetime
 import json
 import logging
 import queue
 import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 from typing import List, Dict
 
 from src.clients.iclientmanager import IClientManager
+from src.clients.log_decorator import LogSampler
+from src.common import conflating_queue
+from src.common import metrics
+from src.common import tick_decoder
 
 
 class LiveFeedManager:
@@ -29,49 +35,373 @@ class LiveFeedManager:
         self.receiver_thread = None
         self.scrip_dequeuer_thread = None
         self.order_dequeuer_thread = None
+        # Subscription changes not yet sent to the broker
+        self.subscription_lock = threading.RLock()
+        self.pending_subscribe = set()
+        self.pending_unsubscribe = set()
+        self.flush_timer = None
+        # Called with every order update before it is handled, see OrderTracker
+        self.order_listeners: List[Callable[[Dict], None]] = []
+        # Frame decoder, see tick_decoder.create_decoder for the config keys
+        self.tick_decoder = tick_decoder.create_decoder(config)
         if isinstance(config, dict):
             self.exchange_type = (
                 config["exchangeType"] if "exchangeType" in config else "D"
             )
+            # Batch mode: on_scrip_data receives a list of ticks instead of a
+            # single tick, collected for up to batch_latency seconds
+            self.batch_mode = config.get("batch_mode", False)
+            self.batch_latency = config.get("batch_latency", 0.0)
+            self.max_batch_size = config.get("max_batch_size", 0)
+            # Conflate mode: keep only the latest pending tick per scrip code
+            self.conflate = config.get("conflate", False)
+            # Drop the scrip from the feed when its stop loss order executes
+            self.unsubscribe_on_sl = config.get("unsubscribe_on_sl", True)
+            self.subscription_batch_delay = config.get("subscription_batch_delay", 0.0)
+            # Reconnect (with exponential backoff) instead of stopping when the
+            # websocket drops or the feed goes idle for idle_timeout seconds
+            self.idle_timeout = config.get("idle_timeout", 5)
+            self.auto_reconnect = config.get("auto_reconnect", False)
+            self.reconnect_backoff = config.get("reconnect_backoff", 1.0)
+            self.reconnect_max_backoff = config.get("reconnect_max_backoff", 30.0)
+            self.max_reconnects = config.get("max_reconnects", 0)  # 0 = forever
+            # Fill the missed range with 1m candles from historical_data
+            self.backfill = config.get("backfill", False)
+            # Queue size debug logs of the receive path: one in log_sample_every
+            self.log_sample_every = config.get("log_sample_every", 100)
         else:
             self.exchange_type = "D"
+            self.batch_mode = False
+            self.batch_latency = 0.0
+            self.max_batch_size = 0
+            self.conflate = False
+            self.unsubscribe_on_sl = True
+            self.subscription_batch_delay = 0.0
+            self.idle_timeout = 5
+            self.auto_reconnect = False
+            self.reconnect_backoff = 1.0
+            self.reconnect_max_backoff = 30.0
+            self.max_reconnects = 0
+            self.backfill = False
+            self.log_sample_every = 100
+        self.hot_path_log = LogSampler(self.logger, self.log_sample_every)
+        # Reconnect and gap tracking
+        self.reconnects = 0
+        self.ticks_since_connect = 0
+        self.last_tick_time: Dict[int, float] = {}
+        self.gap_check = set()
+        self.gaps = []
+        # Backfills run on their own thread, the live ticks of a scrip being
+        # backfilled are held back till its candles are queued
+        self.backfill_executor = None
+        self.backfill_lock = threading.Lock()
+        self.held_ticks: Dict[int, List[Dict]] = {}
+        # scrip code -> start times of its backfills still to run, in order
+        self.backfill_starts: Dict[int, List[float]] = {}
+        self.callback_queue = self._new_callback_queue()
+        self.batch_size_histogram = metrics.Histogram("batch_size", metrics.SIZE_BOUNDS)
+        self.queue_delay_histogram = metrics.Histogram(
+            "queue_delay", metrics.LATENCY_BOUNDS
+        )
+
+    def _new_callback_queue(self):
+        if self.conflate:
+            # batch mode queues (enqueue time, tick) pairs
+            return conflating_queue.ConflatingQueue(
+                key=(lambda item: item[1]["code"])
+                if self.batch_mode
+                else (lambda item: item["code"])
+            )
+        return queue.Queue()
 
+    # The dequeuers and the receiver run on the shutdown flag and the queues
+    # of the session that started them, see monitor
     def callback_dequeuer(
         self,
         callback: Callable[[Dict, Dict], None],
         user_data: Dict = None,
+        shutdown_flag: threading.Event = None,
+        callback_queue=None,
     ):
-        time_out = 5
-        while not self.shutdown_flag.is_set():
+        shutdown_flag = shutdown_flag if shutdown_flag else self.shutdown_flag
+        callback_queue = (
+            callback_queue if callback_queue is not None else self.callback_queue
+        )
+        time_out = self.idle_timeout
+        while not shutdown_flag.is_set():
             try:
-                callback_data = self.callback_queue.get(
+                callback_data = callback_queue.get(
                     timeout=time_out
                 )  # wait for 5 seconds for new data
                 callback(callback_data, user_data)
-                self.callback_queue.task_done()
+                callback_queue.task_done()
             except queue.Empty:
                 # no live feed data received in the last 5 seconds
-                # stop the monitoring session
-                self.logger.warning(
-                    "No live feed data received in the last %.2f seconds. \
-                     Stoping the monitoring session.",
-                    time_out,
+                if not shutdown_flag.is_set():
+                    self.on_feed_idle(time_out)
+
+    def batch_dequeuer(
+        self,
+        callback: Callable[[List[Dict], Dict], None],
+        user_data: Dict = None,
+        shutdown_flag: threading.Event = None,
+        callback_queue=None,
+    ):
+        shutdown_flag = shutdown_flag if shutdown_flag else self.shutdown_flag
+        callback_queue = (
+            callback_queue if callback_queue is not None else self.callback_queue
+        )
+        time_out = self.idle_timeout
+        while not shutdown_flag.is_set():
+            try:
+                batch = [callback_queue.get(timeout=time_out)]
+            except queue.Empty:
+                if not shutdown_flag.is_set():
+                    self.on_feed_idle(time_out)
+                continue
+            # Drain whatever is already queued, then keep waiting for more
+            # ticks till the latency budget is used up
+            deadline = time.perf_counter() + self.batch_latency
+            while not self.max_batch_size or len(batch) < self.max_batch_size:
+                try:
+                    batch.append(callback_queue.get_nowait())
+                except queue.Empty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(callback_queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            now = time.perf_counter()
+            ticks = []
+            for enqueued_at, tick in batch:
+                self.queue_delay_histogram.record(now - enqueued_at)
+                ticks.append(tick)
+            self.batch_size_histogram.record(len(ticks))
+            callback(ticks, user_data)
+            for _ in batch:
+                callback_queue.task_done()
+
+    def on_feed_idle(self, time_out: float):
+        if self.shutdown_flag.is_set():
+            return
+        if self.auto_reconnect:
+            # Closing the socket makes the receiver loop reconnect
+            self.logger.warning(
+                "No live feed data received in the last %.2f seconds. \
+                 Reconnecting.",
+                time_out,
+            )
+            self.client.close_data()
+            return
+        # stop the monitoring session
+        self.logger.warning(
+            "No live feed data received in the last %.2f seconds. \
+             Stoping the monitoring session.",
+            time_out,
+        )
+        self.stop()
+
+    # Runs in the receiver thread, receive_data blocks till the socket closes.
+    # With auto_reconnect a fresh connection replaying req_list is made with
+    # exponential backoff until stop() is called.
+    def receiver_loop(
+        self,
+        on_message: Callable,
+        on_error: Callable,
+        shutdown_flag: threading.Event = None,
+    ):
+        shutdown_flag = shutdown_flag if shutdown_flag else self.shutdown_flag
+        attempt = 0
+        while True:
+            self.client.receive_data(on_message)
+            if shutdown_flag.is_set() or not self.auto_reconnect:
+                break
+            if self.ticks_since_connect > 0:
+                attempt = 0
+            attempt += 1
+            if self.max_reconnects and attempt > self.max_reconnects:
+                self.logger.error(
+                    "Giving up after %d reconnect attempts", self.max_reconnects
                 )
-                self.stop()
+                # stop() joins this thread, call it from another one
+                threading.Thread(target=self.stop).start()
+                break
+            delay = min(
+                self.reconnect_backoff * 2 ** (attempt - 1), self.reconnect_max_backoff
+            )
+            self.logger.warning(
+                "Live feed disconnected, reconnecting in %.2f seconds (attempt %d)",
+                delay,
+                attempt,
+            )
+            if shutdown_flag.wait(delay):
+                break
+            with self.monitoring_lock:
+                if shutdown_flag.is_set():
+                    break
+                # Ticks from the new connection are compared against the last
+                # ones seen to find the missed range
+                self.gap_check = set(self.get_subscribed())
+                self.ticks_since_connect = 0
+                req_data = self.client.Request_Feed("mf", "s", self.req_list)
+                self.client.connect(req_data)
+                self.client.error_data(on_error)
+                self.reconnects += 1
+            self.logger.info("Reconnected live feed (%d)", self.reconnects)
+
+    # conflate False keeps the tick even in conflate mode, e.g. a backfill
+    def enqueue_tick(self, tick: Dict, enqueued_at: float = None, conflate=True):
+        if self.batch_mode:
+            # enqueue time is kept for the queue delay histogram
+            item = (enqueued_at if enqueued_at else time.perf_counter(), tick)
+        else:
+            item = tick
+        if self.conflate and not conflate:
+            self.callback_queue.put_unconflated(item)
+        else:
+            self.callback_queue.put(item)
+
+    # Holds back a live tick of a scrip whose backfill is still running
+    def hold_tick(self, tick: Dict) -> bool:
+        with self.backfill_lock:
+            held = self.held_ticks.get(tick["code"])
+            if held is None:
+                return False
+            held.append(tick)
+            return True
+
+    def check_gap(self, code: int, tick_time: float):
+        last = self.last_tick_time.get(code)
+        if last is None or tick_time <= last:
+            return
+        self.logger.warning(
+            "Feed gap for %d from %s to %s",
+            code,
+            datetime.datetime.fromtimestamp(last),
+            datetime.datetime.fromtimestamp(tick_time),
+        )
+        self.gaps.append({"code": code, "from": last, "to": tick_time})
+        if self.backfill:
+            # historical_data is a REST call, keep it off the receive thread
+            with self.backfill_lock:
+                if self.backfill_executor is None:
+                    return
+                # A backfill of the scrip may still be running, keep its ticks
+                self.held_ticks.setdefault(code, [])
+                self.backfill_starts.setdefault(code, []).append(last)
+                self.backfill_executor.submit(
+                    self.run_backfill, code, last, tick_time, self.shutdown_flag
+                )
+
+    # Queues the missed candles ahead of the live ticks held meanwhile. With
+    # another backfill of the scrip queued (backfills run one at a time, in
+    # order), only the ticks before its gap are released
+    def run_backfill(
+        self,
+        code: int,
+        from_time: float,
+        to_time: float,
+        shutdown_flag: threading.Event,
+    ):
+        ticks = self.fetch_backfill(code, from_time, to_time)
+        with self.backfill_lock:
+            # stop() dropped the held ticks, the session is over
+            if shutdown_flag.is_set():
+                return
+            for tick in ticks:
+                self.enqueue_tick(tick, conflate=False)
+            starts = self.backfill_starts.get(code, [])
+            if starts:
+                starts.pop(0)
+            if starts:
+                held = self.held_ticks.get(code, [])
+                release = [tick for tick in held if tick["t"] <= starts[0]]
+                self.held_ticks[code] = held[len(release) :]
+            else:
+                self.backfill_starts.pop(code, None)
+                release = self.held_ticks.pop(code, [])
+            for tick in release:
+                self.enqueue_tick(tick)
+
+    # 1 minute candles strictly inside (from_time, to_time) as ticks
+    def fetch_backfill(self, code: int, from_time: float, to_time: float) -> List:
+        ticks = []
+        try:
+            from_date = datetime.date.fromtimestamp(from_time).strftime("%Y-%m-%d")
+            # to date is exclusive for historical_data
+            to_date = (
+                datetime.date.fromtimestamp(to_time) + datetime.timedelta(days=1)
+            ).strftime("%Y-%m-%d")
+            exch_type = self._req_item(code)["ExchType"]
+            candles = self.client.historical_data(
+                "N", exch_type, code, "1m", from_date, to_date
+            )
+            if candles is None or len(candles) == 0:
+                return ticks
+            if hasattr(candles, "to_dict"):
+                candles = candles.to_dict("records")
+            for candle in candles:
+                candle_time = datetime.datetime.fromisoformat(
+                    str(candle["Datetime"])
+                ).timestamp()
+                if from_time < candle_time < to_time:
+                    ticks.append(
+                        self.tick_decoder.make_tick(
+                            {
+                                "OpenRate": candle["Open"],
+                                "High": candle["High"],
+                                "Low": candle["Low"],
+                                "LastRate": candle["Close"],
+                                "LastQty": candle["Volume"],
+                                "Token": code,
+                                "TickDt": f"/Date({int(candle_time * 1000)})/",
+                                "ChgPcnt": 0.0,
+                            }
+                        )
+                    )
+            self.logger.info("Backfilled %d candles for %d", len(ticks), code)
+        except Exception as exp:
+            self.logger.error("Backfill failed for %d: %s", code, exp)
+        return ticks
+
+    def get_dropped_ticks(self) -> int:
+        if self.conflate:
+            return self.callback_queue.dropped
+        return 0
+
+    def get_feed_stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_delay": self.queue_delay_histogram.snapshot(),
+            "dropped_ticks": self.get_dropped_ticks(),
+        }
+
+    def add_order_listener(self, listener: Callable[[Dict], None]) -> None:
+        self.order_listeners.append(listener)
+
+    def remove_order_listener(self, listener: Callable[[Dict], None]) -> None:
+        if listener in self.order_listeners:
+            self.order_listeners.remove(listener)
 
     def order_dequeuer(
         self,
         subscription_list: list,
         user_data: Dict = None,
         user_callback: Callable[[Dict, list, Dict], None] = None,
+        shutdown_flag: threading.Event = None,
+        order_queue: queue.Queue = None,
     ):
-        while not self.shutdown_flag.is_set():
+        shutdown_flag = shutdown_flag if shutdown_flag else self.shutdown_flag
+        order_queue = order_queue if order_queue is not None else self.order_queue
+        while not shutdown_flag.is_set():
             try:
-                order_data = self.order_queue.get(timeout=1)
+                order_data = order_queue.get(timeout=1)
                 self._on_order_update(
                     order_data, subscription_list, user_data, user_callback
                 )
-                self.order_queue.task_done()
+                order_queue.task_done()
             except queue.Empty:
                 # no order data received in the last 1 seconds
                 pass
@@ -90,74 +420,58 @@ class LiveFeedManager:
                     "Monitoring is already active. Not starting a new session."
                 )
                 return
+            # Every session gets its own shutdown flag and queues: the threads
+            # of a stopped session may still be winding down, they must neither
+            # run on nor take the items of this one
+            shutdown_flag = threading.Event()
+            self.shutdown_flag = shutdown_flag
+            self.callback_queue = self._new_callback_queue()
+            self.order_queue = queue.Queue()
+            # Gap tracking starts over, the last session's ticks are no gap
+            self.last_tick_time = {}
+            self.gap_check = set()
+            self.gaps = []
+            self.reconnects = 0
+            self.ticks_since_connect = 0
+            if self.backfill:
+                self.backfill_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="backfill"
+                )
 
             def on_error(_ws, err):
                 self.logger.error("WebSocket error: %s", err)
 
-            def process_msg(msg: Dict):
-                qsize = 0
-                if "Status" in msg:
-                    self.order_queue.put(msg)
-                    qsize = self.order_queue.qsize()
-                    if qsize > 1:
-                        self.logger.debug("Order Queue Size:%d", qsize)
-                elif "LastRate" in msg:
-                    # convert the json message to a list of Dict only ohlcv
-                    # values
-                    self.callback_queue.put(
-                        {
-                            "o": msg["OpenRate"],
-                            "h": msg["High"],
-                            "l": msg["Low"],
-                            "c": msg["LastRate"],
-                            "v": msg["LastQty"],
-                            "code": msg["Token"],
-                            "t": int(msg["TickDt"][6:-2])
-                            / 1000,  # '/Date(1691557402000)/'
-                            "ChgPcnt": msg["ChgPcnt"],
-                        }
-                    )
-                    qsize = self.callback_queue.qsize()
-                    if qsize > 1:
-                        self.logger.debug("Tick Queue Size:%d", qsize)
-
             def on_message(_ws, message):
-                json_msg = json.loads(message)
                 try:
-                    # if json_msg is a list
-                    if isinstance(json_msg, list):
-                        for msg in json_msg:
-                            process_msg(msg)
-
-                    # if json_msg is a Dict
-                    elif isinstance(json_msg, dict):
-                        process_msg(json_msg)
-                    else:
-                        self.logger.error(
-                            "Unknown message type received: %s", type(json_msg)
-                        )
-                        self.logger.error("Message: %s", json_msg)
+                    ticks, orders = self.tick_decoder.decode(message)
+                    for order in orders:
+                        self.order_queue.put(order)
+                    if orders and self.hot_path_log.sample():
+                        qsize = self.order_queue.qsize()
+                        if qsize > 1:
+                            self.logger.debug("Order Queue Size:%d", qsize)
+                    enqueued_at = time.perf_counter()
+                    for tick in ticks:
+                        code = tick["code"]
+                        if self.gap_check and code in self.gap_check:
+                            self.gap_check.discard(code)
+                            self.check_gap(code, tick["t"])
+                        self.last_tick_time[code] = tick["t"]
+                        if self.held_ticks and self.hold_tick(tick):
+                            continue
+                        self.enqueue_tick(tick, enqueued_at)
+                    if ticks:
+                        self.ticks_since_connect += len(ticks)
+                        if self.hot_path_log.sample():
+                            qsize = self.callback_queue.qsize()
+                            if qsize > 1:
+                                self.logger.debug("Tick Queue Size:%d", qsize)
                 except Exception as exp:
                     self.logger.error("Error processing message: %s", exp)
                     self.logger.error("Stack Trace :%s", traceback.format_exc())
                     self.stop()
 
-            if LiveFeedManager.NIFTY_INDEX in scrip_codes:
-                self.req_list.append(
-                    {
-                        "Exch": "N",
-                        "ExchType": "C",
-                        "ScripCode": LiveFeedManager.NIFTY_INDEX,
-                    }
-                )
-                scrip_codes.pop(scrip_codes.index(LiveFeedManager.NIFTY_INDEX))
-
-            self.req_list.extend(
-                [
-                    {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
-                    for x in scrip_codes
-                ]
-            )
+            self.req_list.extend([self._req_item(x) for x in scrip_codes])
             req_data = self.client.Request_Feed("mf", "s", self.req_list)
             self.client.connect(req_data)
             self.client.error_data(on_error)
@@ -174,8 +488,10 @@ class LiveFeedManager:
 
             # Start the callback_dequeuer thread
             self.scrip_dequeuer_thread = threading.Thread(
-                target=self.callback_dequeuer,
-                args=(on_scrip_data, user_data),
+                target=self.batch_dequeuer
+                if self.batch_mode
+                else self.callback_dequeuer,
+                args=(on_scrip_data, user_data, shutdown_flag, self.callback_queue),
             )
             self.logger.info("Starting scrip data callback thread.")
             self.scrip_dequeuer_thread.start()
@@ -183,14 +499,20 @@ class LiveFeedManager:
             # Start the order_dequeuer thread
             self.order_dequeuer_thread = threading.Thread(
                 target=self.order_dequeuer,
-                args=(self.req_list, user_data, on_order_update),
+                args=(
+                    self.req_list,
+                    user_data,
+                    on_order_update,
+                    shutdown_flag,
+                    self.order_queue,
+                ),
             )
             self.logger.info("Starting order update callback thread.")
             self.order_dequeuer_thread.start()
 
             # Start receiving data in a separate thread to avoid blocking
             self.receiver_thread = threading.Thread(
-                target=self.client.receive_data, args=(on_message,)
+                target=self.receiver_loop, args=(on_message, on_error, shutdown_flag)
             )
             self.logger.info("Starting data receiver thread.")
             self.receiver_thread.start()
@@ -208,6 +530,18 @@ class LiveFeedManager:
 
             # Signal the monitoring thread to stop
             self.shutdown_flag.set()
+            with self.subscription_lock:
+                if self.flush_timer is not None:
+                    self.flush_timer.cancel()
+                    self.flush_timer = None
+                self.pending_subscribe.clear()
+                self.pending_unsubscribe.clear()
+            with self.backfill_lock:
+                self.held_ticks.clear()
+                self.backfill_starts.clear()
+                if self.backfill_executor is not None:
+                    self.backfill_executor.shutdown(wait=False, cancel_futures=True)
+                    self.backfill_executor = None
 
             self.logger.info("Stopping monitoring session.")
 
@@ -222,10 +556,22 @@ class LiveFeedManager:
 
             self.logger.debug("Order Queue Size:%d", self.order_queue.qsize())
             self.logger.debug("Tick Queue Size:%d", self.callback_queue.qsize())
+            if self.batch_mode:
+                self.logger.info(
+                    "Feed stats:%s", json.dumps(self.get_feed_stats(), indent=2)
+                )
+            elif self.conflate:
+                self.logger.info("Dropped stale ticks:%d", self.get_dropped_ticks())
 
-            self.logger.debug("Waiting for receiver thread to complete.")
-            self.receiver_thread.join()
-            self.logger.debug("All completed.")
+            receiver_thread = self.receiver_thread
+
+        # Joined without the monitoring lock, a reconnecting receiver takes it
+        # before it sees the shutdown flag
+        self.logger.debug("Waiting for receiver thread to complete.")
+        # stop() may be called from the receiver thread itself
+        if receiver_thread is not threading.current_thread():
+            receiver_thread.join()
+        self.logger.debug("All completed.")
 
     def on_cancel_order(self, message: Dict):
         # Default implementation - simply log
@@ -249,13 +595,18 @@ class LiveFeedManager:
                 user_data = {}
             if "order_update" not in user_data:
                 user_data["order_update"] = []
+            for listener in list(self.order_listeners):
+                try:
+                    listener(message)
+                except Exception as exp:
+                    self.logger.error("Error in order listener: %s", exp)
             if message["Status"] == "Fully Executed":
                 scrip_codes = [item["ScripCode"] for item in subscription_list]
                 if "RemoteOrderId" in message:
-                    if message["ScripCode"] in scrip_codes and message[
-                        "RemoteOrderId"
-                    ].startswith(
-                        "sl"
+                    if (
+                        self.unsubscribe_on_sl
+                        and message["ScripCode"] in scrip_codes
+                        and message["RemoteOrderId"].startswith("sl")
                     ):  # Unsubscribe from the scrip only if sl is hit
                         if self.unsubscribe([message["ScripCode"]]):
                             user_data["order_update"].append(message["ScripCode"])
@@ -288,39 +639,101 @@ class LiveFeedManager:
                 "Order update processed in %.2f seconds", time.time() - start_time
             )
 
-    # @DeprecationWarning  # Doesn't work - Don't use
+    def _req_item(self, scrip_code: int) -> Dict:
+        if scrip_code == LiveFeedManager.NIFTY_INDEX:
+            return {"Exch": "N", "ExchType": "C", "ScripCode": scrip_code}
+        return {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": scrip_code}
+
+    def get_subscribed(self) -> List[int]:
+        return [item["ScripCode"] for item in self.req_list]
+
+    # Subscription changes are diffed against what is already subscribed and
+    # queued, only the delta is sent. With config "subscription_batch_delay"
+    # changes arriving within that many seconds go out as one request.
     def subscribe(self, scrip_codes: List[int]) -> bool:
-        with self.monitoring_lock:
-            self.logger.info("Subscribing to scrips:%s", scrip_codes)
-            self.req_list.extend(
-                [
-                    {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
-                    for x in scrip_codes
-                ]
-            )
-            req_data = self.client.Request_Feed("mf", "s", self.req_list)
-            self.client.send_data(req_data)
-        return True
+        self._queue_subscribe(scrip_codes)
+        return self._schedule_flush()
 
     def unsubscribe(self, scrip_codes: List[int]) -> bool:
+        self._queue_unsubscribe(scrip_codes)
+        return self._schedule_flush()
+
+    # Move the subscription from old_codes to new_codes on the live connection
+    # in one go. New scrips are subscribed before the old ones are dropped, so
+    # there is no gap in the data while rolling strikes.
+    def roll(self, old_codes: List[int], new_codes: List[int]) -> bool:
+        self._queue_subscribe(new_codes)
+        self._queue_unsubscribe([code for code in old_codes if code not in new_codes])
+        return self.flush_subscriptions()
+
+    def _queue_subscribe(self, scrip_codes: List[int]) -> None:
+        with self.subscription_lock:
+            subscribed = set(self.get_subscribed())
+            for code in scrip_codes:
+                if code in self.pending_unsubscribe:
+                    self.pending_unsubscribe.discard(code)
+                elif code not in subscribed:
+                    self.pending_subscribe.add(code)
+
+    def _queue_unsubscribe(self, scrip_codes: List[int]) -> None:
+        with self.subscription_lock:
+            subscribed = set(self.get_subscribed())
+            for code in scrip_codes:
+                if code in self.pending_subscribe:
+                    self.pending_subscribe.discard(code)
+                elif code in subscribed:
+                    self.pending_unsubscribe.add(code)
+
+    def _schedule_flush(self) -> bool:
+        if self.subscription_batch_delay <= 0:
+            return self.flush_subscriptions()
+        with self.subscription_lock:
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(
+                    self.subscription_batch_delay, self.flush_subscriptions
+                )
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        return True
+
+    def flush_subscriptions(self) -> bool:
+        with self.subscription_lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            added = sorted(self.pending_subscribe)
+            removed = sorted(self.pending_unsubscribe)
+            self.pending_subscribe.clear()
+            self.pending_unsubscribe.clear()
+        if not added and not removed:
+            return True
         try:
             with self.monitoring_lock:
-                unsubscribe_list = [
-                    {"Exch": "N", "ExchType": self.exchange_type, "ScripCode": x}
-                    for x in scrip_codes
-                ]
-                req_data = self.client.Request_Feed("mf", "u", unsubscribe_list)
-                self.client.send_data(req_data)
-                # update the original subscribe_list
-                self.req_list = [
-                    item
-                    for item in self.req_list
-                    if item["ScripCode"] not in scrip_codes
-                ]
-                self.logger.info("Unsubscribed from scrips:%s", scrip_codes)
+                if not self.monitoring_active:
+                    self.logger.warning(
+                        "Monitoring is not active. Dropping subscription changes."
+                    )
+                    return False
+                if added:
+                    subscribe_list = [self._req_item(x) for x in added]
+                    req_data = self.client.Request_Feed("mf", "s", subscribe_list)
+                    self.client.send_data(req_data)
+                    self.req_list.extend(subscribe_list)
+                    self.logger.info("Subscribed to scrips:%s", added)
+                if removed:
+                    unsubscribe_list = [self._req_item(x) for x in removed]
+                    req_data = self.client.Request_Feed("mf", "u", unsubscribe_list)
+                    self.client.send_data(req_data)
+                    # updated in place, the order dequeuer holds this list
+                    self.req_list[:] = [
+                        item
+                        for item in self.req_list
+                        if item["ScripCode"] not in removed
+                    ]
+                    self.logger.info("Unsubscribed from scrips:%s", removed)
             return True
         except Exception as exp:
-            self.logger.error("Error unsubscribing from scrips:%s", scrip_codes)
+            self.logger.error("Error updating subscriptions +%s -%s", added, removed)
             self.logger.error(exp)
             self.logger.error("Stack Trace :%s", traceback.format_exc())
             self.stop()
@@ -0,0 +1,275 @@
+# Author : Prashant Srivastava
+import logging
+import math
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+
+from src.common.feed_hub import FeedHub
+from src.common.live_feed_manager import LiveFeedManager
+from src.common.strikes_manager import StrikesManager
+
+
+# Option chain kept current from the live feed instead of polling REST.
+# Seeded once from StrikesManager.get_option_chain, it holds one row per strike
+# quoted on both sides, sorted by strike, and subscribes to a window of strikes
+# around ATM. Ticks update the LTPs in place.
+# CE premium falls and PE premium rises with the strike, so CE - PE is monotone:
+# ATM is found by a binary search when seeded, then only moves to a neighbour
+# row when a tick of the ATM row or of a neighbour makes it closer to zero.
+# Only the window is live, the other rows keep their seed prices, so closest
+# premium is a binary search over the window rows.
+# The feed is a LiveFeedManager of its own, started by start(), or a FeedHub
+# shared with other consumers (e.g. FeedHub.for_client) the chain registers on.
+class LiveOptionChain:
+    def __init__(
+        self,
+        feed: Union[LiveFeedManager, FeedHub],
+        strikes_manager: StrikesManager,
+        index: str,
+        config: Dict = None,
+    ):
+        self.hub = feed if isinstance(feed, FeedHub) else None
+        self.live_feed_manager = None if self.hub else feed
+        self.consumer_id = None
+        self.strikes_manager = strikes_manager
+        self.index = index
+        self.logger = logging.getLogger(__name__)
+        config = config if isinstance(config, dict) else {}
+        # strikes subscribed on either side of ATM
+        self.window = config.get("window", 5)
+        self.lock = threading.RLock()
+        self.expiry = None
+        self.strike = np.empty(0, dtype=np.float64)
+        self.ce_ltp = np.empty(0, dtype=np.float64)
+        self.pe_ltp = np.empty(0, dtype=np.float64)
+        self.ce_code = np.empty(0, dtype=np.int64)
+        self.pe_code = np.empty(0, dtype=np.int64)
+        self.ce_name: List[str] = []
+        self.pe_name: List[str] = []
+        # scrip code -> (cp type, strike row)
+        self.rows: Dict[int, Tuple[str, int]] = {}
+        self.atm_row = -1
+        self.subscribed: List[int] = []
+        self.on_atm_change = None
+        self.on_scrip_data = None
+        self.user_data = None
+
+    def seed(self) -> None:
+        self.expiry = self.strikes_manager.get_current_expiry(self.index)
+        chain = self.strikes_manager.get_option_chain(self.index, self.expiry)
+        ce_strikes, ce_index, _ = chain.ce.quoted_strikes()
+        pe_strikes, pe_index, _ = chain.pe.quoted_strikes()
+        strikes, ce_pos, pe_pos = np.intersect1d(
+            ce_strikes, pe_strikes, assume_unique=True, return_indices=True
+        )
+        if len(strikes) == 0:
+            raise ValueError("No strike quoted on both CE and PE side")
+        ce_index = ce_index[ce_pos]
+        pe_index = pe_index[pe_pos]
+        with self.lock:
+            self.strike = strikes
+            self.ce_ltp = chain.ce.ltp[ce_index]
+            self.pe_ltp = chain.pe.ltp[pe_index]
+            self.ce_code = chain.ce.code[ce_index]
+            self.pe_code = chain.pe.code[pe_index]
+            self.ce_name = [chain.ce.name[i] for i in ce_index]
+            self.pe_name = [chain.pe.name[i] for i in pe_index]
+            self.rows = {}
+            for row, code in enumerate(self.ce_code.tolist()):
+                self.rows[code] = ("CE", row)
+            for row, code in enumerate(self.pe_code.tolist()):
+                self.rows[code] = ("PE", row)
+            self.atm_row = self._atm_row()
+        self.logger.info(
+            "Seeded %s option chain with %d strikes, ATM %.2f",
+            self.index,
+            len(strikes),
+            self.strike[self.atm_row],
+        )
+
+    # Seed the chain and start streaming the window around ATM.
+    # on_atm_change(old strike, new strike, user_data) fires from the feed
+    # thread; on_scrip_data receives every tick of the window after it is applied
+    def start(
+        self,
+        on_atm_change: Callable[[float, float, Dict], None] = None,
+        on_scrip_data: Callable[[Dict, Dict], None] = None,
+        user_data: Dict = None,
+    ) -> None:
+        # The ticks of a running feed go to the callback it was started with,
+        # the chain would never see them and silently keep its seed prices
+        if self.hub is None and self.live_feed_manager.is_active():
+            raise RuntimeError(
+                "Feed already monitored, share it through a FeedHub instead"
+            )
+        self.on_atm_change = on_atm_change
+        self.on_scrip_data = on_scrip_data
+        self.user_data = user_data if user_data is not None else {}
+        self.seed()
+        with self.lock:
+            self.subscribed = self._window_codes()
+        if self.hub is not None:
+            self.consumer_id = self.hub.register(
+                self.subscribed, self.on_tick, user_data=self.user_data
+            )
+        else:
+            self.live_feed_manager.monitor(
+                self.subscribed,
+                on_scrip_data=self.on_tick,
+                user_data=self.user_data,
+            )
+
+    def stop(self) -> None:
+        if self.hub is not None:
+            if self.consumer_id is not None:
+                self.hub.unregister(self.consumer_id)
+                self.consumer_id = None
+        elif self.live_feed_manager.is_active():
+            self.live_feed_manager.stop()
+
+    def on_tick(self, ohlcvt: Any, user_data: Dict = None) -> None:
+        # batch_mode feeds hand over a list of ticks
+        ticks = ohlcvt if isinstance(ohlcvt, list) else [ohlcvt]
+        for tick in ticks:
+            self.update(tick["code"], tick["c"])
+            if self.on_scrip_data:
+                try:
+                    self.on_scrip_data(tick, user_data)
+                except Exception as exp:
+                    self.logger.error("Error in scrip data callback: %s", exp)
+                    self.logger.error("Stack Trace :%s", traceback.format_exc())
+
+    def update(self, code: int, ltp: float) -> None:
+        row = self.rows.get(code)
+        if row is None or ltp <= 0:
+            return
+        with self.lock:
+            if row[0] == "CE":
+                self.ce_ltp[row[1]] = ltp
+            else:
+                self.pe_ltp[row[1]] = ltp
+            # Other rows can't get closer to the zero crossing than a neighbour
+            if abs(row[1] - self.atm_row) > 1:
+                return
+            old_row = self.atm_row
+            self.atm_row = self._walk_atm_row(old_row)
+            if self.atm_row == old_row:
+                return
+            old_strike = float(self.strike[old_row])
+            new_strike = float(self.strike[self.atm_row])
+            old_codes = self.subscribed
+            self.subscribed = self._window_codes()
+        self.logger.info("ATM strike moved from %.2f to %.2f", old_strike, new_strike)
+        # re-center the window, only the strikes at the edges change
+        self._roll(old_codes, self.subscribed)
+        if self.on_atm_change:
+            try:
+                self.on_atm_change(old_strike, new_strike, self.user_data)
+            except Exception as exp:
+                self.logger.error("Error in ATM change callback: %s", exp)
+                self.logger.error("Stack Trace :%s", traceback.format_exc())
+
+    # New strikes are subscribed before the old ones are dropped
+    def _roll(self, old_codes: List[int], new_codes: List[int]) -> None:
+        if self.hub is None:
+            self.live_feed_manager.roll(old_codes, new_codes)
+        elif self.consumer_id is not None:
+            self.hub.add_scrips(self.consumer_id, new_codes)
+            self.hub.remove_scrips(
+                self.consumer_id, [code for code in old_codes if code not in new_codes]
+            )
+
+    def _atm_row(self) -> int:
+        # CE - PE decreases with the strike, ATM is next to its zero crossing
+        diff = self.ce_ltp - self.pe_ltp
+        pos = int(np.searchsorted(-diff, 0.0))
+        if pos == 0:
+            return 0
+        if pos == len(diff):
+            return pos - 1
+        return pos - 1 if abs(diff[pos - 1]) <= abs(diff[pos]) else pos
+
+    def _atm_gap(self, row: int) -> float:
+        return abs(self.ce_ltp[row] - self.pe_ltp[row])
+
+    # Moves from row towards the neighbour with the smaller |CE - PE|, O(1)
+    # per tick unless the market jumped several strikes
+    def _walk_atm_row(self, row: int) -> int:
+        last = len(self.strike) - 1
+        while row < last and self._atm_gap(row + 1) < self._atm_gap(row):
+            row += 1
+        while row > 0 and self._atm_gap(row - 1) < self._atm_gap(row):
+            row -= 1
+        return row
+
+    # Strike rows [low, high) of the subscribed window
+    def _window_bounds(self) -> Tuple[int, int]:
+        low = max(self.atm_row - self.window, 0)
+        high = min(self.atm_row + self.window + 1, len(self.strike))
+        return low, high
+
+    def _window_codes(self) -> List[int]:
+        low, high = self._window_bounds()
+        return self.ce_code[low:high].tolist() + self.pe_code[low:high].tolist()
+
+    def _contract(self, cp_type: str, row: int) -> Dict[str, Any]:
+        if cp_type == "CE":
+            ltp, code, name = self.ce_ltp, self.ce_code, self.ce_name
+        else:
+            ltp, code, name = self.pe_ltp, self.pe_code, self.pe_name
+        return {
+            "ltp": float(ltp[row]),
+            "code": int(code[row]),
+            "name": name[row],
+            "strike": float(self.strike[row]),
+        }
+
+    # Returns (strike, ce contract, pe contract, difference) like OptionChain.atm
+    def atm(self) -> Tuple[float, Dict, Dict, float]:
+        with self.lock:
+            row = self.atm_row
+            return (
+                float(self.strike[row]),
+                self._contract("CE", row),
+                self._contract("PE", row),
+                float(abs(self.ce_ltp[row] - self.pe_ltp[row])),
+            )
+
+    # Contract with premium closest to, but not below, price_thresh, among the
+    # live window rows. Returns (contract or None, difference) like
+    # OptionChain.closest_premium; None also when the answer may lie outside
+    # the window (use a wider config "window" for far OTM premiums)
+    def closest_premium(self, cp_type: str, price_thresh: float):
+        with self.lock:
+            low, high = self._window_bounds()
+            if cp_type == "CE":
+                # CE premium falls with the strike: last row still >= thresh
+                ltp = self.ce_ltp[low:high]
+                row = low + int(np.searchsorted(-ltp, -price_thresh, "right")) - 1
+                # a row past the window may still be >= thresh
+                if row < low or (row == high - 1 and high < len(self.strike)):
+                    return None, math.inf
+                ltp = self.ce_ltp[row]
+            else:
+                # PE premium rises with the strike: first row >= thresh
+                ltp = self.pe_ltp[low:high]
+                row = low + int(np.searchsorted(ltp, price_thresh, "left"))
+                # a row before the window may still be >= thresh
+                if row == high or (row == low and low > 0):
+                    return None, math.inf
+                ltp = self.pe_ltp[row]
+            return self._contract(cp_type, row), float(ltp - price_thresh)
+
+    def straddle_strikes(self) -> Dict[str, Any]:
+        _, ce_contract, pe_contract, _ = self.atm()
+        return {
+            "ce_code": ce_contract["code"],
+            "pe_code": pe_contract["code"],
+            "ce_ltp": ce_contract["ltp"],
+            "pe_ltp": pe_contract["ltp"],
+            "ce_name": ce_contract["name"],
+            "pe_name": pe_contract["name"],
+        }
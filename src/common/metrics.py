@@ -0,0 +1,92 @@
+# Author : Prashant Srivastava
+import bisect
+import math
+import threading
+from typing import Dict, List
+
+
+# Fixed bucket histogram, cheap enough to record on the hot path.
+# Percentiles are approximated by the upper bound of the matching bucket.
+class Histogram:
+    def __init__(self, name: str, bounds: List[float]):
+        self.name = name
+        self.bounds = sorted(bounds)
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * pct / 100.0)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.min = math.inf
+            self.max = -math.inf
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            buckets = {
+                (f"<={bound}" if index < len(self.bounds) else f">{self.bounds[-1]}"): (
+                    bucket_count
+                )
+                for index, (bound, bucket_count) in enumerate(
+                    zip(self.bounds + [self.bounds[-1]], self.counts)
+                )
+            }
+            return {
+                "name": self.name,
+                "count": self.count,
+                "mean": self.mean(),
+                "min": self.min if self.count else 0.0,
+                "max": self.max if self.count else 0.0,
+                "p50": self.percentile(50),
+                "p99": self.percentile(99),
+                "buckets": buckets,
+            }
+
+
+# Bucket bounds in seconds, 10us .. 5s
+LATENCY_BOUNDS = [
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+]
+
+SIZE_BOUNDS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
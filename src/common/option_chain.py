@@ -0,0 +1,86 @@
+# Author : Prashant Srivastava
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+# One side (CE or PE) of the chain as parallel arrays, in contract order
+class ChainSide:
+    # pylint: disable=too-few-public-methods
+    def __init__(self, contracts: List[Dict]):
+        self.ltp = np.array([c["LastRate"] for c in contracts], dtype=np.float64)
+        self.code = np.array([c["ScripCode"] for c in contracts], dtype=np.int64)
+        self.strike = np.array(
+            [c.get("StrikeRate", 0.0) for c in contracts], dtype=np.float64
+        )
+        self.name = [c["Name"] for c in contracts]
+
+    def contract(self, index: int) -> Dict[str, Any]:
+        return {
+            "ltp": float(self.ltp[index]),
+            "code": int(self.code[index]),
+            "name": self.name[index],
+            "strike": float(self.strike[index]),
+        }
+
+    # Strikes quoted with ltp > 0, the last contract wins for a repeated strike.
+    # Returns (unique strikes, contract index, first position of the strike)
+    def quoted_strikes(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        quoted = np.nonzero(self.ltp > 0)[0]
+        strikes = self.strike[quoted]
+        _, first = np.unique(strikes, return_index=True)
+        reverse = quoted[::-1]
+        uniq, last = np.unique(self.strike[reverse], return_index=True)
+        return uniq, reverse[last], quoted[first]
+
+
+# Option chain normalized once into columnar numpy arrays so that strike
+# selection is vectorized instead of walking the contracts list per query.
+class OptionChain:
+    def __init__(self, contracts: List[Dict]):
+        self.ce = ChainSide([c for c in contracts if c["CPType"] == "CE"])
+        self.pe = ChainSide([c for c in contracts if c["CPType"] == "PE"])
+
+    def side(self, cp_type: str) -> ChainSide:
+        return self.ce if cp_type == "CE" else self.pe
+
+    # ATM: strike quoted on both sides with minimum |CE - PE|.
+    # Returns (strike, ce contract, pe contract, difference)
+    def atm(self) -> Tuple[float, Dict, Dict, float]:
+        ce_strikes, ce_index, ce_first = self.ce.quoted_strikes()
+        pe_strikes, pe_index, _ = self.pe.quoted_strikes()
+        _, ce_pos, pe_pos = np.intersect1d(
+            ce_strikes, pe_strikes, assume_unique=True, return_indices=True
+        )
+        if len(ce_pos) == 0:
+            raise ValueError("No strike quoted on both CE and PE side")
+        ce_index = ce_index[ce_pos]
+        pe_index = pe_index[pe_pos]
+        diff = np.abs(self.ce.ltp[ce_index] - self.pe.ltp[pe_index])
+        # ties go to the strike listed first in the chain
+        order = np.argsort(ce_first[ce_pos], kind="stable")
+        best = order[np.argmin(diff[order])]
+        return (
+            float(self.ce.strike[ce_index[best]]),
+            self.ce.contract(ce_index[best]),
+            self.pe.contract(pe_index[best]),
+            float(diff[best]),
+        )
+
+    # Contract with premium closest to, but not below, price_thresh.
+    # Returns (contract or None, difference)
+    def closest_premium(self, cp_type: str, price_thresh: float):
+        side = self.side(cp_type)
+        diff = side.ltp - price_thresh
+        diff[diff < 0] = np.inf
+        if len(diff) == 0 or np.isinf(diff.min()):
+            return None, math.inf
+        best = int(np.argmin(diff))
+        return side.contract(best), float(diff[best])
+
+    # Strikes listed in the chain within num_strikes steps of strike
+    def strikes_around(self, strike: float, num_strikes: int) -> List[float]:
+        strikes = np.union1d(self.ce.strike, self.pe.strike)
+        pos = int(np.searchsorted(strikes, strike))
+        return strikes[max(pos - num_strikes, 0) : pos + num_strikes + 1].tolist()
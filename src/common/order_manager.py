@@ -4,17 +4,26 @@ import json
 import logging
 import time
 
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List
 from src.clients.iclientmanager import IClientManager
 from src.common import live_feed_manager
+from src.common.order_tracker import OrderTracker
+from src.common.position_ledger import PositionLedger
+from src.common.trade_book_index import TradeBookIndex
 
 
 # This class is responsible for placing orders, monitoring them and squaring off
 # Currently its too much tied to 5paisa, need to make it generic
 class OrderManager:
-    def __init__(self, client: IClientManager, config) -> None:
+    def __init__(
+        self, client: IClientManager, config, order_tracker: OrderTracker = None
+    ) -> None:
         self.client = client
         self.config = config
+        # With a tracker attached to a live feed, fills are awaited on the push
+        # order updates and REST is only the timed out fallback
+        self.order_tracker = order_tracker
         self.logger = logging.getLogger(__name__)
         self.live_feed_mgr = None
         self.target_achieved = False
@@ -24,100 +33,198 @@ class OrderManager:
             self.sl_factor = self.config["SL_FACTOR"]
         else:
             self.sl_factor = 1.65
+        # Entry legs are tracked until filled for at most FILL_TIMEOUT seconds,
+        # with ALL_OR_NOTHING a partially filled entry is rolled back
+        self.fill_timeout = self.config.get("FILL_TIMEOUT", 60.0)
+        self.fill_poll_interval = self.config.get("FILL_POLL_INTERVAL", 0.5)
+        self.all_or_nothing = self.config.get("ALL_OR_NOTHING", False)
+        # Pause between consecutive stop loss orders, 0 against a paper broker
+        self.sl_order_gap = self.config.get("SL_ORDER_GAP", 0.5)
 
     def set_exchange_type(self, exch_type: str) -> str:
         self.exchange_type = exch_type
 
-    def place_short(self, strikes: Dict, tag: str) -> None:
-        for item in ["ce", "pe"]:
-            # Market Order if price =0.0, we place a limit order instead with 0.5 less
-            # to increase the chances of execution
-            price = self.square_off_price(rate=strikes[f"{item}_ltp"]) - 0.5
-            scrip_code = strikes[f"{item}_code"]
-
-            self.logger.info(
-                "Placing order | Code=%d QTY=%d Price = %f tag = %s",
-                scrip_code,
-                self.qty,
-                price,
+    def place_short(self, strikes: Dict, tag: str) -> bool:
+        legs = [
+            {"code": strikes[f"{item}_code"], "ltp": strikes[f"{item}_ltp"]}
+            for item in ["ce", "pe"]
+        ]
+        return self.place_legs(legs, tag)
+
+    # Places any number of legs (straddle, strangle, iron condor) at once.
+    # Each leg is a dict with "code" and "ltp", optionally "side" ("S" default
+    # or "B"), "qty" and "price". All legs are sent in parallel, then one
+    # loop tracks the fills of the whole tag until the deadline.
+    # Returns True if every leg got fully executed.
+    def place_legs(
+        self,
+        legs: List[Dict],
+        tag: str,
+        fill_timeout: float = None,
+        all_or_nothing: bool = None,
+    ) -> bool:
+        if fill_timeout is None:
+            fill_timeout = self.fill_timeout
+        if all_or_nothing is None:
+            all_or_nothing = self.all_or_nothing
+        if not legs:
+            return True
+        with ThreadPoolExecutor(
+            max_workers=len(legs), thread_name_prefix="order_leg"
+        ) as pool:
+            placed = list(pool.map(lambda leg: self._place_leg(leg, tag), legs))
+        placed_codes = [leg["code"] for leg, done in zip(legs, placed) if done]
+        filled = set()
+        if placed_codes:
+            filled = self.wait_for_fills(tag, placed_codes, time.time() + fill_timeout)
+        complete = all(placed) and filled >= set(leg["code"] for leg in legs)
+        if complete:
+            self.logger.info("All short orders executed !")
+        else:
+            self.logger.warning(
+                "Entry incomplete for %s, filled %s of %s",
                 tag,
+                sorted(filled),
+                [leg["code"] for leg in legs],
             )
-
+            if all_or_nothing:
+                self.rollback_legs(tag, legs)
+        return complete
+
+    def _place_leg(self, leg: Dict, tag: str) -> bool:
+        side = leg.get("side", "S")
+        qty = leg.get("qty", self.qty)
+        price = leg.get("price", None)
+        if price is None:
+            # Market Order if price =0.0, we place a limit order instead with
+            # 0.5 less (more for buy) to increase the chances of execution
+            offset = -0.5 if side == "S" else 0.5
+            price = self.square_off_price(rate=leg["ltp"]) + offset
+        self.logger.info(
+            "Placing order | Code=%d QTY=%d Price = %f tag = %s",
+            leg["code"],
+            qty,
+            price,
+            tag,
+        )
+        self.new_order(tag, leg["code"])
+        try:
             order_status = self.client.place_order(
-                OrderType="S",
+                OrderType=side,
                 Exchange="N",
                 ExchangeType=self.exchange_type,
-                ScripCode=scrip_code,
-                Qty=self.qty,
+                ScripCode=leg["code"],
+                Qty=qty,
                 Price=price,
                 IsIntraday=True,
                 RemoteOrderID=tag,
             )
-            if order_status["Message"] == "Success":
-                self.logger.debug("%s_done", item)
-            time.sleep(2)
-            pending_orders = self.get_sl_pending_orders(tag)
-            if len(pending_orders) > 0:
+        except Exception as exp:
+            self.logger.error("Failed to place order for %d: %s", leg["code"], exp)
+            return False
+        if order_status and order_status["Message"] == "Success":
+            self.logger.debug("%d done", leg["code"])
+            return True
+        self.logger.error("Failed to place order for %d: %s", leg["code"], order_status)
+        return False
+
+    # Single fill tracking loop for all orders of a tag. Returns the scrip codes
+    # fully executed with nothing pending by the time every code is either
+    # executed or rejected, or the deadline passes.
+    def wait_for_fills(self, tag: str, scrip_codes: List[int], deadline: float):
+        scrip_codes = set(scrip_codes)
+        if self.tracking_live():
+            futures = [self.order_tracker.expect(tag, code) for code in scrip_codes]
+            done, _ = wait(futures, timeout=max(deadline - time.time(), 0.0))
+            if len(done) == len(futures):
+                return {
+                    future.result()["ScripCode"]
+                    for future in done
+                    if future.result()["Status"] == "Fully Executed"
+                }
+            self.logger.warning("No push update for all %s orders, checking REST", tag)
+        while True:
+            response = self.client.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": tag}]
+            )
+            order_status = response["OrdStatusResLst"] if response else []
+            executed = set()
+            pending = set()
+            rejected = set()
+            for order in order_status:
+                code = order["ScripCode"]
+                if code not in scrip_codes:
+                    continue
+                if order["Status"] == "Fully Executed" and order["PendingQty"] == 0:
+                    executed.add(code)
+                elif "Rejected" in order["Status"] or "Cancelled" in order["Status"]:
+                    rejected.add(code)
+                else:
+                    pending.add(code)
+            filled = executed - pending
+            if filled | rejected >= scrip_codes:
+                return filled
+            if time.time() >= deadline:
                 self.logger.warning(
-                    "%s orders not executed ! Waiting for another 1 min",
-                    json.dumps(pending_orders, indent=2),
+                    "%s orders not executed in time !",
+                    sorted(scrip_codes - filled - rejected),
                 )
-                time.sleep(60)
-            else:
-                self.logger.info("All short orders executed !")
+                return filled
+            time.sleep(self.fill_poll_interval)
+
+    def tracking_live(self) -> bool:
+        return self.order_tracker is not None and self.order_tracker.is_live()
+
+    # The tracker must not take an earlier order of tag and scrip for this one
+    def new_order(self, tag: str, scrip_code: int) -> None:
+        if self.order_tracker is not None:
+            self.order_tracker.new_order(tag, scrip_code)
+
+    # Wait up to timeout for news on the tag, returns early on a push update
+    def wait_for_update(self, tag: str, timeout: float) -> None:
+        if self.tracking_live():
+            self.order_tracker.wait_for_update(tag, timeout)
+        else:
+            time.sleep(timeout)
+
+    # Undo a partial entry: cancel what is still pending and square off what
+    # got executed
+    def rollback_legs(self, tag: str, legs: List[Dict]) -> None:
+        self.logger.warning("Rolling back entry %s", tag)
+        pending_orders = self.get_sl_pending_orders(tag)
+        if pending_orders:
+            self.client.cancel_bulk_order(pending_orders)
+        self.squareoff(tag=tag, strikes={leg["code"]: leg["ltp"] for leg in legs})
 
     def aggregate_sl_orders(self, tag: str, sl_factor: float = 1.65):
         sl_details = None
         response = self.client.get_tradebook()
         if response:
-            trade_book = response["TradeBookDetail"]
+            trade_book = TradeBookIndex(response["TradeBookDetail"])
             response = self.client.fetch_order_status(
                 [{"Exch": "N", "RemoteOrderID": tag}]
             )
             if response:
                 order_status = response["OrdStatusResLst"]
                 sl_exch_order_ids = [
-                    int(x["ExchOrderID"])
+                    x["ExchOrderID"]
                     for x in order_status
                     if x["PendingQty"] == 0 and x["Status"] == "Fully Executed"
                 ]
-                for items in trade_book:
-                    exch_order_id = int(items["ExchOrderID"])
-                    if exch_order_id not in sl_exch_order_ids:
-                        continue
-                    scrip_code = items["ScripCode"]
+                totals = TradeBookIndex.aggregate(
+                    trade_book.for_exch_orders(sl_exch_order_ids)
+                )
+                for scrip_code, item in totals.items():
                     if sl_details is None:
                         sl_details = {}
-                    if scrip_code not in sl_details:
-                        sl_details[scrip_code] = {
-                            "Rate": 0,
-                            "Qty": 0,
-                            "Premium": 0,
-                            "Avg": 0,
-                            "max_loss": 0,
-                            "sl": 0,
-                            "higher_price": 0,
-                        }
-                    sl_details[scrip_code]["Rate"] += items["Rate"]
-                    sl_details[scrip_code]["Qty"] += items["Qty"]
-                    sl_details[scrip_code]["Premium"] += items["Rate"] * items["Qty"]
-                    sl_details[scrip_code]["Avg"] = (
-                        sl_details[scrip_code]["Premium"]
-                        / sl_details[scrip_code]["Qty"]
-                        if sl_details[scrip_code]["Qty"] != 0
-                        else 0
-                    )
-
-                    sl_details[scrip_code]["sl"] = int(
-                        sl_details[scrip_code]["Avg"] * sl_factor
-                    )
+                    sl_details[scrip_code] = dict(item)
+                    sl_details[scrip_code]["sl"] = int(item["Avg"] * sl_factor)
                     sl_details[scrip_code]["higher_price"] = (
                         sl_details[scrip_code]["sl"] + 0.5
                     )
                     sl_details[scrip_code]["max_loss"] = (
-                        sl_details[scrip_code]["higher_price"]
-                        - sl_details[scrip_code]["Avg"]
-                    ) * sl_details[scrip_code]["Qty"]
+                        sl_details[scrip_code]["higher_price"] - item["Avg"]
+                    ) * item["Qty"]
             else:
                 self.logger.warning("No Order Status found for %s", tag)
         else:
@@ -137,7 +244,7 @@ class OrderManager:
                     "No fully executed Orders found for %s waiting for 2 seconds", tag
                 )
                 retries += 1
-                time.sleep(2)
+                self.wait_for_update(tag, 2)
             else:
                 break
         if sl_details is None:
@@ -158,6 +265,7 @@ class OrderManager:
                 detail["higher_price"],
                 sl_tag,
             )
+            self.new_order(sl_tag, scrip_code)
             order_status = self.client.place_order(
                 OrderType="B",
                 Exchange="N",
@@ -175,7 +283,7 @@ class OrderManager:
                 self.logger.info("Placed for %d", scrip_code)
             else:
                 self.logger.error("Failed to place stop loss for %d", scrip_code)
-            time.sleep(0.5)
+            time.sleep(self.sl_order_gap)
 
         ## Make it generic, remove following logging, as those doesn't belong here
         self.logger.info("Collecting Maximum Premium of :%f INR", max_premium)
@@ -201,10 +309,17 @@ class OrderManager:
                 total += item["Pnl"]
         return total
 
-    def get_sl_pending_orders(self, sl_tag: str):
-        order_status = self.client.fetch_order_status(
-            [{"Exch": "N", "RemoteOrderID": sl_tag}]
-        )["OrdStatusResLst"]
+    # Order status of a strategy's whole tag family (entry, stop loss and
+    # square off orders) in one request. Returns {tag: [order status]}
+    def fetch_tag_family_status(self, tag: str) -> Dict[str, List]:
+        return self.client.fetch_order_status_by_tags([tag, "sl" + tag, "sq" + tag])
+
+    # order_status: rows of sl_tag already fetched, e.g. by fetch_tag_family_status
+    def get_sl_pending_orders(self, sl_tag: str, order_status: List = None):
+        if order_status is None:
+            order_status = self.client.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": sl_tag}]
+            )["OrdStatusResLst"]
         # get all ExchOrderID from r where "PendingQty" is not 0, Status is
         # "Pending"
         sl_exch_order_ids = [
@@ -229,53 +344,23 @@ class OrderManager:
             round(rate * 2) / 2, 2
         )  # Round to nearest 0.05 (considering same tick size)
 
-    def squareoff(self, tag: str, strikes: Dict) -> None:
-        exchange_order_list = []
+    def squareoff(self, tag: str, strikes: Dict, order_status: List = None) -> None:
         keep_polling = False
-        placed_sq_off = 0
-        order_status = self.client.fetch_order_status(
-            [{"Exch": "N", "RemoteOrderID": tag}]
-        )["OrdStatusResLst"]
-        for order in order_status:
-            eoid = order["ExchOrderID"]
-            if eoid != "":
-                exchange_order_list.append(eoid)
-        trade_book = self.client.get_tradebook()["TradeBookDetail"]
-        for eoid in exchange_order_list:
-            for trade in trade_book:
-                if eoid == int(trade["ExchOrderID"]):
-                    buysell_type = self.reverse_order(trade["BuySell"])
-                    scrip = trade["ScripCode"]
-                    qty = trade["Qty"]
-                    segment = trade["ExchType"]
-                    ltp = self.square_off_price(rate=strikes[scrip])
-                    is_intraday = trade["DelvIntra"]
-                    scrip_name = trade["ScripName"]
-                    self.logger.info(
-                        "Square off: ScripCode:%d | ScripName:%s | Price:%.2f | Qty:%d | Tag:%s",
-                        scrip,
-                        scrip_name,
-                        ltp,
-                        qty,
-                        "sq" + tag,
-                    )
-                    order_status = self.client.place_order(
-                        OrderType=buysell_type,
-                        Exchange="N",
-                        ExchangeType=segment,
-                        ScripCode=scrip,
-                        Qty=qty,
-                        Price=ltp,
-                        StopLossPrice=0.0,
-                        IsIntraday=self.intraday(is_intraday),
-                        RemoteOrderID="sq" + tag,
-                    )
-                    if order_status["Message"] == "Success":
-                        self.logger.info("Square off order Placed for %d", scrip)
-                        placed_sq_off = placed_sq_off + 1
+        # One round trip per endpoint for the lookups, the polling below must
+        # see fresh order books so it runs outside of the scope
+        with self.client.request_scope():
+            placed_sq_off, sq_scrips = self._place_squareoff(tag, strikes, order_status)
 
         # Wait till all orders are squared off
         keep_polling = placed_sq_off > 0
+        if keep_polling and self.tracking_live():
+            futures = [self.order_tracker.expect("sq" + tag, x) for x in sq_scrips]
+            _, not_done = wait(futures, timeout=self.fill_timeout)
+            if not not_done:
+                keep_polling = False
+                self.logger.info("All orders executed or rejected")
+            else:
+                self.logger.warning("No push update for all square off orders")
         retries = 0
         while keep_polling:
             order_book = self.client.order_book()
@@ -314,6 +399,54 @@ class OrderManager:
                     keep_polling = False
                     self.logger.info("order_book empty")
 
+    def _place_squareoff(self, tag: str, strikes: Dict, order_status: List = None):
+        exchange_order_list = []
+        placed_sq_off = 0
+        sq_scrips = []
+        if order_status is None:
+            order_status = self.client.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": tag}]
+            )["OrdStatusResLst"]
+        for order in order_status:
+            eoid = order["ExchOrderID"]
+            if eoid != "":
+                exchange_order_list.append(eoid)
+        trade_book = TradeBookIndex(self.client.get_tradebook()["TradeBookDetail"])
+        for eoid in exchange_order_list:
+            for trade in trade_book.for_exch_orders([eoid]):
+                buysell_type = self.reverse_order(trade["BuySell"])
+                scrip = trade["ScripCode"]
+                qty = trade["Qty"]
+                segment = trade["ExchType"]
+                ltp = self.square_off_price(rate=strikes[scrip])
+                is_intraday = trade["DelvIntra"]
+                scrip_name = trade["ScripName"]
+                self.logger.info(
+                    "Square off: ScripCode:%d | ScripName:%s | Price:%.2f | Qty:%d | Tag:%s",
+                    scrip,
+                    scrip_name,
+                    ltp,
+                    qty,
+                    "sq" + tag,
+                )
+                self.new_order("sq" + tag, scrip)
+                order_status = self.client.place_order(
+                    OrderType=buysell_type,
+                    Exchange="N",
+                    ExchangeType=segment,
+                    ScripCode=scrip,
+                    Qty=qty,
+                    Price=ltp,
+                    StopLossPrice=0.0,
+                    IsIntraday=self.intraday(is_intraday),
+                    RemoteOrderID="sq" + tag,
+                )
+                if order_status["Message"] == "Success":
+                    self.logger.info("Square off order Placed for %d", scrip)
+                    placed_sq_off = placed_sq_off + 1
+                    sq_scrips.append(scrip)
+        return placed_sq_off, sq_scrips
+
     def day_over(self, expiry_day: int) -> bool:
         # Look for 15:26 PM on non expiry
         current_time = datetime.datetime.now()
@@ -326,13 +459,14 @@ class OrderManager:
             return True
         return False
 
-    def get_executed_orders(self, tag: str) -> Dict:
+    def get_executed_orders(self, tag: str, order_status: List = None) -> Dict:
         orderbook = self.client.order_book()
         pending_orders = list(filter(lambda x: x["RemoteOrderID"] == tag, orderbook))
         feeds = {}
-        order_status = self.client.fetch_order_status(
-            [{"Exch": "N", "RemoteOrderID": tag}]
-        )["OrdStatusResLst"]
+        if order_status is None:
+            order_status = self.client.fetch_order_status(
+                [{"Exch": "N", "RemoteOrderID": tag}]
+            )["OrdStatusResLst"]
 
         for order in pending_orders:
             if order["OrderStatus"] == "Fully Executed":
@@ -346,17 +480,40 @@ class OrderManager:
                         break
         return feeds
 
-    def squareoff_sl_order(self, tag: str) -> None:
-        sl_exchan_orders = self.get_sl_pending_orders("sl" + tag)
+    def squareoff_sl_order(self, tag: str, order_status: List = None) -> None:
+        sl_exchan_orders = self.get_sl_pending_orders("sl" + tag, order_status)
         self.client.cancel_bulk_order(sl_exchan_orders)
 
+    # Square off the legs and cancel the pending stop losses of a strategy.
+    # The stop losses are fetched after the square off: one may have filled
+    # while it was polled
+    def squareoff_with_sl(self, tag: str, strikes: Dict) -> None:
+        order_status = self.client.fetch_order_status(
+            [{"Exch": "N", "RemoteOrderID": tag}]
+        )["OrdStatusResLst"]
+        self.squareoff(tag=tag, strikes=strikes, order_status=order_status)
+        self.logger.info("Cancelling pending stop loss orders")
+        self.squareoff_sl_order(tag=tag)
+
     def monitor_v2(self, target: float, tag: str, expiry_day: int) -> None:
-        executed_orders = self.get_executed_orders(tag)
-        if len(executed_orders.keys()) == 0:
-            self.logger.info("No Executed Orders Found!")
-            return
-        sl_exchan_orders = self.get_sl_pending_orders("sl" + tag)
-        self.live_feed_mgr = live_feed_manager.LiveFeedManager(self.client, {})
+        with self.client.request_scope():
+            family = self.fetch_tag_family_status(tag)
+            executed_orders = self.get_executed_orders(tag, family[tag])
+            if len(executed_orders.keys()) == 0:
+                self.logger.info("No Executed Orders Found!")
+                return
+            sl_exchan_orders = self.get_sl_pending_orders(
+                "sl" + tag, family["sl" + tag]
+            )
+        # Only the latest LTP per leg matters for MTM, conflate the ticks so a
+        # slow squareoff never leaves us processing stale prices
+        self.live_feed_mgr = live_feed_manager.LiveFeedManager(
+            self.client, {"conflate": True}
+        )
+        # Sold legs, the MTM total moves by the delta of the leg that ticked
+        ledger = PositionLedger()
+        for code, order in executed_orders.items():
+            ledger.add_leg(code, order["rate"], order["qty"], "S")
 
         def pnl_calculator(res: Dict, items: Dict):
             try:
@@ -367,30 +524,25 @@ class OrderManager:
 
                 code = res["code"]
                 ltp = res["c"]
-                # Get user_data from items
-                qty = items["executedOrders"][code]["qty"]
-                avg = items["executedOrders"][code]["rate"]
                 mtm_target = items["mtm_target"]
                 # mtm_loss = items["mtm_loss"]
-                # Calculate MTM on each leg
-                items["strikes"][code] = (avg - ltp) * qty
+                # Calculate MTM on the leg, the total follows
+                total_pnl = ledger.mark(code, ltp)
                 # Add LTP for each leg, required for square off
                 if "ltp" not in items:
                     items["ltp"] = {}
                 items["ltp"][code] = ltp
                 freq = items["freq"]
 
-                if len(items["strikes"].keys()) == len(
-                    items["executedOrders"].keys()
-                ):  # wait for both legs prices availability
-                    # calculate MTM summing the pnl of each leg
-                    total_pnl = sum(items["strikes"].values())
+                if ledger.all_priced():  # wait for all legs prices availability
                     # log when time elaspse since last is more than freq
                     if time.time() - items["last"] > freq:
                         self.logger.info(
-                            "Current MTM: %f %s",
+                            "Current MTM: %f (peak %f, drawdown %f) %s",
                             total_pnl,
-                            json.dumps(items["strikes"], indent=2),
+                            ledger.peak,
+                            ledger.drawdown,
+                            json.dumps(ledger.leg_pnls(), indent=2),
                         )
                         items["last"] = time.time()
                     if total_pnl >= mtm_target:
@@ -398,7 +550,7 @@ class OrderManager:
                         self.logger.info(
                             "Current MTM: %f %s",
                             total_pnl,
-                            json.dumps(items["strikes"], indent=2),
+                            json.dumps(ledger.leg_pnls(), indent=2),
                         )
                         self.logger.info(
                             "Target Achieved: %f | Profit Threshold %f ",
@@ -407,16 +559,14 @@ class OrderManager:
                         )
                         # Sqaure off both legs
                         self.logger.info("Squaring off both legs")
-                        self.squareoff(tag=tag, strikes=items["ltp"])
-                        self.logger.info("Cancelling pending stop loss orders")
-                        self.squareoff_sl_order(tag=tag)
+                        self.squareoff_with_sl(tag=tag, strikes=items["ltp"])
                         self.logger.info("Stopping live feed")
                         self.live_feed_mgr.stop()
                     # elif total_pnl <= mtm_loss:
                     #     # STOP LOSS HIT
                     #     self.logger.info(
                     #         "Current MTM: %f %s"
-                    #         % (total_pnl, json.dumps(items["strikes"], indent=2))
+                    #         % (total_pnl, json.dumps(ledger.leg_pnls(), indent=2))
                     #     )
                     #     self.logger.info(
                     #         "Stop Loss Hit: %f | Loss Threshold %f"
@@ -444,7 +594,6 @@ class OrderManager:
 
         try:
             current_order_state = {
-                "strikes": {},
                 "sl_exchan_orders": sl_exchan_orders,
                 "expiry_day": expiry_day,
                 "executedOrders": executed_orders,
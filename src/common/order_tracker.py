@@ -0,0 +1,131 @@
+# Author : Prashant Srivastava
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Set, Tuple
+
+from src.common.live_feed_manager import LiveFeedManager
+
+
+# Order state kept from the push "Status" messages of the live feed.
+# Waiting for a fill is a Future resolved by the order update itself, so the
+# callers need no sleeps nor REST polling while the feed is alive.
+# Futures resolve with the last order message once the order reaches a terminal
+# status (executed, rejected or cancelled). They are concurrent.futures.Future,
+# asyncio code can await them through asyncio.wrap_future.
+class OrderTracker:
+    TERMINAL_STATUS = ("Fully Executed", "Rejected", "Cancelled")
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Condition(threading.Lock())
+        self.feeds: List[LiveFeedManager] = []
+        # (RemoteOrderID, ScripCode) -> last order message
+        self.by_tag: Dict[Tuple[str, int], Dict] = {}
+        # ExchOrderID -> last order message
+        self.by_exch_id: Dict[int, Dict] = {}
+        self.tag_futures: Dict[Tuple[str, int], Future] = {}
+        self.exch_futures: Dict[int, Future] = {}
+        # RemoteOrderID -> number of updates seen
+        self.updates: Dict[str, int] = {}
+        # (RemoteOrderID, ScripCode) -> ExchOrderIDs of its orders
+        self.exch_ids: Dict[Tuple[str, int], Set[int]] = {}
+        # ExchOrderIDs of orders replaced by a new one with the same tag and
+        # scrip, their late updates must not resolve the new order
+        self.retired: Set[int] = set()
+
+    @staticmethod
+    def is_terminal(status: str) -> bool:
+        return any(item in status for item in OrderTracker.TERMINAL_STATUS)
+
+    def attach(self, feed: LiveFeedManager) -> None:
+        feed.add_order_listener(self.on_order_update)
+        self.feeds.append(feed)
+
+    def detach(self, feed: LiveFeedManager) -> None:
+        feed.remove_order_listener(self.on_order_update)
+        self.feeds.remove(feed)
+
+    # Push updates only arrive while an attached feed is monitoring
+    def is_live(self) -> bool:
+        return any(feed.is_active() for feed in self.feeds)
+
+    def on_order_update(self, message: Dict) -> None:
+        # Push messages carry RemoteOrderId, REST responses RemoteOrderID
+        tag = message.get("RemoteOrderId", message.get("RemoteOrderID"))
+        status = message.get("Status", "")
+        code = message.get("ScripCode")
+        exch_id = message.get("ExchOrderID")
+        resolved = []
+        with self.lock:
+            if exch_id:
+                exch_id = int(exch_id)
+                self.by_exch_id[exch_id] = message
+            current = tag is not None and exch_id not in self.retired
+            if current:
+                self.by_tag[(tag, code)] = message
+                self.updates[tag] = self.updates.get(tag, 0) + 1
+                if exch_id:
+                    self.exch_ids.setdefault((tag, code), set()).add(exch_id)
+            if OrderTracker.is_terminal(status):
+                future = self.tag_futures.pop((tag, code), None) if current else None
+                if future is not None:
+                    resolved.append(future)
+                future = self.exch_futures.pop(exch_id, None)
+                if future is not None:
+                    resolved.append(future)
+            self.lock.notify_all()
+        for future in resolved:
+            future.set_result(message)
+
+    # Call before placing an order whose tag and scrip may have been used by
+    # an earlier order: expect() then waits for the new one
+    def new_order(self, tag: str, scrip_code: int) -> None:
+        with self.lock:
+            self.by_tag.pop((tag, scrip_code), None)
+            self.retired.update(self.exch_ids.pop((tag, scrip_code), ()))
+
+    def expect(self, tag: str, scrip_code: int) -> Future:
+        with self.lock:
+            message = self.by_tag.get((tag, scrip_code))
+            if message is not None and OrderTracker.is_terminal(message["Status"]):
+                return OrderTracker._done(message)
+            if (tag, scrip_code) not in self.tag_futures:
+                self.tag_futures[(tag, scrip_code)] = Future()
+            return self.tag_futures[(tag, scrip_code)]
+
+    def expect_exch_order(self, exch_order_id: int) -> Future:
+        exch_order_id = int(exch_order_id)
+        with self.lock:
+            message = self.by_exch_id.get(exch_order_id)
+            if message is not None and OrderTracker.is_terminal(message["Status"]):
+                return OrderTracker._done(message)
+            if exch_order_id not in self.exch_futures:
+                self.exch_futures[exch_order_id] = Future()
+            return self.exch_futures[exch_order_id]
+
+    def get_status(self, tag: str, scrip_code: int) -> str:
+        with self.lock:
+            message = self.by_tag.get((tag, scrip_code))
+            return message["Status"] if message else None
+
+    # Block until any update for tag arrives or the timeout expires.
+    # Returns True if an update arrived
+    def wait_for_update(self, tag: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            seen = self.updates.get(tag, 0)
+            while True:
+                if self.updates.get(tag, 0) != seen:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.lock.wait(remaining)
+
+    @staticmethod
+    def _done(message: Dict) -> Future:
+        future = Future()
+        future.set_result(message)
+        return future
@@ -0,0 +1,242 @@
+# Author : Prashant Srivastava
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+# Positions of many strategies in parallel numpy arrays. Every scrip gets a
+# dense slot holding its LTP, shared by all the strategies trading it; every
+# (strategy, scrip) position is a row with avg, qty, sign (+1 bought, -1 sold),
+# its scrip slot and its strategy group.
+# Strategies are keyed by a unique id (BaseStrategy.strategy_id), not by their
+# order tag: the tags of two strategies created in the same second collide.
+# A tick batch updates the LTPs in one vectorized pass (update_ltps) and the
+# MTM of every strategy comes from one grouped sum (mtm_by_strategy), which
+# also moves the per strategy high-water marks and drawdowns. That MTM is
+# (ltp - avg) * qty * sign per leg; a strategy's own get_pnl follows its
+# get_leg_pnl.
+# pylint: disable=too-many-instance-attributes
+class PositionBook:
+    def __init__(self, capacity: int = 64):
+        self.lock = threading.Lock()
+        # Scrip slots
+        self.slot_of: Dict[int, int] = {}
+        self.ltp = np.zeros(capacity)
+        self.priced = np.zeros(capacity, dtype=bool)
+        self.sorted_codes = np.zeros(0, dtype=np.int64)
+        self.sorted_slots = np.zeros(0, dtype=np.int64)
+        # Position rows
+        self.row_of: Dict[Tuple[int, int], int] = {}
+        self.avg = np.zeros(capacity)
+        self.qty = np.zeros(capacity)
+        self.sign = np.zeros(capacity)
+        self.row_slot = np.zeros(capacity, dtype=np.int64)
+        self.row_group = np.zeros(capacity, dtype=np.int64)
+        self.rows = 0
+        # Strategy groups
+        self.group_of: Dict[str, int] = {}
+        self.group_names: List[str] = []
+        self.group_rows: List[List[int]] = []
+        self.group_codes: List[List[int]] = []
+        self.peak = np.zeros(0)
+        self.drawdown = np.zeros(0)
+
+    def _slot(self, code: int, price: float) -> int:
+        slot = self.slot_of.get(code)
+        if slot is None:
+            slot = len(self.slot_of)
+            self.slot_of[code] = slot
+            self.ltp = _grow(self.ltp, slot + 1)
+            self.priced = _grow(self.priced, slot + 1)
+            self.ltp[slot] = price
+            # Sorted code -> slot lookup for the vectorized update
+            codes = np.fromiter(self.slot_of.keys(), dtype=np.int64)
+            order = np.argsort(codes)
+            self.sorted_codes = codes[order]
+            self.sorted_slots = np.fromiter(self.slot_of.values(), dtype=np.int64)[
+                order
+            ]
+        return slot
+
+    def _group(self, strategy: str) -> int:
+        group = self.group_of.get(strategy)
+        if group is None:
+            group = len(self.group_names)
+            self.group_of[strategy] = group
+            self.group_names.append(strategy)
+            self.group_rows.append([])
+            self.group_codes.append([])
+            self.peak = _grow(self.peak, group + 1)
+            self.drawdown = _grow(self.drawdown, group + 1)
+        return group
+
+    # Adds (or replaces) the position of strategy in code, returns its row
+    def add_position(
+        self, strategy: str, code: int, avg: float, qty: int, sign: int
+    ) -> int:
+        with self.lock:
+            group = self._group(strategy)
+            slot = self._slot(code, avg)
+            row = self.row_of.get((group, code))
+            if row is None:
+                row = self.rows
+                self.rows += 1
+                for name in ("avg", "qty", "sign", "row_slot", "row_group"):
+                    setattr(self, name, _grow(getattr(self, name), self.rows))
+                self.row_of[(group, code)] = row
+                self.group_rows[group].append(row)
+                self.group_codes[group].append(code)
+            self.avg[row] = avg
+            self.qty[row] = qty
+            self.sign[row] = sign
+            self.row_slot[row] = slot
+            self.row_group[row] = group
+            return row
+
+    # Frees the row of strategy in code, the last row moves into it
+    def remove_position(self, strategy: str, code: int) -> bool:
+        with self.lock:
+            group = self.group_of.get(strategy)
+            row = self.row_of.pop((group, code), None)
+            if row is None:
+                return False
+            index = self.group_codes[group].index(code)
+            del self.group_codes[group][index]
+            del self.group_rows[group][index]
+            last = self.rows - 1
+            if row != last:
+                for name in ("avg", "qty", "sign", "row_slot", "row_group"):
+                    array = getattr(self, name)
+                    array[row] = array[last]
+                moved_group = int(self.row_group[row])
+                index = self.group_rows[moved_group].index(last)
+                self.group_rows[moved_group][index] = row
+                self.row_of[(moved_group, self.group_codes[moved_group][index])] = row
+            self.rows = last
+            return True
+
+    def has_position(self, strategy: str, code: int) -> bool:
+        group = self.group_of.get(strategy)
+        return group is not None and (group, code) in self.row_of
+
+    def positions(self, strategy: str) -> List[int]:
+        group = self.group_of.get(strategy)
+        return list(self.group_codes[group]) if group is not None else []
+
+    # One vectorized pass over a tick batch. Ticks in batch order, a later
+    # tick of a scrip wins; scrips without a position are skipped
+    def update_ltps(self, codes, prices) -> None:
+        codes = np.asarray(codes, dtype=np.int64)
+        prices = np.asarray(prices, dtype=float)
+        with self.lock:
+            if not len(self.sorted_codes):
+                return
+            index = np.searchsorted(self.sorted_codes, codes)
+            index[index == len(self.sorted_codes)] = 0
+            known = self.sorted_codes[index] == codes
+            slots = self.sorted_slots[index[known]]
+            self.ltp[slots] = prices[known]
+            self.priced[slots] = True
+
+    # Single tick, returns False if no strategy holds the scrip
+    def update_ltp(self, code: int, price: float) -> bool:
+        slot = self.slot_of.get(code)
+        if slot is None:
+            return False
+        with self.lock:
+            self.ltp[slot] = price
+            self.priced[slot] = True
+        return True
+
+    def get_ltp(self, code: int) -> float:
+        slot = self.slot_of.get(code)
+        return float(self.ltp[slot]) if slot is not None else None
+
+    def _row_pnl(self, row: int) -> float:
+        return float(
+            (self.ltp[self.row_slot[row]] - self.avg[row])
+            * self.qty[row]
+            * self.sign[row]
+        )
+
+    def leg_pnl(self, strategy: str, code: int) -> float:
+        row = self.row_of.get((self.group_of.get(strategy), code))
+        return self._row_pnl(row) if row is not None else None
+
+    # MTM of one strategy, summed over its rows only
+    def strategy_mtm(self, strategy: str) -> float:
+        group = self.group_of.get(strategy)
+        if group is None:
+            return 0.0
+        rows = self.group_rows[group]
+        with self.lock:
+            return float(
+                np.dot(
+                    self.ltp[self.row_slot[rows]] - self.avg[rows],
+                    self.qty[rows] * self.sign[rows],
+                )
+            )
+
+    # MTM of every strategy from one grouped sum, {strategy: mtm}. Also moves
+    # the high-water marks and drawdowns, see get_drawdown
+    def mtm_by_strategy(self) -> Dict[str, float]:
+        with self.lock:
+            rows = self.rows
+            groups = len(self.group_names)
+            pnl = (
+                (self.ltp[self.row_slot[:rows]] - self.avg[:rows])
+                * self.qty[:rows]
+                * self.sign[:rows]
+            )
+            mtm = np.bincount(self.row_group[:rows], weights=pnl, minlength=groups)
+            np.maximum(self.peak[:groups], mtm, out=self.peak[:groups])
+            self.drawdown[:groups] = self.peak[:groups] - mtm
+            return dict(zip(self.group_names, mtm.tolist()))
+
+    def get_drawdown(self, strategy: str) -> Dict:
+        group = self.group_of[strategy]
+        return {
+            "peak": float(self.peak[group]),
+            "drawdown": float(self.drawdown[group]),
+        }
+
+    def all_priced(self, strategy: str) -> bool:
+        group = self.group_of.get(strategy)
+        if group is None or not self.group_rows[group]:
+            return False
+        return bool(self.priced[self.row_slot[self.group_rows[group]]].all())
+
+    ## Compatibility with BaseStrategy.executed_orders
+
+    # (Avg, Qty) of the strategy's position in code, (None, None) if none
+    def get_executed_order(self, strategy: str, code: int) -> Tuple[float, int]:
+        row = self.row_of.get((self.group_of.get(strategy), code))
+        if row is None:
+            return (None, None)
+        return (float(self.avg[row]), int(self.qty[row]))
+
+    # {code: {"rate", "qty", "side", "ltp", "pnl"}} like the former
+    # executed_orders dict, None when the strategy holds nothing
+    def get_all_executed_orders(self, strategy: str) -> Dict[int, Dict]:
+        group = self.group_of.get(strategy)
+        if group is None or not self.group_rows[group]:
+            return None
+        return {
+            code: {
+                "rate": float(self.avg[row]),
+                "qty": int(self.qty[row]),
+                "side": "B" if self.sign[row] > 0 else "S",
+                "ltp": float(self.ltp[self.row_slot[row]]),
+                "pnl": self._row_pnl(row),
+            }
+            for code, row in zip(self.group_codes[group], self.group_rows[group])
+        }
@@ -0,0 +1,105 @@
+# Author : Prashant Srivastava
+import math
+from typing import Dict
+
+
+# Running MTM of a strategy's legs. A tick only moves the total by the change
+# of its own leg, so the total, the high-water marks and the drawdowns are
+# O(1) per tick whatever the number of legs.
+class PositionLedger:
+    def __init__(self):
+        self.legs: Dict[int, Dict] = {}
+        self.total = 0.0
+        # Portfolio high-water mark of the MTM and the drawdown from it
+        self.peak = 0.0
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.priced = 0  # legs with at least one price update
+
+    def __len__(self) -> int:
+        return len(self.legs)
+
+    def __contains__(self, code: int) -> bool:
+        return code in self.legs
+
+    # side "S" for a sold leg, "B" for a bought one. rate, qty and side are
+    # only used by mark(), a caller pricing its legs itself (update) may keep
+    # its positions elsewhere, e.g. in a PositionBook
+    def add_leg(
+        self, code: int, rate: float = None, qty: int = 0, side: str = "S"
+    ) -> None:
+        if code in self.legs:
+            self.remove_leg(code)
+        self.legs[code] = {
+            "rate": rate,
+            "qty": qty,
+            "sign": -1 if side == "S" else 1,
+            "ltp": rate,
+            "pnl": 0.0,
+            "peak": 0.0,
+            "drawdown": 0.0,
+            "priced": False,
+        }
+
+    def remove_leg(self, code: int) -> None:
+        leg = self.legs.pop(code, None)
+        if leg is not None:
+            self.total -= leg["pnl"]
+            if leg["priced"]:
+                self.priced -= 1
+            self._update_drawdown()
+
+    def _update_drawdown(self) -> None:
+        if self.total > self.peak:
+            self.peak = self.total
+        self.drawdown = self.peak - self.total
+        if self.drawdown > self.max_drawdown:
+            self.max_drawdown = self.drawdown
+
+    # Sets the MTM of one leg as computed by the caller, returns the total
+    def update(self, code: int, pnl: float, ltp: float = None) -> float:
+        leg = self.legs[code]
+        self.total += pnl - leg["pnl"]
+        leg["pnl"] = pnl
+        if ltp is not None:
+            leg["ltp"] = ltp
+        if not leg["priced"]:
+            leg["priced"] = True
+            self.priced += 1
+        if pnl > leg["peak"]:
+            leg["peak"] = pnl
+        leg["drawdown"] = leg["peak"] - pnl
+        self._update_drawdown()
+        return self.total
+
+    # Marks a leg to its last traded price, returns the total
+    def mark(self, code: int, ltp: float) -> float:
+        leg = self.legs[code]
+        return self.update(code, (ltp - leg["rate"]) * leg["qty"] * leg["sign"], ltp)
+
+    def all_priced(self) -> bool:
+        return self.priced == len(self.legs) and self.priced > 0
+
+    def leg(self, code: int) -> Dict:
+        return self.legs.get(code)
+
+    def leg_pnls(self) -> Dict[int, float]:
+        return {code: leg["pnl"] for code, leg in self.legs.items()}
+
+    # Recomputes the total from the legs, dropping the float error of the
+    # running sum, e.g. at the end of a long session
+    def resync(self) -> float:
+        self.total = math.fsum(leg["pnl"] for leg in self.legs.values())
+        return self.total
+
+    def snapshot(self) -> Dict:
+        return {
+            "total": self.total,
+            "peak": self.peak,
+            "drawdown": self.drawdown,
+            "max_drawdown": self.max_drawdown,
+            "legs": {
+                code: {key: leg[key] for key in ("ltp", "pnl", "peak", "drawdown")}
+                for code, leg in self.legs.items()
+            },
+        }
@@ -12,6 +12,8 @@ from typing import Any, Dict
 import pandas as pd
 
 from src.clients.iclientmanager import IClientManager
+from src.common.option_chain import OptionChain
+from src.common.ttl_cache import TTLCache
 
 
 class StrikesManager:
@@ -20,6 +22,7 @@ class StrikesManager:
     def __init__(self, client: IClientManager, config: Dict = None) -> None:
         self.client = client
         self.logger = logging.getLogger(__name__)
+        config = config if isinstance(config, dict) else {}
         self.config = config
         indices_info_path = "indices_info.json"
         if "indices_info" in config:
@@ -27,6 +30,17 @@ class StrikesManager:
         ## load data from indices_info.json
         with open(indices_info_path, "r", encoding="utf-8") as json_file:
             self.indices_info = json.load(json_file)
+        ## expiry list only changes day to day, keep it for the session and
+        ## key it by date so a bot running past midnight refetches
+        self.expiry_cache = TTLCache("expiry", math.inf)
+        ## option chain snapshots, reused by every selection within the ttl.
+        ## With chain_cache_stale > 0 a snapshot up to ttl + stale old is
+        ## served immediately while a refresh runs in the background
+        self.chain_cache = TTLCache(
+            "option_chain",
+            config.get("chain_cache_ttl", 1.0),
+            config.get("chain_cache_stale", 0.0),
+        )
 
     def get_exchange(self, index: str) -> str:
         return self.indices_info[index]["exchange"]
@@ -39,9 +53,11 @@ class StrikesManager:
 
     def get_current_expiry(self, index: str) -> int:
         self.logger.debug("Pulling the current expiry timestamp")
-        all_nifty_expiry = self.client.get_expiry(
-            exch=self.get_exchange(index), symbol=index
-        )["Expiry"]
+        exchange = self.get_exchange(index)
+        all_nifty_expiry = self.expiry_cache.get(
+            (exchange, index, datetime.date.today()),
+            lambda: self.client.get_expiry(exch=exchange, symbol=index)["Expiry"],
+        )
         date_pattern = re.compile("/Date\\((\\d+).+?\\)/")
         min_diff = math.inf
         this_expiry = StrikesManager.TODAY_TIMESTAMP
@@ -55,46 +71,42 @@ class StrikesManager:
                     this_expiry = timestamp
         return this_expiry
 
+    def get_option_chain(self, index: str, expiry: int) -> OptionChain:
+        exchange = self.get_exchange(index)
+        return self.chain_cache.get(
+            (exchange, index, expiry),
+            lambda: OptionChain(
+                self.client.get_option_chain(
+                    exch=exchange, symbol=index, expire=expiry
+                )["Options"]
+            ),
+        )
+
+    def invalidate_cache(self) -> None:
+        self.expiry_cache.invalidate()
+        self.chain_cache.invalidate()
+
+    def get_cache_stats(self) -> Dict[str, Dict]:
+        return {
+            "expiry": self.expiry_cache.stats(),
+            "option_chain": self.chain_cache.stats(),
+        }
+
     def straddle_strikes(self, index: str) -> Dict[str, Any]:
         this_expiry = self.get_current_expiry(index)
-        contracts = self.client.get_option_chain(
-            exch=self.get_exchange(index), symbol=index, expire=this_expiry
-        )["Options"]
-        ce_strikes = {}
-        pe_strikes = {}
-        for contract in contracts:
-            ltp = contract["LastRate"]
-            code = contract["ScripCode"]
-            name = contract["Name"]
-            ctype = contract["CPType"]
-            strike = contract["StrikeRate"]
-            if ltp > 0:
-                if ctype == "CE":
-                    ce_strikes[strike] = {"ltp": ltp, "code": code, "name": name}
-                else:
-                    pe_strikes[strike] = {"ltp": ltp, "code": code, "name": name}
-
-        min_diff = math.inf
-        atm = 0
-        for key, value in ce_strikes.items():
-            if key in pe_strikes:
-                diff = abs(value["ltp"] - pe_strikes[key]["ltp"])
-                if min_diff > diff:
-                    min_diff = diff
-                    atm = key
+        chain = self.get_option_chain(index, this_expiry)
+        _, ce_strike, pe_strike, min_diff = chain.atm()
 
         self.logger.debug("Minimum CE/PE Difference = %f", min_diff)
-        premium = (ce_strikes[atm]["ltp"] + pe_strikes[atm]["ltp"]) * self.get_lot_size(
-            index
-        )
+        premium = (ce_strike["ltp"] + pe_strike["ltp"]) * self.get_lot_size(index)
         self.logger.debug("Straddle Premium = %f", premium)
         return {
-            "ce_code": ce_strikes[atm]["code"],
-            "ce_ltp": ce_strikes[atm]["ltp"],
-            "ce_name": ce_strikes[atm]["name"],
-            "pe_code": pe_strikes[atm]["code"],
-            "pe_ltp": pe_strikes[atm]["ltp"],
-            "pe_name": pe_strikes[atm]["name"],
+            "ce_code": ce_strike["code"],
+            "ce_ltp": ce_strike["ltp"],
+            "ce_name": ce_strike["name"],
+            "pe_code": pe_strike["code"],
+            "pe_ltp": pe_strike["ltp"],
+            "pe_name": pe_strike["name"],
         }
 
     def strangle_strikes(
@@ -108,47 +120,24 @@ class StrikesManager:
                 closest_price_thresh,
                 this_expiry,
             )
-        contracts = self.client.get_option_chain(
-            exch=self.get_exchange(index), symbol=index, expire=this_expiry
-        )["Options"]
-        min_pe_diff = min_ce_diff = math.inf
-        ce_code = -1
-        pe_code = -1
-        ce_ltp = 0.0
-        pe_ltp = 0.0
-        ce_name = ""
-        pe_name = ""
-        for contract in contracts:
-            ltp = contract["LastRate"]
-            code = contract["ScripCode"]
-            name = contract["Name"]
-            ctype = contract["CPType"]
-
-            if ltp < closest_price_thresh:
-                continue
-            diff = ltp - closest_price_thresh
-            if ctype == "CE" and min_ce_diff > diff:
-                min_ce_diff = diff
-                ce_code = code
-                ce_ltp = ltp
-                ce_name = name
-            if ctype == "PE" and min_pe_diff > diff:
-                min_pe_diff = diff
-                pe_code = code
-                pe_ltp = ltp
-                pe_name = name
+        chain = self.get_option_chain(index, this_expiry)
+        ce_strike, min_ce_diff = chain.closest_premium("CE", closest_price_thresh)
+        pe_strike, min_pe_diff = chain.closest_premium("PE", closest_price_thresh)
+        missing = {"code": -1, "ltp": 0.0, "name": ""}
+        ce_strike = ce_strike if ce_strike else missing
+        pe_strike = pe_strike if pe_strike else missing
 
         self.logger.debug("Minimum CE Difference = %f", min_ce_diff)
         self.logger.debug("Minimum PE Difference = %f", min_pe_diff)
-        premium = (ce_ltp + pe_ltp) * self.get_lot_size(index)
+        premium = (ce_strike["ltp"] + pe_strike["ltp"]) * self.get_lot_size(index)
         self.logger.debug("Strangle Premium = %f", premium)
         return {
-            "ce_code": ce_code,
-            "ce_ltp": ce_ltp,
-            "ce_name": ce_name,
-            "pe_code": pe_code,
-            "pe_ltp": pe_ltp,
-            "pe_name": pe_name,
+            "ce_code": ce_strike["code"],
+            "ce_ltp": ce_strike["ltp"],
+            "ce_name": ce_strike["name"],
+            "pe_code": pe_strike["code"],
+            "pe_ltp": pe_strike["ltp"],
+            "pe_name": pe_strike["name"],
         }
 
     def get_indices(self):
@@ -0,0 +1,172 @@
+# Author : Prashant Srivastava
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+# Optional faster json backends, picked up only when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+# Fixed layout tick record, same keys as the legacy ohlcvt dict.
+# Supports read only dict style access (tick["c"], "c" in tick) so that the
+# existing callbacks keep working unchanged.
+class Tick:
+    __slots__ = ("o", "h", "l", "c", "v", "code", "t", "ChgPcnt")
+
+    # pylint: disable=too-many-arguments,invalid-name
+    def __init__(self, o, h, l, c, v, code, t, ChgPcnt):
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.v = v
+        self.code = code
+        self.t = t
+        self.ChgPcnt = ChgPcnt
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError) as exp:
+            raise KeyError(key) from exp
+
+    def __contains__(self, key: str) -> bool:
+        return key in Tick.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in Tick.__slots__ else default
+
+    def keys(self):
+        return Tick.__slots__
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in Tick.__slots__}
+
+    def __repr__(self) -> str:
+        return f"Tick({self.to_dict()})"
+
+
+class TickDecoder:
+    BACKENDS = ("json", "orjson", "simdjson")
+
+    def __init__(self, backend: str = "json"):
+        self.logger = logging.getLogger(__name__)
+        self.backend = TickDecoder.resolve_backend(backend)
+        self._parser = simdjson.Parser() if self.backend == "simdjson" else None
+        self._loads = orjson.loads if self.backend == "orjson" else json.loads
+        self._list_types = (list,)
+        self._dict_types = (dict,)
+        if self._parser is not None:
+            self._list_types = (list, simdjson.Array)
+            self._dict_types = (dict, simdjson.Object)
+        # Ticks in a frame usually share the same TickDt, remember the last one
+        # to skip the slice + int conversion
+        self._last_tick_dt = None
+        self._last_t = 0.0
+
+    @staticmethod
+    def resolve_backend(backend: str) -> str:
+        if backend == "auto":
+            if orjson is not None:
+                return "orjson"
+            if simdjson is not None:
+                return "simdjson"
+            return "json"
+        if backend not in TickDecoder.BACKENDS:
+            raise ValueError(f"Unknown json backend {backend}")
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson backend requested but orjson is not installed")
+        if backend == "simdjson" and simdjson is None:
+            raise ValueError(
+                "simdjson backend requested but pysimdjson is not installed"
+            )
+        return backend
+
+    def tick_time(self, tick_dt: str) -> float:
+        if tick_dt != self._last_tick_dt:
+            self._last_tick_dt = tick_dt
+            self._last_t = int(tick_dt[6:-2]) / 1000  # '/Date(1691557402000)/'
+        return self._last_t
+
+    def make_tick(self, msg) -> Any:
+        return {
+            "o": msg["OpenRate"],
+            "h": msg["High"],
+            "l": msg["Low"],
+            "c": msg["LastRate"],
+            "v": msg["LastQty"],
+            "code": msg["Token"],
+            "t": self.tick_time(msg["TickDt"]),
+            "ChgPcnt": msg["ChgPcnt"],
+        }
+
+    def make_order(self, msg) -> Dict:
+        if self._parser is not None:
+            return msg.as_dict()
+        return msg
+
+    def parse(self, message):
+        if self._parser is not None:
+            if isinstance(message, str):
+                message = message.encode("utf-8")
+            # Lazy document, fields are materialized only when accessed
+            return self._parser.parse(message)
+        return self._loads(message)
+
+    # Returns the (ticks, order updates) found in a single feed frame
+    def decode(self, message) -> Tuple[List, List[Dict]]:
+        ticks = []
+        orders = []
+        json_msg = self.parse(message)
+        if isinstance(json_msg, self._list_types):
+            msgs = json_msg
+        elif isinstance(json_msg, self._dict_types):
+            msgs = (json_msg,)
+        else:
+            self.logger.error("Unknown message type received: %s", type(json_msg))
+            self.logger.error("Message: %s", json_msg)
+            return ticks, orders
+        for msg in msgs:
+            if "Status" in msg:
+                orders.append(self.make_order(msg))
+            elif "LastRate" in msg:
+                ticks.append(self.make_tick(msg))
+        return ticks, orders
+
+
+# Same frame handling as TickDecoder but emits __slots__ Tick records instead of
+# a fresh dict per tick
+class SlotsTickDecoder(TickDecoder):
+    def make_tick(self, msg) -> Tick:
+        return Tick(
+            msg["OpenRate"],
+            msg["High"],
+            msg["Low"],
+            msg["LastRate"],
+            msg["LastQty"],
+            msg["Token"],
+            self.tick_time(msg["TickDt"]),
+            msg["ChgPcnt"],
+        )
+
+
+DECODERS = {"dict": TickDecoder, "slots": SlotsTickDecoder}
+
+
+# config keys:
+#   "tick_decoder": "dict" (default, legacy ohlcvt dicts) | "slots" (Tick records)
+#   "json_backend": "json" (default) | "orjson" | "simdjson" | "auto"
+def create_decoder(config: Dict = None) -> TickDecoder:
+    config = config if isinstance(config, dict) else {}
+    kind = config.get("tick_decoder", "dict")
+    if kind not in DECODERS:
+        raise ValueError(f"Unknown tick decoder {kind}")
+    return DECODERS[kind](backend=config.get("json_backend", "json"))
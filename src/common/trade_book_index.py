@@ -0,0 +1,65 @@
+# Author : Prashant Srivastava
+from typing import Dict, Iterable, List
+
+
+# Trade book indexed once per fetch by ExchOrderID, ScripCode and
+# RemoteOrderID so joins against order status are hash lookups instead of
+# nested scans. Lookups return the trades in trade book order.
+# The trade book carries no RemoteOrderID, it is learned from the order status
+# rows passed in (add_order_status).
+class TradeBookIndex:
+    def __init__(self, trade_book: List[Dict], order_status: List[Dict] = None):
+        self.trades = trade_book if trade_book else []
+        # key -> positions in trade_book
+        self.by_exch_order_id: Dict[int, List[int]] = {}
+        self.by_scrip_code: Dict[int, List[int]] = {}
+        self.by_remote_order_id: Dict[str, set] = {}
+        for pos, trade in enumerate(self.trades):
+            self.by_exch_order_id.setdefault(int(trade["ExchOrderID"]), []).append(pos)
+            self.by_scrip_code.setdefault(trade["ScripCode"], []).append(pos)
+        if order_status:
+            self.add_order_status(order_status)
+
+    def add_order_status(self, order_status: List[Dict]) -> None:
+        for order in order_status:
+            eoid = order["ExchOrderID"]
+            if eoid == "" or "RemoteOrderID" not in order:
+                continue
+            positions = self.by_exch_order_id.get(int(eoid))
+            if positions:
+                self.by_remote_order_id.setdefault(
+                    order["RemoteOrderID"], set()
+                ).update(positions)
+
+    def _rows(self, positions: Iterable[int]) -> List[Dict]:
+        return [self.trades[pos] for pos in sorted(positions)]
+
+    def for_exch_orders(self, exch_order_ids: Iterable) -> List[Dict]:
+        positions = set()
+        for eoid in exch_order_ids:
+            if eoid != "":
+                positions.update(self.by_exch_order_id.get(int(eoid), ()))
+        return self._rows(positions)
+
+    def for_scrip(self, scrip_code: int) -> List[Dict]:
+        return self._rows(self.by_scrip_code.get(scrip_code, ()))
+
+    def for_tag(self, tag: str) -> List[Dict]:
+        return self._rows(self.by_remote_order_id.get(tag, ()))
+
+    # Per scrip totals over trades: Qty, Premium (sum of Rate * Qty), Rate (sum
+    # of trade rates) and Avg (volume weighted average price)
+    @staticmethod
+    def aggregate(trades: List[Dict]) -> Dict[int, Dict]:
+        totals = {}
+        for trade in trades:
+            scrip_code = trade["ScripCode"]
+            if scrip_code not in totals:
+                totals[scrip_code] = {"Rate": 0, "Qty": 0, "Premium": 0, "Avg": 0}
+            item = totals[scrip_code]
+            item["Rate"] += trade["Rate"]
+            item["Qty"] += trade["Qty"]
+            item["Premium"] += trade["Rate"] * trade["Qty"]
+        for item in totals.values():
+            item["Avg"] = item["Premium"] / item["Qty"] if item["Qty"] != 0 else 0
+        return totals
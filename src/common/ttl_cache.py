@@ -0,0 +1,76 @@
+# Author : Prashant Srivastava
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+
+# Read-through cache with a time to live per entry.
+# Within ttl an entry is served as is. Within ttl + stale_ttl the stale entry is
+# served immediately while a background thread refreshes it
+# (stale-while-revalidate). Past that the loader is called inline.
+class TTLCache:
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0.0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.entries: Dict[Hashable, tuple] = {}  # key -> (value, loaded at)
+        self.refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                age = now - entry[1]
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry[0]
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh, args=(key, loader), daemon=True
+                        ).start()
+                    return entry[0]
+            self.misses += 1
+        value = loader()
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            value = loader()
+            with self.lock:
+                self.entries[key] = (value, time.monotonic())
+        except Exception as exp:
+            self.logger.error("%s cache refresh failed for %s: %s", self.name, key, exp)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "name": self.name,
+                "ttl": self.ttl if self.ttl != math.inf else "inf",
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
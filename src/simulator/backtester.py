@@ -0,0 +1,284 @@
+# Author : Prashant Srivastava
+import contextlib
+import json
+import logging
+import sys
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from src.clients import client_paper
+from src.common import order_manager
+from src.common import tick_decoder
+from src.strategy import base_strategy
+from src.strategy.base_strategy import BaseStrategy, StrategyState
+from src.strategy.strategy_engine import StrategyEngine
+
+
+# Deterministic clock of a backtest, moved forward by the replayed ticks and by
+# the sleeps of the code under test (a sleep takes no wall time)
+class VirtualClock:
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.now += seconds
+
+    # Never goes backwards: a virtual sleep may have run ahead of the ticks
+    def advance_to(self, now: float) -> None:
+        if now > self.now:
+            self.now = now
+
+
+# Stands in for the time module inside the patched modules: time/sleep and
+# the monotonic counters follow the clock, everything else is the real module
+class VirtualTimeModule:
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.time = clock.time
+        self.sleep = clock.sleep
+        self.monotonic = clock.time
+        self.perf_counter = clock.time
+
+    def __getattr__(self, name: str):
+        return getattr(time, name)
+
+
+# Patches the "time" global of the given modules (import time, time.time())
+# for the duration of the block. The time module itself is left alone, the
+# feed threads and logging keep the wall clock
+@contextlib.contextmanager
+def virtual_time(clock: VirtualClock, modules: Iterable):
+    shim = VirtualTimeModule(clock)
+    patched = []
+    for module in modules:
+        if getattr(module, "time", None) is time:
+            module.time = shim
+            patched.append(module)
+    try:
+        yield clock
+    finally:
+        for module in patched:
+            module.time = time
+
+
+# 1 minute bars, from option_data or a DataFrame, as ticks. Every bar becomes
+# open, low, high, close (open, high, low, close for a down bar) or just the
+# close with intrabar "close". Ticks carry the running high/low of the bar, so
+# a strategy never sees the part of a bar that is still to come
+# pylint: disable=too-many-locals
+def bars_to_ticks(
+    frame: pd.DataFrame, intrabar: str = "ohlc", bar_seconds: int = 60
+) -> Dict[str, np.ndarray]:
+    # Epoch seconds whatever the datetime resolution of the frame
+    times = (
+        (pd.to_datetime(frame["timestamp"], utc=True) - pd.Timestamp(0, tz="UTC"))
+        / pd.Timedelta(seconds=1)
+    ).to_numpy(dtype=float)
+    codes = frame["code"].to_numpy(dtype=np.int64)
+    bars = frame[["open", "high", "low", "close"]].to_numpy(dtype=float)
+    volume = frame["volume"].to_numpy(dtype=float)
+    opens, highs, lows, closes = bars.T
+    if intrabar == "close":
+        prices = closes[:, None]
+        offsets = np.array([bar_seconds - 1.0])
+    else:
+        down = closes < opens
+        second = np.where(down, highs, lows)
+        third = np.where(down, lows, highs)
+        prices = np.column_stack([opens, second, third, closes])
+        offsets = np.array([0.0, 0.25, 0.5, 1.0]) * (bar_seconds - 1)
+    points = prices.shape[1]
+    tick_times = (times[:, None] + offsets).ravel()
+    # Stable, the ticks of one instant keep the bar order
+    order = np.argsort(tick_times, kind="stable")
+    return {
+        "t": tick_times[order],
+        "code": np.repeat(codes, points)[order],
+        "o": np.repeat(opens, points)[order],
+        "h": np.maximum.accumulate(prices, axis=1).ravel()[order],
+        "l": np.minimum.accumulate(prices, axis=1).ravel()[order],
+        "c": prices.ravel()[order],
+        "v": np.repeat(volume / points, points)[order],
+    }
+
+
+# Bars of the option_data table (simulator/timeseriesdb.py) for the given
+# {strike_name: scrip_code}, as the DataFrame bars_to_ticks takes
+def load_option_data(
+    db_params: Dict, scrip_codes: Dict[str, int], start: str, end: str
+) -> pd.DataFrame:
+    import psycopg2  # pylint: disable=import-outside-toplevel
+
+    connection = psycopg2.connect(
+        dbname=db_params["dbname"],
+        user=db_params["user"],
+        password=db_params["password"],
+        host=db_params.get("host", "localhost"),
+        port=db_params.get("port", "5432"),
+    )
+    query = """
+        SELECT option_data.timestamp, strikes.strike_name,
+            open, high, low, close, volume
+        FROM option_data JOIN strikes USING (strike_id)
+        WHERE strikes.strike_name = ANY(%s)
+            AND option_data.timestamp >= %s AND option_data.timestamp <= %s
+        ORDER BY option_data.timestamp
+    """
+    try:
+        frame = pd.read_sql(
+            query, connection, params=(list(scrip_codes.keys()), start, end)
+        )
+    finally:
+        connection.close()
+    codes = frame["strike_name"].map(scrip_codes)
+    unknown = sorted(frame.loc[codes.isna(), "strike_name"].unique())
+    if unknown:
+        raise ValueError(f"No scrip code for strikes {unknown}")
+    missing = sorted(set(scrip_codes) - set(frame["strike_name"].unique()))
+    if missing:
+        logging.getLogger(__name__).warning(
+            "No bars between %s and %s for strikes %s", start, end, missing
+        )
+    frame["code"] = codes.astype(np.int64)
+    return frame
+
+
+# Event sourced backtest of unchanged BaseStrategy subclasses. Ticks (recorded
+# or made from bars) are replayed in time order through a StrategyEngine, so
+# run/entry/exit/order_placed see what they see live, against the in-process
+# paper broker, all on one thread:
+#   1. the virtual clock moves to the tick time
+#   2. the broker matches the resting orders of the scrip (stops, limits)
+#   3. the engine routes the tick to the strategies trading the scrip
+#   4. the order updates of the orders placed or filled meanwhile are routed
+#      to their strategies, like the push updates of the live feed
+# time.time()/time.sleep() are virtual in the modules of the strategies and
+# of OrderManager, see virtual_time: a poll for fills costs no wall time.
+# datetime.now() is not virtualized, use time.time() for time of day rules.
+# Strategies place orders through an OrderManager on backtester.client, set
+# SL_ORDER_GAP/FILL_POLL_INTERVAL as live, the sleeps are virtual anyway.
+# Config keys:
+#   broker       client_paper config (latency, slippage_ticks, ...)
+#   intrabar     "ohlc" (default) or "close", see bars_to_ticks
+#   bar_seconds  bar length, default 60
+#   start_time   epoch seconds of the clock before the first tick
+class Backtester:
+    def __init__(self, config: Dict = None):
+        config = config if isinstance(config, dict) else {}
+        self.logger = logging.getLogger(__name__)
+        self.intrabar = config.get("intrabar", "ohlc")
+        self.bar_seconds = config.get("bar_seconds", 60)
+        self.clock = VirtualClock(config.get("start_time", 0.0))
+        self.client = client_paper.Client(config.get("broker"), clock=self.clock.time)
+        # Order updates are drained from the in-process feed queue, no ticks
+        # are subscribed on it
+        self.client.connect({"Operation": "s", "MarketFeedData": []})
+        self.engine = StrategyEngine(self.client)
+        self.decoder = tick_decoder.TickDecoder()
+        self.modules = {base_strategy, order_manager}
+        self.ticks = 0
+
+    @property
+    def position_book(self):
+        return self.engine.position_book
+
+    def add_strategy(self, strategy: BaseStrategy) -> None:
+        self.modules.add(sys.modules[type(strategy).__module__])
+        self.engine.register(strategy)
+
+    # Virtual time for code run outside of run_*, e.g. to build strategies
+    # whose tag comes from time.time()
+    def virtual_time(self, modules: Iterable = ()):
+        return virtual_time(self.clock, set(modules) | self.modules)
+
+    def _drain_order_updates(self) -> None:
+        feed_queue = self.client.feed_queue
+        while not feed_queue.empty():
+            for message in json.loads(feed_queue.get_nowait()):
+                if "Status" in message:
+                    self.engine.on_order_update(message, [], None)
+
+    def _replay(self, columns: Dict[str, np.ndarray]) -> int:
+        rows = [columns[key].tolist() for key in "t code o h l c v".split()]
+        # Live subscriptions: scrips added or dropped by strategies mid-run
+        # (add_scrips, unmonitor, a stop loss) are followed tick by tick
+        ref_counts = self.engine.ref_counts
+        advance_to = self.clock.advance_to
+        match_price = self.client.match_price
+        dispatch = self.engine.dispatch
+        # Peek at the deque, Queue.empty() takes the mutex on every tick
+        pending = self.client.feed_queue.queue
+        drain = self._drain_order_updates
+        count = 0
+        with self.virtual_time():
+            for t, code, o, h, l, c, v in zip(*rows):
+                advance_to(t)
+                # The broker prices every scrip, e.g. a leg whose stop loss
+                # got executed may still be squared off
+                match_price(code, c, t)
+                if pending:
+                    drain()
+                if code in ref_counts:
+                    dispatch(
+                        {"o": o, "h": h, "l": l, "c": c, "v": v, "code": code, "t": t}
+                    )
+                    if pending:
+                        drain()
+                count += 1
+                if not self.engine.strategies:
+                    break
+        self.ticks += count
+        return count
+
+    # Bars: DataFrame with timestamp, code, open, high, low, close and volume
+    def run_bars(self, frame: pd.DataFrame) -> Dict:
+        start = time.perf_counter()
+        count = self._replay(bars_to_ticks(frame, self.intrabar, self.bar_seconds))
+        return self.report(count, time.perf_counter() - start)
+
+    # Recorded ticks, ohlcvt dicts or 5paisa feed messages, in time order
+    def run_ticks(self, ticks: Iterable[Dict]) -> Dict:
+        start = time.perf_counter()
+        ticks = [
+            self.decoder.make_tick(tick) if "LastRate" in tick else tick
+            for tick in ticks
+        ]
+        columns = {
+            key: np.array([tick[key] for tick in ticks])
+            for key in "t code o h l c v".split()
+        }
+        count = self._replay(columns) if ticks else 0
+        return self.report(count, time.perf_counter() - start)
+
+    # Realized + open P&L per tag family (entry, sl and sq orders) from the
+    # broker's fills, marked to the last replayed price
+    def report(self, count: int = 0, elapsed: float = 0.0) -> Dict:
+        pnl: Dict[str, float] = {}
+        trades: Dict[str, int] = {}
+        for tag in self.client.get_todays_tags():
+            family = tag[2:] if tag[:2] in ("sl", "sq") else tag
+            rows = self.client.get_pnl_summary(tag)
+            pnl[family] = pnl.get(family, 0.0) + sum(row["Pnl"] for row in rows)
+            trades[family] = trades.get(family, 0) + len(rows)
+        return {
+            "ticks": count,
+            "elapsed": elapsed,
+            "clock": self.clock.time(),
+            "pnl": pnl,
+            "trades": trades,
+            "total_pnl": sum(pnl.values()),
+        }
+
+    # The engine's feed never started, only the strategies are stopped
+    def stop(self) -> None:
+        for strategy in list(self.engine.strategies):
+            strategy.set_strategy_state(StrategyState.STOPPED)
+            self.engine.unregister(strategy)
+        self.client.close_data()
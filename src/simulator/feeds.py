@@ -142,10 +142,12 @@ class WebSocketServer:
 
     async def generate_data(self):
         while True:
-            for scrip_code in self.data_generator.subscriptions:
+            # Iterate over copies, (un)subscribe and (dis)connect can happen
+            # while we are awaiting on send
+            for scrip_code in list(self.data_generator.subscriptions):
                 tick_data = self.data_generator.generate_tick(scrip_code)
                 data = json.dumps([tick_data])
-                for client in self.clients:
+                for client in list(self.clients):
                     await client.send(data)
             await asyncio.sleep(1)
 
@@ -0,0 +1,412 @@
+# Author : Prashant Srivastava
+import argparse
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.clients import client_paper
+from src.common import order_manager
+from src.common.strikes_manager import StrikesManager
+from src.simulator.backtester import VirtualClock, virtual_time
+
+# Grid keys, the daily_short.py settings they sweep: -cp, -sl,
+# --monitor-target and --strangle/--straddle
+GRID_KEYS = ("CLOSEST_PREMINUM", "SL_FACTOR", "TARGET", "STRATEGY")
+
+
+# Historical chains in one shared memory block, as numpy arrays that the
+# workers map instead of receiving a pickled copy per task. Only spec (the
+# block name and the array layout) travels to the workers, once.
+# Arrays: see pack_chains
+class SharedChains:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        layout = []
+        offset = 0
+        for key, array in arrays.items():
+            layout.append((key, array.dtype.str, array.shape, offset))
+            # 8 byte aligned arrays
+            offset += (array.nbytes + 7) // 8 * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.spec = {"name": self.shm.name, "layout": layout}
+        self.arrays = SharedChains.views(self.shm, layout)
+        for key, array in arrays.items():
+            self.arrays[key][...] = array
+
+    @staticmethod
+    def views(shm: shared_memory.SharedMemory, layout: List) -> Dict[str, np.ndarray]:
+        return {
+            key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for key, dtype, shape, offset in layout
+        }
+
+    # Worker side, returns the block (keep it referenced) and its arrays
+    @staticmethod
+    def attach(spec: Dict):
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        return shm, SharedChains.views(shm, spec["layout"])
+
+    def close(self) -> None:
+        self.arrays = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+# 1 minute closes of option chains, DataFrame with timestamp, code, strike,
+# cp ("CE"/"PE") and close, one session per trading day. Returns the arrays of
+# SharedChains, contracts sorted by session:
+#   codes, strikes, is_pe   per contract
+#   prices                  contracts x minutes, gaps forward filled
+#   bounds                  contracts of session s are bounds[s]:bounds[s + 1]
+#   session_time            epoch seconds of the first minute of each session
+def pack_chains(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    stamps = pd.to_datetime(frame["timestamp"])
+    utc = stamps.dt.tz_convert("UTC").dt.tz_localize(None) if stamps.dt.tz else stamps
+    seconds = (utc - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+    # local trading day, kept as datetime64 (dt.date builds python objects)
+    session = stamps.dt.normalize()
+    first = seconds.groupby(session).transform("min")
+    minute = ((seconds - first) // 60).astype(np.int64).to_numpy()
+    keys = pd.DataFrame({"session": session, "code": frame["code"]})
+    contract = keys.groupby(["session", "code"], sort=True).ngroup().to_numpy()
+    contracts = contract.max() + 1
+    prices = np.full((contracts, minute.max() + 1), np.nan)
+    prices[contract, minute] = frame["close"].to_numpy(dtype=float)
+    # forward fill along the minutes, then back fill the leading gap
+    index = np.where(np.isnan(prices), 0, np.arange(prices.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    prices = prices[np.arange(contracts)[:, None], index]
+    first_valid = np.argmax(~np.isnan(prices), axis=1)
+    leading = np.isnan(prices)
+    prices[leading] = np.broadcast_to(
+        prices[np.arange(contracts), first_valid][:, None], prices.shape
+    )[leading]
+
+    meta = pd.DataFrame(
+        {
+            "contract": contract,
+            "session": session,
+            "code": frame["code"].to_numpy(),
+            "strike": frame["strike"].to_numpy(dtype=float),
+            "is_pe": (frame["cp"] == "PE").to_numpy(),
+            "first": first.to_numpy(),
+        }
+    ).drop_duplicates("contract")
+    meta = meta.sort_values("contract")
+    sessions = meta.groupby("session", sort=True)
+    bounds = np.concatenate([[0], np.cumsum(sessions.size().to_numpy())])
+    return {
+        "codes": meta["code"].to_numpy(dtype=np.int64),
+        "strikes": meta["strike"].to_numpy(dtype=float),
+        "is_pe": meta["is_pe"].to_numpy(dtype=np.int8),
+        "prices": prices,
+        "bounds": bounds.astype(np.int64),
+        "session_time": sessions["first"].first().to_numpy(dtype=float),
+    }
+
+
+# Paper broker serving one historical chain snapshot to StrikesManager
+class ChainClient(client_paper.Client):
+    def __init__(self, contracts: List[Dict], config: Dict, clock: VirtualClock):
+        super().__init__(config, clock=clock.time)
+        self.contracts = contracts
+
+    def get_option_chain(self, exch: str, symbol: str, expire: int):
+        return {"Options": self.contracts}
+
+
+# One trading session of a grid point: the strikes are picked from the chain
+# at entry_minute and shorted with their stop losses exactly like
+# daily_short.py (StrikesManager + OrderManager on a paper broker), then the
+# rest of the session is scanned vectorized for the next event instead of
+# minute by minute: a stop loss trigger (handed to the broker, which fills
+# it) or the MTM target (monitor_v2 squares off), else square off at
+# exit_minute. Returns (pnl, exit reason)
+# pylint: disable=too-many-locals,too-many-arguments
+def simulate_session(
+    chains: Dict[str, np.ndarray],
+    session: int,
+    params: Dict,
+    strike_mgr: StrikesManager,
+    config: Dict,
+):
+    start, stop = chains["bounds"][session], chains["bounds"][session + 1]
+    codes = chains["codes"][start:stop]
+    prices = chains["prices"][start:stop]
+    entry = config.get("entry_minute", 5)
+    exit_minute = prices.shape[1] + config.get("exit_minute", -15)
+    clock = VirtualClock(chains["session_time"][session] + entry * 60)
+    contracts = [
+        {
+            "LastRate": float(ltp),
+            "ScripCode": int(code),
+            "Name": str(code),
+            "CPType": "PE" if is_pe else "CE",
+            "StrikeRate": float(strike),
+        }
+        for code, strike, is_pe, ltp in zip(
+            codes,
+            chains["strikes"][start:stop],
+            chains["is_pe"][start:stop],
+            prices[:, entry],
+        )
+    ]
+    client = ChainClient(contracts, config.get("broker"), clock)
+    strike_mgr.client = client
+    strike_mgr.invalidate_cache()
+    index = config.get("index", "NIFTY")
+    if params["STRATEGY"] == "straddle":
+        strikes = strike_mgr.straddle_strikes(index=index)
+    else:
+        strikes = strike_mgr.strangle_strikes(params["CLOSEST_PREMINUM"], index=index)
+    if strikes["ce_code"] == -1 or strikes["pe_code"] == -1:
+        return 0.0, "no_strikes"
+    # The entry orders fill against the chain's prices
+    for item in ("ce", "pe"):
+        client.match_price(
+            strikes[f"{item}_code"], strikes[f"{item}_ltp"], clock.time()
+        )
+
+    tag = f"sweep{session}"
+    order_mgr = order_manager.OrderManager(
+        client,
+        {
+            "QTY": config.get("QTY", 50),
+            "SL_FACTOR": params["SL_FACTOR"],
+            "SL_ORDER_GAP": 0.0,
+            "FILL_POLL_INTERVAL": 0.5,
+            "FILL_TIMEOUT": 60.0,
+        },
+    )
+    with virtual_time(clock, [order_manager]):
+        if not order_mgr.place_short(strikes, tag):
+            return order_mgr.pnl(tag), "no_fill"
+        order_mgr.place_short_stop_loss_v2(tag)
+        stops = order_mgr.aggregate_sl_orders(tag, params["SL_FACTOR"]) or {}
+        row_of = {int(code): row for row, code in enumerate(codes)}
+        # Open legs: code -> [avg, qty, trigger, limit, triggered]. A stop
+        # fires when the price reaches the trigger, it then fills at or below
+        # its limit, a gap over the limit leaves it pending
+        legs = {
+            code: [detail["Avg"], detail["Qty"], detail["sl"], detail["higher_price"]]
+            + [False]
+            for code, detail in stops.items()
+        }
+        realized = 0.0
+        reason = "exit_time"
+        minute = entry + 1
+        while legs and minute < exit_minute:
+            window = prices[[row_of[code] for code in legs], minute:exit_minute]
+            avgs, qtys, triggers, limits, triggered = (
+                np.array(column) for column in zip(*legs.values())
+            )
+            mtm = realized + ((avgs[:, None] - window) * qtys[:, None]).sum(axis=0)
+            hit = np.flatnonzero(mtm > params["TARGET"])
+            events = np.where(
+                triggered[:, None],
+                window <= limits[:, None],
+                window >= triggers[:, None],
+            )
+            first_event = np.where(events.any(axis=1), events.argmax(axis=1), np.inf)
+            next_event = first_event.min()
+            if hit.size and hit[0] <= next_event:
+                minute += int(hit[0])
+                reason = "target"
+                break
+            if not np.isfinite(next_event):
+                minute = exit_minute
+                break
+            minute += int(next_event)
+            clock.advance_to(chains["session_time"][session] + minute * 60)
+            for code, event in zip(list(legs), first_event):
+                if event != next_event:
+                    continue
+                # The broker decides, as for any resting stop loss
+                client.match_price(code, prices[row_of[code], minute], clock.time())
+                fills = [
+                    row["Rate"]
+                    for row in client.get_pnl_summary("sl" + tag)
+                    if row["ScripCode"] == code
+                ]
+                if fills:
+                    avg, qty = legs.pop(code)[:2]
+                    realized += (avg - fills[0]) * qty
+                    reason = "stop_loss"
+                else:
+                    legs[code][4] = True
+            minute += 1
+        minute = min(minute, exit_minute)
+        clock.advance_to(chains["session_time"][session] + minute * 60)
+        ltps = {int(code): float(prices[row, minute]) for code, row in row_of.items()}
+        for code in legs:
+            client.match_price(code, ltps[code], clock.time())
+        if legs:
+            family = order_mgr.fetch_tag_family_status(tag)
+            # only the legs still open, a stopped leg must not be bought again
+            open_rows = [row for row in family[tag] if row["ScripCode"] in legs]
+            order_mgr.squareoff(tag=tag, strikes=ltps, order_status=open_rows)
+            order_mgr.squareoff_sl_order(tag=tag, order_status=family["sl" + tag])
+        pnl = sum(order_mgr.pnl(item) for item in (tag, "sl" + tag, "sq" + tag))
+    return pnl, reason
+
+
+## Worker side, the chains are attached once per process
+
+_WORKER = {}
+
+
+def _init_worker(spec: Dict, config: Dict) -> None:
+    shm, chains = SharedChains.attach(spec)
+    _WORKER["shm"] = shm
+    _WORKER["chains"] = chains
+    _WORKER["config"] = config
+    _WORKER["strike_mgr"] = StrikesManager(None, config.get("strikes_manager"))
+    logging.getLogger("src").setLevel(config.get("log_level", logging.WARNING))
+
+
+def _run_point(params: Dict) -> Dict:
+    chains = _WORKER["chains"]
+    sessions = len(chains["bounds"]) - 1
+    pnls = np.zeros(sessions)
+    reasons = {}
+    for session in range(sessions):
+        pnls[session], reason = simulate_session(
+            chains, session, params, _WORKER["strike_mgr"], _WORKER["config"]
+        )
+        reasons[reason] = reasons.get(reason, 0) + 1
+    equity = np.cumsum(pnls)
+    drawdown = np.max(np.maximum.accumulate(np.maximum(equity, 0.0)) - equity)
+    std = pnls.std()
+    return dict(
+        params,
+        total_pnl=float(pnls.sum()),
+        mean_pnl=float(pnls.mean()),
+        win_rate=float((pnls > 0).mean()),
+        max_drawdown=float(drawdown),
+        sharpe=float(pnls.mean() / std * np.sqrt(252)) if std > 0 else 0.0,
+        targets=reasons.get("target", 0),
+        stop_losses=reasons.get("stop_loss", 0),
+        sessions=sessions,
+    )
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    unknown = set(grid) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown grid keys {sorted(unknown)}, use {GRID_KEYS}")
+    defaults = {
+        "CLOSEST_PREMINUM": [7.0],
+        "SL_FACTOR": [1.55],
+        "TARGET": [float("inf")],
+        "STRATEGY": ["strangle"],
+    }
+    values = [grid.get(key, defaults[key]) for key in GRID_KEYS]
+    points = [dict(zip(GRID_KEYS, point)) for point in itertools.product(*values)]
+    # CLOSEST_PREMINUM does not change a straddle
+    unique = []
+    for point in points:
+        if point["STRATEGY"] == "straddle":
+            point["CLOSEST_PREMINUM"] = None
+        if point not in unique:
+            unique.append(point)
+    return unique
+
+
+# Runs every grid point over all the sessions of chains (pack_chains arrays)
+# in a process pool, workers=0 runs in process. Returns the results ranked by
+# total_pnl, also written to output (csv) if given.
+# config keys: index, QTY, entry_minute, exit_minute (from the session end),
+# broker (client_paper config), strikes_manager (StrikesManager config),
+# log_level of the workers
+def run_sweep(
+    chains: Dict[str, np.ndarray],
+    grid: Dict[str, List],
+    config: Dict = None,
+    workers: int = None,
+    output: str = None,
+) -> pd.DataFrame:
+    config = config if isinstance(config, dict) else {}
+    points = expand_grid(grid)
+    logger = logging.getLogger(__name__)
+    start = time.perf_counter()
+    with SharedChains(chains) as shared:
+        if workers == 0:
+            _init_worker(shared.spec, config)
+            results = [_run_point(point) for point in points]
+            _WORKER.clear()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(shared.spec, config),
+            ) as pool:
+                results = list(pool.map(_run_point, points))
+    logger.info(
+        "Swept %d points in %.2f seconds", len(points), time.perf_counter() - start
+    )
+    table = pd.DataFrame(results).sort_values("total_pnl", ascending=False)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    if output:
+        table.to_csv(output, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "chains",
+        type=str,
+        help="csv/parquet of 1m option closes: timestamp, code, strike, cp, close",
+    )
+    parser.add_argument(
+        "-cp", "--closest_premium", nargs="+", type=float, default=[7.0]
+    )
+    parser.add_argument(
+        "-sl", "--stop_loss_factor", nargs="+", type=float, default=[1.55]
+    )
+    parser.add_argument(
+        "--monitor-target", nargs="+", type=float, default=[float("inf")]
+    )
+    parser.add_argument("--strangle", action="store_true", help="Sweep strangles")
+    parser.add_argument("--straddle", action="store_true", help="Sweep straddles")
+    parser.add_argument("-q", "--quantity", default=50, type=int)
+    parser.add_argument("--index", default="NIFTY", type=str)
+    parser.add_argument("--workers", default=os.cpu_count(), type=int)
+    parser.add_argument("--output", default="sweep_results.csv", type=str)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    reader = pd.read_parquet if args.chains.endswith(".parquet") else pd.read_csv
+    ranked = run_sweep(
+        pack_chains(reader(args.chains)),
+        {
+            "CLOSEST_PREMINUM": args.closest_premium,
+            "SL_FACTOR": args.stop_loss_factor,
+            "TARGET": args.monitor_target,
+            "STRATEGY": [
+                name
+                for name, wanted in (
+                    ("strangle", args.strangle),
+                    ("straddle", args.straddle),
+                )
+                if wanted
+            ]
+            or ["strangle"],
+        },
+        {"index": args.index, "QTY": args.quantity},
+        workers=args.workers,
+        output=args.output,
+    )
+    print(ranked.head(20).to_string(index=False))
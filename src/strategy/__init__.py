@@ -1 +1,2 @@
 from . import base_strategy
+from . import strategy_engine
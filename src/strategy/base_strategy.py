@@ -1,5 +1,6 @@
 # Author : Prashant Srivastava
 from enum import Enum
+import itertools
 import json
 import logging
 import math
@@ -8,6 +9,13 @@ from typing import Dict, List
 from abc import ABC
 from abc import abstractmethod
 
+from src.common.position_book import PositionBook
+from src.common.position_ledger import PositionLedger
+
+
+# Unique strategy ids of the process, see BaseStrategy.strategy_id
+_strategy_ids = itertools.count(1)
+
 
 class StrategyState(Enum):
     WAITING = 0
@@ -18,15 +26,28 @@ class StrategyState(Enum):
 
 
 class BaseStrategy(ABC):
-    def __init__(self, name: str, scrip_codes: List):
+    def __init__(
+        self, name: str, scrip_codes: List, position_book: PositionBook = None
+    ):
         self.scrip_codes = scrip_codes
         self.name = name
         self.logger = logging.getLogger(__name__)
-        self.executed_orders = None
+        # Executed legs, in a book that may be shared by many strategies. The
+        # book is the only record of the positions
+        self.position_book = position_book if position_book else PositionBook()
         self.tag = f"{self.name.lower()}{int(time.time())}"
+        # Key of the strategy in the book, unlike the tag unique in the process
+        self.strategy_id = f"{self.name.lower()}#{next(_strategy_ids)}"
         self.target_mtm_profit = math.inf
         self.target_mtm_loss = -math.inf
+        # Exit when the MTM falls this much below its high-water mark
+        self.target_mtm_drawdown = math.inf
+        # Running MTM of the executed legs (their get_leg_pnl), updated by the
+        # leg that ticked
+        self.ledger = PositionLedger()
         self.startegy_state = StrategyState.WAITING
+        # StrategyEngine hosting the strategy, if any
+        self.engine = None
 
     def set_mtm_target(self, profit: float):
         self.target_mtm_profit = profit
@@ -34,6 +55,12 @@ class BaseStrategy(ABC):
     def set_mtm_stop_loss(self, loss: float):
         self.target_mtm_loss = loss
 
+    def set_mtm_max_drawdown(self, drawdown: float):
+        self.target_mtm_drawdown = drawdown
+
+    def get_mtm_max_drawdown(self):
+        return self.target_mtm_drawdown
+
     def get_mtm_target(self):
         return self.target_mtm_profit
 
@@ -52,6 +79,9 @@ class BaseStrategy(ABC):
         if scrip_code in self.scrip_codes:
             self.scrip_codes.remove(scrip_code)
             self.logger.debug("Removed scrip code %d from strategy", scrip_code)
+        if self.engine is not None:
+            # the feed is shared, the engine unsubscribes once nobody needs it
+            self.engine.remove_scrips(self, [scrip_code])
 
     def exit(self, _ohlcvt: Dict) -> bool:
         shall_exit = False
@@ -64,6 +94,11 @@ class BaseStrategy(ABC):
                 elif pnl <= self.get_mtm_stop_loss():
                     self.logger.info("Target Stop Loss Hit at %f", pnl)
                     shall_exit = True
+                elif self.ledger.drawdown >= self.get_mtm_max_drawdown():
+                    self.logger.info(
+                        "Max Drawdown Hit at %f, peak %f", pnl, self.ledger.peak
+                    )
+                    shall_exit = True
                 if shall_exit:
                     self.logger.info(
                         "Executed Orders: %s",
@@ -72,13 +107,18 @@ class BaseStrategy(ABC):
         return shall_exit
 
     def get_pnl(self):
-        # sum all the pnl of each leg
-        total_pnl = None
-        if self.executed_orders:
-            total_pnl = 0.0
-            for _, info in self.executed_orders.items():
-                total_pnl += info["pnl"]
-        return total_pnl
+        # running total of the legs' pnl, see PositionLedger
+        if not self.ledger:
+            return None
+        return self.ledger.total
+
+    # MTM high-water mark, current and maximum drawdown of the strategy
+    def get_drawdown(self) -> Dict:
+        return {
+            "peak": self.ledger.peak,
+            "drawdown": self.ledger.drawdown,
+            "max_drawdown": self.ledger.max_drawdown,
+        }
 
     def is_in_position(self):
         return self.get_strategy_state() in [
@@ -86,28 +126,64 @@ class BaseStrategy(ABC):
             StrategyState.PLACED,
         ]
 
+    # {code: {"rate", "qty", "side", "ltp", "pnl"}} of the executed legs, None
+    # if none. Built from the position book on every access, keep it off the
+    # tick path. Assigning it replaces the legs in the book ("side" defaults
+    # to get_leg_side), None clears them
+    @property
+    def executed_orders(self) -> Dict:
+        return self.position_book.get_all_executed_orders(self.strategy_id)
+
+    @executed_orders.setter
+    def executed_orders(self, legs: Dict) -> None:
+        for code in self.position_book.positions(self.strategy_id):
+            self.position_book.remove_position(self.strategy_id, code)
+        self.ledger = PositionLedger()
+        for code, leg in (legs or {}).items():
+            self.book_leg(
+                code, leg["rate"], leg["qty"], leg.get("side", self.get_leg_side(code))
+            )
+
     def get_executed_order(self, code) -> (float, int):  # Avg, Qty
-        if code not in self.executed_orders:
-            return (None, None)
-        return (self.executed_orders[code]["rate"], self.executed_orders[code]["qty"])
+        return self.position_book.get_executed_order(self.strategy_id, code)
 
     def get_all_executed_orders(self):
         return self.executed_orders
 
+    # Side of a leg whose order update carries no "BuySell", "S" for sold
+    def get_leg_side(self, _code: int) -> str:
+        return "S"
+
+    def book_leg(self, code: int, rate: float, qty: int, side: str) -> None:
+        self.position_book.add_position(
+            self.strategy_id, code, rate, qty, 1 if side == "B" else -1
+        )
+        self.ledger.add_leg(code)
+
     def run(self, ohlcvt: Dict, _user_data: Dict = None):
         # Following is done to update the ltp of the scrip in the
-        # executed_orders only
+        # position book and the MTM of its leg only
         if self.get_strategy_state() == StrategyState.EXECUTED:
-            ltp = ohlcvt["c"]
             code = ohlcvt["code"]
-            if code in self.executed_orders:
-                self.executed_orders[code]["ltp"] = ltp
-                self.executed_orders[code]["pnl"] = self.get_leg_pnl(
-                    code,
-                    self.executed_orders[code]["rate"],
-                    self.executed_orders[code]["qty"],
-                    self.executed_orders[code]["ltp"],
-                )
+            if code in self.ledger:
+                ltp = ohlcvt["c"]
+                # A hosting StrategyEngine updates its own book once per tick
+                if (
+                    self.engine is None
+                    or self.position_book is not self.engine.position_book
+                ):
+                    self.position_book.update_ltp(code, ltp)
+                avg, qty = self.position_book.get_executed_order(self.strategy_id, code)
+                self.ledger.update(code, self.get_leg_pnl(code, avg, qty, ltp), ltp)
+
+    # Callback for LiveFeedManager batch mode. Only the latest tick of each scrip
+    # in the batch matters for P&L, so run() is invoked once per scrip
+    def run_batch(self, ticks: List[Dict], user_data: Dict = None):
+        latest = {}
+        for ohlcvt in ticks:
+            latest[ohlcvt["code"]] = ohlcvt
+        for ohlcvt in latest.values():
+            self.run(ohlcvt, user_data)
 
     def order_placed(self, order: Dict, _subs_list: Dict, _user_data: Dict):
         # If this is a fresh order and is fully executed
@@ -120,22 +196,24 @@ class BaseStrategy(ABC):
             and order["Status"] == "Fully Executed"
         )
         if fresh_orders and order["ScripCode"] in self.scrip_codes:
-            if not self.executed_orders:
-                self.executed_orders = {}
-            if order["ScripCode"] not in self.executed_orders:
-                self.executed_orders[order["ScripCode"]] = {
-                    "rate": order["Price"],
-                    "qty": order["Qty"],
-                    "ltp": order["Price"],
-                    "pnl": 0.0,
-                }
+            code = order["ScripCode"]
+            if not self.position_book.has_position(self.strategy_id, code):
+                self.book_leg(
+                    code,
+                    order["Price"],
+                    order["Qty"],
+                    order.get("BuySell") or self.get_leg_side(code),
+                )
                 self.logger.info(
                     "New updated executed_orders %s",
                     json.dumps(self.executed_orders, indent=2),
                 )
-                ## If all the self.executed_orders.keys() are in self.scrip_codes
+                ## If all the executed legs are in self.scrip_codes
                 ## then set strategy state to executed
-                if all(code in self.scrip_codes for code in self.executed_orders):
+                if all(
+                    code in self.scrip_codes
+                    for code in self.position_book.positions(self.strategy_id)
+                ):
                     self.logger.debug(
                         "All orders executed, setting strategy state to executed"
                     )
@@ -0,0 +1,162 @@
+# Author : Prashant Srivastava
+import logging
+import threading
+import traceback
+from typing import Any, Dict, List
+
+from src.clients.iclientmanager import IClientManager
+from src.common.feed_hub import FeedHub
+from src.common.position_book import PositionBook
+from src.strategy.base_strategy import BaseStrategy, StrategyState
+
+
+# Hosts any number of BaseStrategy instances on one FeedHub (one broker
+# socket, one dispatch thread) instead of a feed and threads each. Every
+# strategy is a hub consumer owning its tag: the hub routes a tick only to the
+# strategies trading its scrip, reference counts the subscriptions and sends
+# order updates (entry, "sl" and "sq" tags) to the owning strategy only, a stop
+# loss dropping the scrip for that strategy alone.
+# Strategies drive entry()/exit() from run() as before. Create them with
+# engine.position_book to keep all the legs in one book: its LTPs are updated
+# once per tick, or per tick batch in batch mode, before the strategies run.
+# Config: FeedHub config ("batch_mode", "conflate", ...); by default the engine
+# has a hub of its own, started by start(). Pass hub to share one, e.g.
+# FeedHub.for_client(client)
+class StrategyEngine:
+    def __init__(
+        self,
+        client: IClientManager,
+        config: Dict = None,
+        position_book: PositionBook = None,
+        hub: FeedHub = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        config = dict(config) if isinstance(config, dict) else {}
+        config.setdefault("auto_start", False)
+        self.hub = hub if hub is not None else FeedHub(client, config)
+        self.position_book = position_book if position_book else PositionBook()
+        self.lock = threading.RLock()
+        self.strategies: List[BaseStrategy] = []
+        # id(strategy) -> hub consumer id, and back
+        self.consumer_ids: Dict[int, int] = {}
+        self.by_consumer: Dict[int, BaseStrategy] = {}
+        self.ticks = 0
+        self.dispatches = 0
+        self.hub.add_tick_listener(self.update_book)
+
+    # Scrip code -> number of hosted strategies trading it
+    @property
+    def ref_counts(self) -> Dict[int, int]:
+        return self.hub.ref_counts
+
+    def register(self, strategy: BaseStrategy) -> None:
+        with self.lock:
+            if id(strategy) in self.consumer_ids:
+                return
+            self.strategies.append(strategy)
+            strategy.engine = self
+            consumer_id = self.hub.register(
+                list(strategy.scrip_codes),
+                lambda tick, user_data: self._run(strategy, tick, user_data),
+                lambda message, subscriptions, user_data: self._order_placed(
+                    strategy, message, subscriptions, user_data
+                ),
+                user_data={"order_update": []},
+                tags=[strategy.tag],
+            )
+            self.consumer_ids[id(strategy)] = consumer_id
+            self.by_consumer[consumer_id] = strategy
+            self.logger.info(
+                "Registered strategy %s for scrips %s",
+                strategy.tag,
+                strategy.scrip_codes,
+            )
+
+    def unregister(self, strategy: BaseStrategy) -> None:
+        with self.lock:
+            consumer_id = self.consumer_ids.pop(id(strategy), None)
+            if consumer_id is None:
+                return
+            self.hub.unregister(consumer_id)
+            del self.by_consumer[consumer_id]
+            self.strategies.remove(strategy)
+            strategy.engine = None
+            self.logger.info("Unregistered strategy %s", strategy.tag)
+
+    def add_scrips(self, strategy: BaseStrategy, scrip_codes: List[int]) -> None:
+        with self.lock:
+            self.hub.add_scrips(self.consumer_ids[id(strategy)], scrip_codes)
+
+    def remove_scrips(self, strategy: BaseStrategy, scrip_codes: List[int]) -> None:
+        with self.lock:
+            consumer_id = self.consumer_ids.get(id(strategy))
+            if consumer_id is not None:
+                self.hub.remove_scrips(consumer_id, scrip_codes)
+
+    def start(self) -> None:
+        self.hub.start()
+
+    def stop(self) -> None:
+        for strategy in list(self.strategies):
+            strategy.set_strategy_state(StrategyState.STOPPED)
+        self.hub.stop()
+
+    # Tick listener of the hub: the book's LTPs, once for all the strategies
+    def update_book(self, ticks: Any) -> None:
+        if isinstance(ticks, list):
+            if not ticks:
+                return
+            self.position_book.update_ltps(
+                [tick["code"] for tick in ticks], [tick["c"] for tick in ticks]
+            )
+            self.ticks += len(ticks)
+        else:
+            self.position_book.update_ltp(ticks["code"], ticks["c"])
+            self.ticks += 1
+
+    # A tick, or a list of ticks, as the feed hands them to the hub
+    def dispatch(self, ticks: Any, _user_data: Dict = None) -> None:
+        self.hub.dispatch(ticks)
+
+    def _run(self, strategy: BaseStrategy, tick: Dict, user_data: Dict) -> None:
+        self.dispatches += 1
+        try:
+            strategy.run(tick, user_data)
+        except Exception as exp:
+            self.logger.error("Strategy %s failed on tick: %s", strategy.tag, exp)
+            self.logger.error("Stack Trace :%s", traceback.format_exc())
+        if strategy.get_strategy_state() == StrategyState.STOPPED:
+            self.unregister(strategy)
+
+    def strategy_for_tag(self, tag: str) -> BaseStrategy:
+        consumer = self.hub.consumer_for_tag(tag)
+        return self.by_consumer.get(consumer.consumer_id) if consumer else None
+
+    def on_order_update(
+        self, message: Dict, subscription_list: list, _user_data: Dict = None
+    ) -> None:
+        self.hub.on_order_update(message, subscription_list)
+
+    def _order_placed(
+        self,
+        strategy: BaseStrategy,
+        message: Dict,
+        subscriptions: list,
+        user_data: Dict,
+    ) -> None:
+        try:
+            strategy.order_placed(message, subscriptions, user_data)
+        except Exception as exp:
+            self.logger.error(
+                "Strategy %s failed on order update: %s", strategy.tag, exp
+            )
+            self.logger.error("Stack Trace :%s", traceback.format_exc())
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                "strategies": len(self.strategies),
+                "subscriptions": self.hub.get_subscriptions(),
+                "ticks": self.ticks,
+                "dispatches": self.dispatches,
+            }
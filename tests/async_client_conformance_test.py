@@ -0,0 +1,113 @@
+## Author : Prashant Srivastava
+## Conformance checks every AsyncClientManager implementation must pass:
+## awaitable calls, response shapes the order/strategy code relies on, SL
+## orders pending until cancelled, tag batching and concurrent placement.
+## Usage: python -m tests.async_client_conformance_test [--sync-dummy]
+##   --sync-dummy also runs the checks on client_dummy through SyncClientAdapter
+##   (needs the MongoDB used by client_dummy)
+import argparse
+import asyncio
+import logging
+import time
+
+from src.clients import async_client_dummy
+from src.clients import client_dummy
+from src.clients.async_client_manager import AsyncClientManager
+from src.clients.async_client_manager import SyncClientAdapter
+
+logging.basicConfig(level=logging.INFO)
+
+
+def make_order(tag: str, code: int, price: float, sl_price: float = 0.0):
+    return {
+        "OrderType": "S" if sl_price == 0.0 else "B",
+        "Exchange": "N",
+        "ExchangeType": "D",
+        "ScripCode": code,
+        "Qty": 50,
+        "Price": price,
+        "StopLossPrice": sl_price,
+        "IsIntraday": True,
+        "RemoteOrderID": tag,
+    }
+
+
+async def check_conformance(client: AsyncClientManager):
+    assert isinstance(client, AsyncClientManager)
+    client = await client.login()
+    tag = f"c{int(time.time() * 1000) % 10**9}"
+    sl_tag = "sl" + tag
+
+    ## Chain shape used by StrikesManager
+    chain = await client.get_option_chain("N", "NIFTY", 0)
+    for item in chain["Options"]:
+        assert {"LastRate", "ScripCode", "Name", "CPType", "StrikeRate"} <= set(item)
+
+    ## Concurrent entry legs and their SL orders
+    await asyncio.gather(
+        client.place_order(**make_order(tag, 201945003, 8.0)),
+        client.place_order(**make_order(tag, 301945003, 7.5)),
+    )
+    await asyncio.gather(
+        client.place_order(**make_order(sl_tag, 201945003, 17.0, 16.0)),
+        client.place_order(**make_order(sl_tag, 301945003, 16.0, 15.0)),
+    )
+
+    status = await client.fetch_order_status([{"Exch": "N", "RemoteOrderID": tag}])
+    rows = status["OrdStatusResLst"]
+    assert len(rows) == 2
+    for item in rows:
+        assert {"ExchOrderID", "ScripCode", "Status", "PendingQty"} <= set(item)
+        assert item["Status"] == "Fully Executed"
+
+    by_tag = await client.fetch_order_status_by_tags([tag, sl_tag])
+    assert len(by_tag[tag]) == 2 and len(by_tag[sl_tag]) == 2
+    pending = [item for item in by_tag[sl_tag] if item["Status"] == "Pending"]
+    assert len(pending) == 2 and all(item["PendingQty"] > 0 for item in pending)
+
+    ## Trade book rows joined against order status by ExchOrderID
+    trade_book = (await client.get_tradebook())["TradeBookDetail"]
+    exch_ids = {str(item["ExchOrderID"]) for item in rows}
+    trades = [item for item in trade_book if str(item["ExchOrderID"]) in exch_ids]
+    assert len(trades) == 2
+    for item in trades:
+        assert {"ScripCode", "Qty", "Rate", "BuySell", "ExchType"} <= set(item)
+
+    ## Cancelling the SL orders
+    await client.cancel_bulk_order(
+        [{"ExchOrderID": str(item["ExchOrderID"])} for item in pending]
+    )
+    by_tag = await client.fetch_order_status_by_tags([sl_tag])
+    assert all(item["Status"] != "Pending" for item in by_tag[sl_tag])
+
+    order_book = await client.order_book()
+    assert {tag, sl_tag} <= {item["RemoteOrderID"] for item in order_book}
+    for item in order_book:
+        assert {"BuySell", "ScripName", "Qty", "AveragePrice"} <= set(item)
+    assert tag in await client.get_todays_tags()
+
+    assert isinstance(client.get_feed_url(), str)
+    await client.close()
+
+
+async def check_latency_overlaps():
+    ## Calls on the async dummy overlap instead of queuing on each other
+    client = async_client_dummy.Client(latency=0.1, notify_feed=False)
+    start = time.perf_counter()
+    await asyncio.gather(*[client.order_book() for _ in range(20)])
+    elapsed = time.perf_counter() - start
+    logging.info("20 concurrent calls of 100ms took %.3fs", elapsed)
+    assert elapsed < 0.5
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync-dummy", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(check_conformance(async_client_dummy.Client(notify_feed=False)))
+    logging.info("async_client_dummy.Client conforms")
+    asyncio.run(check_latency_overlaps())
+    if args.sync_dummy:
+        asyncio.run(check_conformance(SyncClientAdapter(client_dummy.Client())))
+        logging.info("SyncClientAdapter(client_dummy.Client) conforms")
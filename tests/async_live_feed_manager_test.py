@@ -0,0 +1,50 @@
+## Author : Prashant Srivastava
+## Runs AsyncLiveFeedManager against the local simulator feed (simulator/feeds.py)
+## Usage: python -m tests.async_live_feed_manager_test --duration 10
+import argparse
+import asyncio
+import logging
+from typing import Dict
+
+from src.clients.client_dummy import Client as ClientDummy
+from src.common.async_live_feed_manager import AsyncLiveFeedManager
+from src.simulator.feeds import WebSocketServer
+
+
+async def on_scrip_data(ohlcvt: Dict, user_data: Dict):
+    user_data["ticks"] += 1
+    user_data["ltp"][ohlcvt["code"]] = ohlcvt["c"]
+    logging.info("Tick %d %s", user_data["ticks"], ohlcvt)
+
+
+async def main(duration: float, port: int):
+    server = WebSocketServer("localhost", port)
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.5)
+
+    client = ClientDummy()
+    client.port = port
+    feed = AsyncLiveFeedManager(client, {})
+    user_data = {"ticks": 0, "ltp": {}}
+    await feed.monitor(
+        scrip_codes=[201945003, 301945003],
+        on_scrip_data=on_scrip_data,
+        user_data=user_data,
+    )
+    try:
+        await asyncio.wait_for(feed.wait_closed(), timeout=duration)
+    except asyncio.TimeoutError:
+        await feed.stop()
+    logging.info(
+        "Received %d ticks, last prices %s", user_data["ticks"], user_data["ltp"]
+    )
+    server_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.duration, args.port))
@@ -0,0 +1,178 @@
+## Author : Prashant Srivastava
+## A year of NIFTY weekly short strangles through the Backtester: one unchanged
+## BaseStrategy subclass per week, entered at 09:20 of the first day and exited
+## on MTM target/stop or at 15:15 of expiry, with time.time() virtualized.
+## Bars are synthetic (Black-Scholes on a simulated NIFTY), use
+## backtester.load_option_data for the recorded ones. The run is replayed twice
+## to check it is deterministic.
+## Usage: python -m tests.backtester_test [weeks] [--intrabar close]
+import argparse
+import datetime
+import logging
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from src.common.order_manager import OrderManager
+from src.simulator.backtester import Backtester
+from src.strategy import base_strategy
+
+logging.basicConfig(level=logging.WARNING)
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+FIRST_MONDAY = datetime.datetime(2023, 1, 2, 9, 15, tzinfo=IST)
+MINUTES = 375  # 09:15 to 15:30
+
+
+class WeeklyStrangle(base_strategy.BaseStrategy):
+    def __init__(self, week: int, strikes: Dict, order_manager, position_book):
+        super().__init__(
+            f"Strangle{week}", [strikes["ce_code"], strikes["pe_code"]], position_book
+        )
+        monday = FIRST_MONDAY + datetime.timedelta(weeks=week)
+        self.entry_time = (monday + datetime.timedelta(minutes=5)).timestamp()
+        self.expiry_exit = (monday + datetime.timedelta(days=3, hours=6)).timestamp()
+        self.strikes = strikes
+        self.order_manager = order_manager
+        self.ltp = {}
+        self.entered_at = None
+        self.set_mtm_target(2000.0)
+        self.set_mtm_stop_loss(-3000.0)
+
+    def get_leg_pnl(self, _code: int, avg: float, qty: int, ltp: float):
+        return (avg - ltp) * qty
+
+    def entry(self, _ohlcvt: Dict) -> bool:
+        return len(self.ltp) == 2 and time.time() >= self.entry_time
+
+    def exit(self, ohlcvt: Dict) -> bool:
+        return super().exit(ohlcvt) or time.time() >= self.expiry_exit
+
+    def run(self, ohlcvt: Dict, user_data: Dict = None):
+        super().run(ohlcvt, user_data)
+        self.ltp[ohlcvt["code"]] = ohlcvt["c"]
+        state = self.get_strategy_state()
+        if state == base_strategy.StrategyState.WAITING and self.entry(ohlcvt):
+            self.set_strategy_state(base_strategy.StrategyState.PLACED)
+            self.entered_at = time.time()
+            strikes = dict(self.strikes)
+            strikes.update(
+                ce_ltp=self.ltp[strikes["ce_code"]],
+                pe_ltp=self.ltp[strikes["pe_code"]],
+            )
+            self.order_manager.place_short(strikes, self.tag)
+        elif state == base_strategy.StrategyState.EXECUTED and self.exit(ohlcvt):
+            self.order_manager.squareoff(tag=self.tag, strikes=dict(self.ltp))
+            self.set_strategy_state(base_strategy.StrategyState.STOPPED)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.set_strategy_state(base_strategy.StrategyState.STOPPED)
+
+
+# 1 minute bars of a 2% OTM strangle per week, Monday to Thursday expiry
+# pylint: disable=too-many-locals
+def make_bars(weeks: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    frames = []
+    strikes = []
+    spot = 18000.0
+    for week in range(weeks):
+        minutes = 4 * MINUTES
+        steps = rng.normal(0.0, 0.12 / np.sqrt(252 * MINUTES), minutes)
+        path = spot * np.exp(np.cumsum(steps))
+        ce_strike = round(spot * 1.02 / 50) * 50
+        pe_strike = round(spot * 0.98 / 50) * 50
+        ## time to expiry in years, minute by minute down to the close of day 4
+        expiry = (minutes - np.arange(minutes) + 1) / (252 * MINUTES)
+        volatility = 0.12 * np.sqrt(expiry)
+        prices = {}
+        for kind, strike in (("CE", ce_strike), ("PE", pe_strike)):
+            d1_value = (np.log(path / strike) + 0.5 * volatility**2) / volatility
+            d2_value = d1_value - volatility
+            if kind == "CE":
+                price = path * norm.cdf(d1_value) - strike * norm.cdf(d2_value)
+            else:
+                price = strike * norm.cdf(-d2_value) - path * norm.cdf(-d1_value)
+            prices[kind] = np.maximum(np.round(price * 20) / 20, 0.05)
+        ce_code = 200000000 + ce_strike * 100 + week
+        pe_code = 300000000 + pe_strike * 100 + week
+        strikes.append({"ce_code": ce_code, "pe_code": pe_code})
+        monday = FIRST_MONDAY + datetime.timedelta(weeks=week)
+        stamps = pd.DatetimeIndex(
+            [
+                monday + datetime.timedelta(days=day, minutes=minute)
+                for day in range(4)
+                for minute in range(MINUTES)
+            ]
+        )
+        for code, close in ((ce_code, prices["CE"]), (pe_code, prices["PE"])):
+            opens = np.concatenate([[close[0]], close[:-1]])
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "timestamp": stamps,
+                        "code": code,
+                        "open": opens,
+                        "high": np.maximum(opens, close) + 0.05,
+                        "low": np.maximum(np.minimum(opens, close) - 0.05, 0.05),
+                        "close": close,
+                        "volume": 1000,
+                    }
+                )
+            )
+        spot = path[-1]
+    return pd.concat(frames, ignore_index=True), strikes
+
+
+def backtest(frame: pd.DataFrame, strikes, intrabar: str) -> Dict:
+    backtester = Backtester(
+        {
+            "intrabar": intrabar,
+            "broker": {"slippage_ticks": 1},
+            "start_time": FIRST_MONDAY.timestamp(),
+        }
+    )
+    order_manager = OrderManager(
+        backtester.client, {"QTY": 50, "FILL_TIMEOUT": 60.0, "SL_ORDER_GAP": 0.5}
+    )
+    with backtester.virtual_time():
+        strategies = [
+            WeeklyStrangle(week, item, order_manager, backtester.position_book)
+            for week, item in enumerate(strikes)
+        ]
+    for strategy in strategies:
+        backtester.add_strategy(strategy)
+    report = backtester.run_bars(frame)
+    backtester.stop()
+    ## Entries happened on virtual time, at the first tick after 09:20 Monday
+    for strategy in strategies:
+        assert strategy.entered_at is not None
+        assert 0 <= strategy.entered_at - strategy.entry_time < 60
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("weeks", type=int, nargs="?", default=52)
+    parser.add_argument("--intrabar", default="ohlc", choices=["ohlc", "close"])
+    args = parser.parse_args()
+
+    bars, strangles = make_bars(args.weeks)
+    first = backtest(bars, strangles, args.intrabar)
+    second = backtest(bars, strangles, args.intrabar)
+    assert first["pnl"] == second["pnl"] and first["ticks"] == second["ticks"]
+    print(
+        f"{args.weeks} weeks, {len(bars)} bars, {first['ticks']} ticks "
+        f"({args.intrabar}) in {first['elapsed']:.2f}s"
+    )
+    winners = sum(1 for pnl in first["pnl"].values() if pnl > 0)
+    print(
+        f"Total P&L {first['total_pnl']:.2f}, {winners}/{len(first['pnl'])} "
+        f"winning weeks, {sum(first['trades'].values())} fills"
+    )
@@ -0,0 +1,148 @@
+## Author : Prashant Srivastava
+## Benchmark: legacy per-contract loops vs the vectorized OptionChain selection
+## on a synthetic chain. Usage: python -m tests.bench_option_chain --strikes 500
+import argparse
+import math
+import random
+import time
+
+from src.common.option_chain import OptionChain
+
+
+def synthetic_chain(num_strikes: int, spot: float = 19500.0, step: float = 50.0):
+    contracts = []
+    first = spot - (num_strikes // 2) * step
+    for i in range(num_strikes):
+        strike = first + i * step
+        intrinsic_ce = max(spot - strike, 0.0)
+        intrinsic_pe = max(strike - spot, 0.0)
+        time_value = 150.0 * math.exp(-(((strike - spot) / 600.0) ** 2))
+        for cp_type, intrinsic in (("CE", intrinsic_ce), ("PE", intrinsic_pe)):
+            ltp = round(intrinsic + time_value + random.uniform(-0.5, 0.5), 2)
+            contracts.append(
+                {
+                    "LastRate": ltp if ltp > 0.05 else 0.0,
+                    "ScripCode": 40000 + len(contracts),
+                    "Name": f"NIFTY 31 Aug 2023 {cp_type} {strike:.2f}",
+                    "CPType": cp_type,
+                    "StrikeRate": strike,
+                }
+            )
+    random.shuffle(contracts)
+    return contracts
+
+
+## Copies of StrikesManager.straddle_strikes/strangle_strikes before OptionChain
+def legacy_straddle(contracts):
+    ce_strikes = {}
+    pe_strikes = {}
+    for contract in contracts:
+        ltp = contract["LastRate"]
+        code = contract["ScripCode"]
+        name = contract["Name"]
+        ctype = contract["CPType"]
+        strike = contract["StrikeRate"]
+        if ltp > 0:
+            if ctype == "CE":
+                ce_strikes[strike] = {"ltp": ltp, "code": code, "name": name}
+            else:
+                pe_strikes[strike] = {"ltp": ltp, "code": code, "name": name}
+    min_diff = math.inf
+    atm = 0
+    for key, value in ce_strikes.items():
+        if key in pe_strikes:
+            diff = abs(value["ltp"] - pe_strikes[key]["ltp"])
+            if min_diff > diff:
+                min_diff = diff
+                atm = key
+    return ce_strikes[atm]["code"], pe_strikes[atm]["code"]
+
+
+def legacy_strangle(contracts, closest_price_thresh):
+    min_pe_diff = min_ce_diff = math.inf
+    ce_code = -1
+    pe_code = -1
+    for contract in contracts:
+        ltp = contract["LastRate"]
+        code = contract["ScripCode"]
+        ctype = contract["CPType"]
+        if ltp < closest_price_thresh:
+            continue
+        diff = ltp - closest_price_thresh
+        if ctype == "CE" and min_ce_diff > diff:
+            min_ce_diff = diff
+            ce_code = code
+        if ctype == "PE" and min_pe_diff > diff:
+            min_pe_diff = diff
+            pe_code = code
+    return ce_code, pe_code
+
+
+def vectorized_straddle(chain: OptionChain):
+    _, ce_strike, pe_strike, _ = chain.atm()
+    return ce_strike["code"], pe_strike["code"]
+
+
+def vectorized_strangle(chain: OptionChain, closest_price_thresh):
+    ce_strike, _ = chain.closest_premium("CE", closest_price_thresh)
+    pe_strike, _ = chain.closest_premium("PE", closest_price_thresh)
+    return ce_strike["code"], pe_strike["code"]
+
+
+## What StrikesManager pays per fresh chain fetch
+def normalized_selection(contracts, closest_price_thresh):
+    chain = OptionChain(contracts)
+    return vectorized_straddle(chain), vectorized_strangle(chain, closest_price_thresh)
+
+
+def timed(name: str, func, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:<40} {elapsed * 1e6:>10.1f} us/call")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strikes", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--premium", type=float, default=8.0)
+    args = parser.parse_args()
+
+    chain_contracts = synthetic_chain(args.strikes)
+    normalized = OptionChain(chain_contracts)
+
+    timed("normalize chain", lambda: OptionChain(chain_contracts), args.rounds)
+    legacy = timed(
+        "legacy straddle", lambda: legacy_straddle(chain_contracts), args.rounds
+    )
+    fast = timed(
+        "vectorized straddle", lambda: vectorized_straddle(normalized), args.rounds
+    )
+    assert legacy == fast, (legacy, fast)
+    legacy = timed(
+        "legacy strangle",
+        lambda: legacy_strangle(chain_contracts, args.premium),
+        args.rounds,
+    )
+    fast = timed(
+        "vectorized strangle",
+        lambda: vectorized_strangle(normalized, args.premium),
+        args.rounds,
+    )
+    assert legacy == fast, (legacy, fast)
+    timed(
+        "legacy straddle + strangle",
+        lambda: (
+            legacy_straddle(chain_contracts),
+            legacy_strangle(chain_contracts, args.premium),
+        ),
+        args.rounds,
+    )
+    timed(
+        "normalize + straddle + strangle",
+        lambda: normalized_selection(chain_contracts, args.premium),
+        args.rounds,
+    )
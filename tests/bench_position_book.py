@@ -0,0 +1,81 @@
+## Author : Prashant Srivastava
+## Portfolio MTM of many strategies: dict of dicts per strategy updated tick by
+## tick (the former BaseStrategy.executed_orders) against the shared PositionBook
+## updated once per tick batch.
+## Usage: python -m tests.bench_position_book [strategies] [legs]
+import random
+import sys
+import timeit
+
+from src.common.position_book import PositionBook
+
+STRATEGIES = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+LEGS = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+SCRIPS = [200000000 + i for i in range(STRATEGIES * LEGS // 2)]
+BATCHES = 200
+BATCH_SIZE = 100
+
+random.seed(7)
+positions = {
+    f"s{index}": {
+        code: (
+            random.uniform(50, 150),
+            50 * random.randint(1, 4),
+            random.choice([-1, 1]),
+        )
+        for code in random.sample(SCRIPS, LEGS)
+    }
+    for index in range(STRATEGIES)
+}
+batches = [
+    [(random.choice(SCRIPS), random.uniform(50, 150)) for _ in range(BATCH_SIZE)]
+    for _ in range(BATCHES)
+]
+
+
+def dicts():
+    executed = {
+        name: {
+            code: {"rate": avg, "qty": qty, "sign": sign, "ltp": avg, "pnl": 0.0}
+            for code, (avg, qty, sign) in legs.items()
+        }
+        for name, legs in positions.items()
+    }
+    holders = {}
+    for name, legs in executed.items():
+        for code in legs:
+            holders.setdefault(code, []).append(name)
+    mtm = {}
+    for batch in batches:
+        for code, ltp in batch:
+            for name in holders.get(code, ()):
+                leg = executed[name][code]
+                leg["ltp"] = ltp
+                leg["pnl"] = (ltp - leg["rate"]) * leg["qty"] * leg["sign"]
+        mtm = {
+            name: sum(leg["pnl"] for leg in legs.values())
+            for name, legs in executed.items()
+        }
+    return mtm
+
+
+def book():
+    position_book = PositionBook()
+    for name, legs in positions.items():
+        for code, (avg, qty, sign) in legs.items():
+            position_book.add_position(name, code, avg, qty, sign)
+    mtm = {}
+    for batch in batches:
+        codes, prices = zip(*batch)
+        position_book.update_ltps(codes, prices)
+        mtm = position_book.mtm_by_strategy()
+    return mtm
+
+
+if __name__ == "__main__":
+    expected, actual = dicts(), book()
+    assert all(abs(expected[name] - actual[name]) < 1e-6 for name in expected)
+    print(f"{STRATEGIES} strategies x {LEGS} legs, {BATCHES} batches of {BATCH_SIZE}")
+    for func in (dicts, book):
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{func.__name__:>6}: {seconds * 1000:8.2f} ms")
@@ -0,0 +1,196 @@
+## Author : Prashant Srivastava
+## Parameter sweep of daily strangles/straddles over a year of synthetic NIFTY
+## chains (Black-Scholes, weekly Thursday expiry). Checks the vectorized event
+## scan of simulate_session against a minute by minute replay on the same
+## broker, then times the sweep in process and on process pools.
+## Usage: python -m tests.bench_sweep [sessions] [--workers 1 2 4]
+import argparse
+import datetime
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from src.common import order_manager
+from src.common.strikes_manager import StrikesManager
+from src.simulator import sweep
+from src.simulator.backtester import VirtualClock, virtual_time
+
+logging.basicConfig(level=logging.WARNING)
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+MINUTES = 375
+GRID = {
+    "CLOSEST_PREMINUM": [5.0, 7.0, 10.0, 15.0],
+    "SL_FACTOR": [1.3, 1.55, 2.0],
+    "TARGET": [1000.0, 2000.0, float("inf")],
+    "STRATEGY": ["strangle", "straddle"],
+}
+
+
+# pylint: disable=too-many-locals
+def make_chains(sessions: int, seed: int = 5) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2023-01-02", periods=sessions)
+    spot = 18000.0
+    frames = []
+    for day in days:
+        steps = rng.normal(0.0, 0.13 / np.sqrt(252 * MINUTES), MINUTES)
+        path = spot * np.exp(np.cumsum(steps))
+        atm = round(spot / 50) * 50
+        strikes = atm + 50 * np.arange(-10, 11)
+        ## trading days to Thursday's close, minute by minute
+        days_left = (3 - day.weekday()) % 7 + 1
+        expiry = (days_left * MINUTES - np.arange(MINUTES)) / (252 * MINUTES)
+        volatility = 0.13 * np.sqrt(expiry)
+        moneyness = np.log(path[None, :] / strikes[:, None])
+        d1_value = (moneyness + 0.5 * volatility**2) / volatility
+        d2_value = d1_value - volatility
+        calls = path * norm.cdf(d1_value) - strikes[:, None] * norm.cdf(d2_value)
+        puts = strikes[:, None] * norm.cdf(-d2_value) - path * norm.cdf(-d1_value)
+        start = datetime.datetime(day.year, day.month, day.day, 9, 15, tzinfo=IST)
+        stamps = pd.date_range(start, periods=MINUTES, freq="min")
+        for kind, prices, base in (("CE", calls, 200000000), ("PE", puts, 300000000)):
+            prices = np.maximum(np.round(prices * 20) / 20, 0.05)
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "timestamp": stamps[np.tile(np.arange(MINUTES), len(strikes))],
+                        "code": np.repeat(base + strikes * 100 + days_left, MINUTES),
+                        "strike": np.repeat(strikes, MINUTES),
+                        "cp": kind,
+                        "close": prices.ravel(),
+                    }
+                )
+            )
+        spot = path[-1]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Minute by minute reference of sweep.simulate_session
+def reference_session(chains, session, params, strike_mgr, config):
+    start, stop = chains["bounds"][session], chains["bounds"][session + 1]
+    codes = chains["codes"][start:stop]
+    prices = chains["prices"][start:stop]
+    entry = config.get("entry_minute", 5)
+    exit_minute = prices.shape[1] + config.get("exit_minute", -15)
+    clock = VirtualClock(chains["session_time"][session] + entry * 60)
+    contracts = [
+        {
+            "LastRate": float(ltp),
+            "ScripCode": int(code),
+            "Name": str(code),
+            "CPType": "PE" if is_pe else "CE",
+            "StrikeRate": float(strike),
+        }
+        for code, strike, is_pe, ltp in zip(
+            codes,
+            chains["strikes"][start:stop],
+            chains["is_pe"][start:stop],
+            prices[:, entry],
+        )
+    ]
+    client = sweep.ChainClient(contracts, config.get("broker"), clock)
+    for contract in contracts:
+        client.match_price(contract["ScripCode"], contract["LastRate"], clock.time())
+    strike_mgr.client = client
+    strike_mgr.invalidate_cache()
+    if params["STRATEGY"] == "straddle":
+        strikes = strike_mgr.straddle_strikes(index="NIFTY")
+    else:
+        strikes = strike_mgr.strangle_strikes(params["CLOSEST_PREMINUM"], "NIFTY")
+    tag = f"sweep{session}"
+    order_mgr = order_manager.OrderManager(
+        client,
+        {"QTY": 50, "SL_FACTOR": params["SL_FACTOR"], "SL_ORDER_GAP": 0.0},
+    )
+    row_of = {int(code): row for row, code in enumerate(codes)}
+    with virtual_time(clock, [order_manager]):
+        order_mgr.place_short(strikes, tag)
+        order_mgr.place_short_stop_loss_v2(tag)
+        legs = {
+            code: (detail["Avg"], detail["Qty"])
+            for code, detail in order_mgr.aggregate_sl_orders(
+                tag, params["SL_FACTOR"]
+            ).items()
+        }
+        minute = entry + 1
+        while minute < exit_minute:
+            stopped = {
+                row["ScripCode"]: row for row in client.get_pnl_summary("sl" + tag)
+            }
+            open_legs = {k: v for k, v in legs.items() if k not in stopped}
+            mtm = sum(
+                (legs[code][0] - row["Rate"]) * legs[code][1]
+                for code, row in stopped.items()
+            ) + sum(
+                (avg - prices[row_of[code], minute]) * qty
+                for code, (avg, qty) in open_legs.items()
+            )
+            if not open_legs or mtm > params["TARGET"]:
+                break
+            clock.advance_to(chains["session_time"][session] + minute * 60)
+            for code in open_legs:
+                client.match_price(code, prices[row_of[code], minute], clock.time())
+            minute += 1
+        if not open_legs:
+            return order_mgr.pnl(tag) + order_mgr.pnl("sl" + tag)
+        clock.advance_to(chains["session_time"][session] + minute * 60)
+        ltps = {int(code): float(prices[row, minute]) for code, row in row_of.items()}
+        for code in open_legs:
+            client.match_price(code, ltps[code], clock.time())
+        family = order_mgr.fetch_tag_family_status(tag)
+        open_rows = [row for row in family[tag] if row["ScripCode"] in open_legs]
+        order_mgr.squareoff(tag=tag, strikes=ltps, order_status=open_rows)
+        order_mgr.squareoff_sl_order(tag=tag, order_status=family["sl" + tag])
+        return sum(order_mgr.pnl(item) for item in (tag, "sl" + tag, "sq" + tag))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sessions", type=int, nargs="?", default=250)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    frame = make_chains(args.sessions)
+    chains = sweep.pack_chains(frame)
+    print(
+        f"{args.sessions} sessions, {len(chains['codes'])} contracts, "
+        f"{chains['prices'].nbytes / 2**20:.1f} MB of prices, "
+        f"built in {time.perf_counter() - started:.2f}s"
+    )
+
+    manager = StrikesManager(None, {})
+    for point in sweep.expand_grid(GRID)[::7]:
+        for session in range(min(args.sessions, 40)):
+            expected = reference_session(chains, session, point, manager, {})
+            actual, _ = sweep.simulate_session(chains, session, point, manager, {})
+            assert abs(expected - actual) < 1e-6, (point, session, expected, actual)
+    print("Vectorized event scan matches the minute by minute replay")
+
+    points = len(sweep.expand_grid(GRID))
+    timings = {}
+    serial = None
+    for workers in [0] + sorted(set(args.workers)):
+        started = time.perf_counter()
+        ranked = sweep.run_sweep(chains, GRID, workers=workers)
+        timings[workers] = time.perf_counter() - started
+        ## same table whatever the pool size
+        serial = ranked if serial is None else serial
+        assert ranked["total_pnl"].tolist() == serial["total_pnl"].tolist()
+        print(
+            f"workers={workers}: {points} points in {timings[workers]:.2f}s, "
+            f"{points / timings[workers]:.1f} points/s"
+        )
+    print(f"({os.cpu_count()} cores)")
+    print(
+        ranked.head(10)[
+            ["rank"]
+            + list(sweep.GRID_KEYS)
+            + ["total_pnl", "win_rate", "max_drawdown", "stop_losses", "targets"]
+        ].to_string(index=False)
+    )
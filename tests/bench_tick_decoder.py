@@ -0,0 +1,96 @@
+## Author : Prashant Srivastava
+## Benchmark: legacy on_message decoding vs the pluggable tick decoders
+## Usage: python -m tests.bench_tick_decoder --scrips 200 --frames 2000
+import argparse
+import json
+import random
+import time
+
+from src.common import tick_decoder
+
+
+def make_frame(scrip_codes: list, now: int) -> str:
+    ticks = []
+    for code in scrip_codes:
+        ticks.append(
+            {
+                "Exch": "N",
+                "ExchType": "D",
+                "Token": code,
+                "LastRate": round(random.uniform(4, 50), 2),
+                "LastQty": random.randint(100, 1000),
+                "TotalQty": random.randint(1000000, 10000000),
+                "High": round(random.uniform(100, 150), 2),
+                "Low": round(random.uniform(50, 100), 2),
+                "OpenRate": round(random.uniform(50, 100), 2),
+                "PClose": round(random.uniform(50, 100), 2),
+                "AvgRate": round(random.uniform(100, 150), 2),
+                "Time": now,
+                "BidQty": random.randint(10, 50),
+                "BidRate": round(random.uniform(100, 150), 2),
+                "OffQty": random.randint(800, 1200),
+                "OffRate": round(random.uniform(100, 150), 2),
+                "TBidQ": random.randint(100000, 200000),
+                "TOffQ": random.randint(100000, 200000),
+                "TickDt": f"/Date({now}000)/",
+                "ChgPcnt": round(random.uniform(-2, 2), 5),
+            }
+        )
+    return json.dumps(ticks)
+
+
+## Copy of the decoding done by LiveFeedManager.monitor before tick_decoder
+def legacy_decode(message: str) -> list:
+    ticks = []
+    json_msg = json.loads(message)
+    for msg in json_msg:
+        if "Status" in msg:
+            continue
+        if "LastRate" in msg:
+            ticks.append(
+                {
+                    "o": msg["OpenRate"],
+                    "h": msg["High"],
+                    "l": msg["Low"],
+                    "c": msg["LastRate"],
+                    "v": msg["LastQty"],
+                    "code": msg["Token"],
+                    "t": int(msg["TickDt"][6:-2]) / 1000,
+                    "ChgPcnt": msg["ChgPcnt"],
+                }
+            )
+    return ticks
+
+
+def run(name: str, decode, frames: list, ticks_per_frame: int):
+    start = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    elapsed = time.perf_counter() - start
+    ticks = len(frames) * ticks_per_frame
+    print(
+        f"{name:<24} {len(frames) / elapsed:>12.0f} frames/s {ticks / elapsed:>12.0f} ticks/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scrips", type=int, default=200, help="Ticks per frame")
+    parser.add_argument("--frames", type=int, default=2000, help="Frames to decode")
+    args = parser.parse_args()
+
+    codes = [200000000 + i for i in range(args.scrips)]
+    base = int(time.time())
+    all_frames = [make_frame(codes, base + i) for i in range(args.frames)]
+
+    run("legacy json+dict", legacy_decode, all_frames, args.scrips)
+    for backend in tick_decoder.TickDecoder.BACKENDS:
+        for kind in tick_decoder.DECODERS:
+            try:
+                decoder = tick_decoder.create_decoder(
+                    {"tick_decoder": kind, "json_backend": backend}
+                )
+            except ValueError as exp:
+                print(f"{kind}/{backend:<18} skipped: {exp}")
+                continue
+            run(f"{kind}/{backend}", decoder.decode, all_frames, args.scrips)
@@ -0,0 +1,128 @@
+## Author : Prashant Srivastava
+## Benchmark: legacy trade book scans vs TradeBookIndex joins on a synthetic
+## trade book. Usage: python -m tests.bench_trade_book --rows 10000
+import argparse
+import random
+import time
+
+from src.common.trade_book_index import TradeBookIndex
+
+
+## Orders of many tags, each order filled in one to three trades
+def synthetic_book(num_rows: int, num_tags: int = 200):
+    trade_book = []
+    order_status = []
+    eoid = 1100000000000000
+    while len(trade_book) < num_rows:
+        eoid += 1
+        tag = f"p0wss{random.randrange(num_tags)}"
+        scrip = random.randrange(40000, 40400)
+        order_status.append(
+            {
+                "ExchOrderID": eoid,
+                "RemoteOrderID": tag,
+                "ScripCode": scrip,
+                "PendingQty": 0,
+                "Status": "Fully Executed",
+            }
+        )
+        for _ in range(random.randint(1, 3)):
+            trade_book.append(
+                {
+                    "ExchOrderID": str(eoid),
+                    "ScripCode": scrip,
+                    "Rate": round(random.uniform(5, 200), 2),
+                    "Qty": 50 * random.randint(1, 4),
+                    "BuySell": random.choice("BS"),
+                    "ExchType": "D",
+                    "DelvIntra": "I",
+                    "ScripName": f"NIFTY {scrip}",
+                }
+            )
+    return trade_book[:num_rows], order_status
+
+
+def tag_order_ids(order_status, tag):
+    return [x["ExchOrderID"] for x in order_status if x["RemoteOrderID"] == tag]
+
+
+## The joins of OrderManager.squareoff/aggregate_sl_orders and
+## Client.get_pnl_summary before TradeBookIndex
+def legacy_squareoff_join(trade_book, exchange_order_list):
+    trades = []
+    for eoid in exchange_order_list:
+        for trade in trade_book:
+            if eoid == int(trade["ExchOrderID"]):
+                trades.append(trade)
+    return trades
+
+
+def legacy_aggregate(trade_book, exch_order_ids):
+    sl_details = {}
+    for items in trade_book:
+        if int(items["ExchOrderID"]) not in exch_order_ids:
+            continue
+        scrip_code = items["ScripCode"]
+        if scrip_code not in sl_details:
+            sl_details[scrip_code] = {"Rate": 0, "Qty": 0, "Premium": 0, "Avg": 0}
+        sl_details[scrip_code]["Rate"] += items["Rate"]
+        sl_details[scrip_code]["Qty"] += items["Qty"]
+        sl_details[scrip_code]["Premium"] += items["Rate"] * items["Qty"]
+        sl_details[scrip_code]["Avg"] = (
+            sl_details[scrip_code]["Premium"] / sl_details[scrip_code]["Qty"]
+        )
+    return sl_details
+
+
+def legacy_pnl_filter(trade_book, exch_order_ids):
+    return [
+        trade for trade in trade_book if int(trade["ExchOrderID"]) in exch_order_ids
+    ]
+
+
+def timed(name: str, func, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:<40} {elapsed * 1e6:>10.1f} us/call")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    book, status = synthetic_book(args.rows)
+    ids = tag_order_ids(status, "p0wss7")
+    all_ids = [x["ExchOrderID"] for x in status[: len(status) // 2]]
+    index = TradeBookIndex(book)
+
+    timed("build index", lambda: TradeBookIndex(book), args.rounds)
+    legacy = timed(
+        "legacy squareoff join", lambda: legacy_squareoff_join(book, ids), args.rounds
+    )
+    fast = timed("indexed squareoff join", lambda: index.for_exch_orders(ids), 1000)
+    assert sorted(map(id, legacy)) == sorted(map(id, fast))
+    legacy = timed(
+        "legacy aggregate_sl_orders", lambda: legacy_aggregate(book, ids), args.rounds
+    )
+    fast = timed(
+        "indexed aggregate_sl_orders",
+        lambda: TradeBookIndex.aggregate(index.for_exch_orders(ids)),
+        1000,
+    )
+    assert legacy == fast, (legacy, fast)
+    legacy = timed(
+        "legacy get_pnl_summary (all tags)",
+        lambda: legacy_pnl_filter(book, all_ids),
+        1,
+    )
+    fast = timed(
+        "indexed get_pnl_summary (all tags)",
+        lambda: TradeBookIndex(book).for_exch_orders(all_ids),
+        args.rounds,
+    )
+    assert legacy == fast
@@ -9,6 +9,7 @@ import pandas as pd
 import requests
 
 from src.clients.client_5paisa import Client as Client5Paisa
+from src.clients.rate_limiter import RateLimitedClient, RequestScheduler
 
 
 class EMA5Strategy(bt.Strategy):
@@ -316,11 +317,16 @@ if __name__ == "__main__":
     lot_sizes = scrip_df["LotSize"].tolist()
     full_names = scrip_df["FullName"].tolist()
 
-    client = Client5Paisa()
-    client.login()
+    ## History downloads go through the broker rate limits, the scheduler
+    ## paces them instead of having them rejected
+    client = RateLimitedClient(
+        Client5Paisa().login(),
+        RequestScheduler({"quotas": {"historical": [3.0, 3.0]}}),
+    )
     user_data = {"scrips": {}}
     total_profit = 0
     investment = 100000
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
         executor.map(worker, scrip_codes, lot_sizes, full_names)
+    logging.info("Scheduler stats %s", client.scheduler.get_stats())
@@ -0,0 +1,77 @@
+## Author : Prashant Srivastava
+## Exercise PooledSession against a local HTTP stub server: keep-alive reuse of
+## pooled connections, per endpoint timeouts and latency histograms.
+## Usage: python -m tests.http_transport_test
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.clients.http_transport import PooledSession
+
+logging.basicConfig(level=logging.INFO)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = set()
+    lock = threading.Lock()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        with StubHandler.lock:
+            StubHandler.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("SlowRequest"):
+            time.sleep(1.0)
+        body = json.dumps({"body": {"Message": "Success"}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/VendorsAPI/Service1.svc"
+
+    session = PooledSession(
+        {"pool_size": 4, "pool_block": True, "timeouts": {"SlowRequest": 0.2}}
+    )
+
+    ## 200 calls from 8 threads share at most 4 connections
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(
+            pool.map(
+                lambda i: session.post(
+                    f"{base}/V{1 + i % 2}/{'OrderStatus' if i % 2 else 'TradeBook'}",
+                    json={"i": i},
+                ).json(),
+                range(200),
+            )
+        )
+    assert all(item["body"]["Message"] == "Success" for item in results)
+    logging.info("200 requests over %d connections", len(StubHandler.connections))
+    assert len(StubHandler.connections) <= 4
+
+    ## Per endpoint timeout
+    try:
+        session.post(f"{base}/V1/SlowRequest", json={})
+        raise AssertionError("SlowRequest should have timed out")
+    except requests.exceptions.Timeout:
+        logging.info("SlowRequest timed out as configured")
+
+    stats = session.get_latency_stats()
+    logging.info("Latency per endpoint:\n%s", json.dumps(stats, indent=2))
+    assert stats["OrderStatus"]["count"] == 100
+    assert stats["TradeBook"]["count"] == 100
+    assert stats["SlowRequest"]["count"] == 1
+    server.shutdown()
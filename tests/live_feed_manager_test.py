@@ -54,7 +54,7 @@ def straddle_calculator(res: Dict, user_data: Dict):
             sm = strikes_manager.StrikesManager(client, {})
             strike = sm.strangle_strikes(total_pnl / 2, "FINNIFTY")
             ## Subscribe to the strike
-            lm.subscribe(scrip_code=[strike["ce_code"], strike["pe_code"]])
+            lm.subscribe(scrip_codes=[strike["ce_code"], strike["pe_code"]])
             ## Update the start time
             user_data["start_time"] = time.time()
 
@@ -0,0 +1,58 @@
+## Author : Prashant Srivastava
+## Logging off the caller's path: a deliberately slow handler behind the queue
+## pipeline must not slow down decorated (order) calls, arguments are logged as
+## they were at the call, latency is captured per call and hot path logs are
+## sampled.
+## Usage: python -m tests.log_pipeline_test
+import logging
+import time
+
+from src.clients import log_decorator
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        time.sleep(0.01)  # a slow disk or console
+        self.lines.append(self.format(record))
+
+
+class Broker:
+    # pylint: disable=too-few-public-methods
+    @log_decorator.log_function_call
+    def place_order(self, **order):
+        return {"Message": "Success", "Qty": order["Qty"]}
+
+
+if __name__ == "__main__":
+    handler = SlowHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    log_decorator.start_queue_logging([handler], logging.INFO)
+
+    broker = Broker()
+    start = time.perf_counter()
+    for i in range(50):
+        broker.place_order(ScripCode=201945003, Qty=50, Price=100.0 + i)
+    elapsed = time.perf_counter() - start
+    print(f"50 logged orders in {elapsed * 1000:.2f} ms, handler needs 500 ms")
+    assert elapsed < 0.25
+
+    ## Mutated after the call, logged as it was
+    order = {"ScripCode": 201945003, "Qty": 50}
+    logging.getLogger("order").info("Placing %s", order)
+    order["Qty"] = 75
+
+    sampler = log_decorator.LogSampler(logging.getLogger("hot"), every=100)
+    for i in range(1000):
+        sampler.log(logging.INFO, "Tick Queue Size:%d", i)
+
+    log_decorator.stop_queue_logging()
+    assert len(handler.lines) == 50 + 1 + 10, len(handler.lines)
+    assert "Broker.place_order(ScripCode=201945003, Qty=50" in handler.lines[0]
+    assert "'Qty': 50" in handler.lines[50], handler.lines[50]
+    stats = log_decorator.get_call_stats()["Broker.place_order"]
+    print(f"place_order calls {stats['count']}, mean {stats['mean'] * 1e6:.1f} us")
+    assert stats["count"] == 50
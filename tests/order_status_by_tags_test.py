@@ -0,0 +1,75 @@
+## Author : Prashant Srivastava
+## Tag family status on 5paisa shaped order status rows: the paper broker with
+## RemoteOrderID dropped from fetch_order_status, as the real OrdStatusResLst
+## (resources/sample_schemas/5paisa.js). The rows are split by tag through the
+## order book, or tag by tag while an order has no ExchOrderID yet.
+## Usage: python -m tests.order_status_by_tags_test
+import logging
+
+from src.clients.client_paper import Client
+from src.common.order_manager import OrderManager
+
+logging.basicConfig(level=logging.WARNING)
+
+CE_CODE = 201945003
+PE_CODE = 301945003
+
+
+class FivePaisaShapedClient(Client):
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.requests = []
+        # ExchOrderIDs reported as "0", orders not at the exchange yet
+        self.unsent = set()
+
+    def fetch_order_status(self, req_list):
+        self.requests.append([req["RemoteOrderID"] for req in req_list])
+        rows = []
+        for row in super().fetch_order_status(req_list)["OrdStatusResLst"]:
+            row = {key: value for key, value in row.items() if key != "RemoteOrderID"}
+            if row["ExchOrderID"] in self.unsent:
+                row["ExchOrderID"] = 0
+            rows.append(row)
+        return {"OrdStatusResLst": rows}
+
+
+if __name__ == "__main__":
+    client = FivePaisaShapedClient()
+    client.push_price(CE_CODE, 100.0)
+    client.push_price(PE_CODE, 90.0)
+    order_manager = OrderManager(
+        client, {"QTY": 50, "FILL_TIMEOUT": 1.0, "SL_ORDER_GAP": 0}
+    )
+    tag = "t1"
+    assert order_manager.place_short(
+        {"ce_code": CE_CODE, "ce_ltp": 100.0, "pe_code": PE_CODE, "pe_ltp": 90.0},
+        tag,
+    )
+    order_manager.place_short_stop_loss_v2(tag)
+
+    ## One status request, split on ExchOrderID against the order book
+    client.requests.clear()
+    family = order_manager.fetch_tag_family_status(tag)
+    assert client.requests == [[tag, "sl" + tag, "sq" + tag]], client.requests
+    assert {len(rows) for rows in family.values()} == {2, 0}, family
+    assert len(family[tag]) == len(family["sl" + tag]) == 2, family
+    assert all(row["Status"] == "Pending" for row in family["sl" + tag])
+    assert all(row["Status"] == "Fully Executed" for row in family[tag])
+
+    ## A row without ExchOrderID can't be joined: one request per tag
+    client.unsent.add(family["sl" + tag][0]["ExchOrderID"])
+    client.requests.clear()
+    family = order_manager.fetch_tag_family_status(tag)
+    assert client.requests[1:] == [[tag], ["sl" + tag], ["sq" + tag]]
+    assert len(family[tag]) == len(family["sl" + tag]) == 2, family
+    client.unsent.clear()
+
+    ## Square off and cancel the stop losses found through the split
+    order_manager.squareoff_with_sl(tag, {CE_CODE: 100.0, PE_CODE: 90.0})
+    family = order_manager.fetch_tag_family_status(tag)
+    assert len(family["sq" + tag]) == 2, family
+    assert all(row["Status"] != "Pending" for row in family["sl" + tag]), family
+    assert all(
+        row["BuyQty"] == row["SellQty"] for row in client.positions()
+    ), client.positions()
+    print("Tag family status split on 5paisa shaped rows")
@@ -0,0 +1,83 @@
+## Author : Prashant Srivastava
+## Runs the real OrderManager against the in-process paper broker: short
+## straddle entry, stop losses, one stop loss hit by the ticks, square off of
+## the rest; then times many such runs, and a LiveFeedManager session served by
+## the in-process feed.
+## Usage: python -m tests.paper_broker_test [runs]
+import logging
+import sys
+import threading
+import time
+
+from src.clients.client_paper import Client
+from src.common.live_feed_manager import LiveFeedManager
+from src.common.order_manager import OrderManager
+
+logging.basicConfig(level=logging.WARNING)
+
+CE_CODE = 201945003
+PE_CODE = 301945003
+
+
+def run_once(run: int) -> float:
+    client = Client({"slippage_ticks": 1})
+    client.push_price(CE_CODE, 100.0)
+    client.push_price(PE_CODE, 90.0)
+    order_manager = OrderManager(
+        client, {"QTY": 50, "FILL_TIMEOUT": 1.0, "SL_ORDER_GAP": 0}
+    )
+    tag = f"p{run}"
+
+    assert order_manager.place_short(
+        {"ce_code": CE_CODE, "ce_ltp": 100.0, "pe_code": PE_CODE, "pe_ltp": 90.0},
+        tag,
+    )
+    order_manager.place_short_stop_loss_v2(tag)
+    family = order_manager.fetch_tag_family_status(tag)
+    assert len(family["sl" + tag]) == 2
+    assert all(item["Status"] == "Pending" for item in family["sl" + tag])
+
+    ## CE rallies through its stop loss trigger (1.65 x entry), within its limit
+    client.push_price(CE_CODE, 164.3)
+    family = order_manager.fetch_tag_family_status(tag)
+    status = {item["ScripCode"]: item["Status"] for item in family["sl" + tag]}
+    assert status == {CE_CODE: "Fully Executed", PE_CODE: "Pending"}, status
+
+    ## Square off the legs, cancel the remaining stop loss
+    client.push_price(PE_CODE, 80.0)
+    order_manager.squareoff_with_sl(tag, {CE_CODE: 164.3, PE_CODE: 80.0})
+    family = order_manager.fetch_tag_family_status(tag)
+    assert all(item["Status"] != "Pending" for item in family["sl" + tag])
+    return sum(item["MTOM"] for item in client.positions())
+
+
+def feed_session():
+    client = Client()
+    feed = LiveFeedManager(client, {"exchangeType": "D"})
+    received = []
+    done = threading.Event()
+
+    def on_scrip_data(tick, _user_data):
+        received.append(tick["c"])
+        if len(received) == 100:
+            done.set()
+
+    feed.monitor([CE_CODE], on_scrip_data)
+    for i in range(100):
+        client.push_price(CE_CODE, 100.0 + i)
+        client.push_price(PE_CODE, 50.0)  # not subscribed, not delivered
+    assert done.wait(5.0)
+    feed.stop()
+    assert received == [100.0 + i for i in range(100)]
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"Single run MTM: {run_once(0):.2f}")
+    start = time.perf_counter()
+    for i in range(runs):
+        run_once(i)
+    elapsed = time.perf_counter() - start
+    print(f"{runs} runs in {elapsed:.2f}s, {runs * 60 / elapsed:.0f} runs per minute")
+    feed_session()
+    print("LiveFeedManager session over the in-process feed OK")
@@ -3,7 +3,9 @@
 ## If the premium difference is less than threshold for given duration,
 ## then place straddle order
 ## If the premium difference is greater than threshold, then keep monitoring
-## until is comes below threshold else exit if straddle strikes change
+## until is comes below threshold, rolling the feed to the new straddle strikes
+## whenever they change. The option chain is seeded once and kept current
+## from the live feed, no REST polling while monitoring
 import datetime
 import json
 import time
@@ -11,6 +13,7 @@ from typing import Dict
 from src.common.strikes_manager import StrikesManager
 from src.clients.client_5paisa import Client as Client5Paisa
 from src.common.live_feed_manager import LiveFeedManager
+from src.common.live_option_chain import LiveOptionChain
 from src.common.order_manager import OrderManager
 
 import logging
@@ -40,93 +43,68 @@ parser.add_argument(
 args = parser.parse_args()
 
 
-def callback(ohlcvt: dict, user_data: Dict = None):
-    if "strikes" not in user_data:
-        user_data["strikes"] = {}
-    strikes_data = user_data["strikes"]
-    strikes_data[ohlcvt["code"]] = ohlcvt
-    ## if two keys are present, then calculate the straddle price
-    if len(strikes_data) == 2:
-        ## diff the two close prices in user_data
-        s1, s2 = strikes_data.keys()
-        price_diff = abs(strikes_data[s1]["c"] - strikes_data[s2]["c"])
-        premium = strikes_data[s1]["c"] + strikes_data[s2]["c"]
-        max_time = max(strikes_data[s1]["t"], strikes_data[s2]["t"])
-        ## convert utc to ist in HH:MM:SS format
-        if max_time > 0:
-            max_time = time.strftime("%H:%M:%S", time.localtime(max_time))
-            user_data["max_time"] = max_time
-            user_data["price_diff"] = price_diff
-            user_data["premium"] = premium
-            logging.info(
-                f"Straddle Premium %.2f Difference %.2f at %s",
-                premium,
-                price_diff,
-                max_time,
-            )
-        else:
-            logging.error("Invalid timestamp %d", max_time)
+def on_atm_change(old_strike: float, new_strike: float, user_data: Dict = None):
+    ## The live chain already rolled the feed to the new window,
+    ## restart the wait for the new straddle
+    user_data["atm_changed"] = True
+    logging.info("ATM strike moved from %.2f to %.2f", old_strike, new_strike)
 
 
 def fetch_straddle_strike(
-    index: str,
-    live_feed_manager: LiveFeedManager,
-    strikes_manager: StrikesManager,
+    live_chain: LiveOptionChain,
     evt: threading.Event,
     user_data: Dict = None,
 ):
     logging.debug("Starting straddle strike fetcher")
-    straddleStrikes = strikes_manager.straddle_strikes(index)
-    live_feed_manager.monitor(
-        [straddleStrikes["ce_code"], straddleStrikes["pe_code"]],
-        on_scrip_data=callback,
-        user_data=user_data,
-    )
+    ## Seeded once over REST, afterwards kept current by the live feed
+    live_chain.start(on_atm_change=on_atm_change, user_data=user_data)
     curr_time = None
-    while live_feed_manager.is_active():
+    while live_chain.live_feed_manager.is_active():
         time.sleep(1)
-        newStrikes = strikes_manager.straddle_strikes(index)
-        if (
-            newStrikes["ce_code"] != straddleStrikes["ce_code"]
-            or newStrikes["pe_code"] != straddleStrikes["pe_code"]
-        ):
-            straddleStrikes = newStrikes
-            live_feed_manager.unsubscribe(
-                [straddleStrikes["ce_code"], straddleStrikes["pe_code"]]
-            )
-            logging.info(
-                f"New strikes are {straddleStrikes}, original monitoring no longer valid"
-            )
-            live_feed_manager.stop()
-            break
-        elif "price_diff" in user_data:
-            ## 5% of premium is the threshold
-            if user_data["diff_threshold"] < 0:
-                threshold = user_data["premium"] * 0.05
-            else:
-                threshold = user_data["diff_threshold"]
-            if user_data["price_diff"] <= threshold:
-                if not curr_time:  ## For the first time
-                    curr_time = datetime.datetime.now()
-                    logging.info(
-                        "Straddle premium difference is less than %f, waiting for %d seconds",
-                        threshold,
-                        user_data["wait"],
-                    )
-                elif datetime.datetime.now() - curr_time > datetime.timedelta(
-                    seconds=user_data["wait"]
-                ):
-                    logging.info(
-                        "Straddle premium difference is less than %f for %d seconds",
-                        threshold,
-                        user_data["wait"],
-                    )
-                    evt.set()
-                    live_feed_manager.stop()
-                    break
-            else:
-                ## Reset the curr_time
-                curr_time = None
+        if user_data.pop("atm_changed", False):
+            curr_time = None
+        _, ce_contract, pe_contract, price_diff = live_chain.atm()
+        premium = ce_contract["ltp"] + pe_contract["ltp"]
+        user_data["strikes"] = {
+            ce_contract["code"]: {"c": ce_contract["ltp"]},
+            pe_contract["code"]: {"c": pe_contract["ltp"]},
+        }
+        user_data["price_diff"] = price_diff
+        user_data["premium"] = premium
+        logging.info(
+            "Straddle %s/%s Premium %.2f Difference %.2f",
+            ce_contract["name"],
+            pe_contract["name"],
+            premium,
+            price_diff,
+        )
+        ## 5% of premium is the threshold
+        if user_data["diff_threshold"] < 0:
+            threshold = premium * 0.05
+        else:
+            threshold = user_data["diff_threshold"]
+        if price_diff <= threshold:
+            if not curr_time:  ## For the first time
+                curr_time = datetime.datetime.now()
+                logging.info(
+                    "Straddle premium difference is less than %f, waiting for %d seconds",
+                    threshold,
+                    user_data["wait"],
+                )
+            elif datetime.datetime.now() - curr_time > datetime.timedelta(
+                seconds=user_data["wait"]
+            ):
+                logging.info(
+                    "Straddle premium difference is less than %f for %d seconds",
+                    threshold,
+                    user_data["wait"],
+                )
+                evt.set()
+                live_chain.stop()
+                break
+        else:
+            ## Reset the curr_time
+            curr_time = None
     if not curr_time:
         ## Release other thread, if curr_time is None,
         # then straddle premium difference is greater than 15
@@ -195,12 +173,11 @@ if __name__ == "__main__":
     logging.info("PID of the script is %d", pid)
     ## Create a live feed manager
     live_feed_manager = LiveFeedManager(client)
+    live_chain = LiveOptionChain(live_feed_manager, strikes_manager, index)
     monitor_thread = threading.Thread(
         target=fetch_straddle_strike,
         args=(
-            index,
-            live_feed_manager,
-            strikes_manager,
+            live_chain,
             signal_short,
             user_data,
         ),
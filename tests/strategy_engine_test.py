@@ -0,0 +1,117 @@
+## Author : Prashant Srivastava
+## Hosts many short straddle strategies in one StrategyEngine over the paper
+## broker's in-process feed: ticks only reach the strategies trading the scrip,
+## fills reach only the strategy owning the tag, all legs share one book.
+## Usage: python -m tests.strategy_engine_test [strategies] [--batch]
+import argparse
+import logging
+import threading
+import time
+from typing import Dict
+
+from src.clients.client_paper import Client
+from src.common.order_manager import OrderManager
+from src.strategy import base_strategy
+from src.strategy.strategy_engine import StrategyEngine
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class PaperStraddle(base_strategy.BaseStrategy):
+    def __init__(self, index: int, strikes: Dict, order_manager, position_book):
+        super().__init__(
+            f"Straddle{index}",
+            [strikes["ce_code"], strikes["pe_code"]],
+            position_book,
+        )
+        self.tag = f"straddle{index}t{int(time.time())}"
+        self.strikes = strikes
+        self.order_manager = order_manager
+        self.ltp = {}
+        self.seen = set()
+        self.done = threading.Event()
+        self.set_mtm_target(250.0 * (1 + index % 3))
+
+    def get_leg_pnl(self, _code: int, avg: float, qty: int, ltp: float):
+        return (avg - ltp) * qty
+
+    def entry(self, _ohlcvt: Dict) -> bool:
+        return len(self.ltp) == 2
+
+    def run(self, ohlcvt: Dict, user_data: Dict = None):
+        super().run(ohlcvt, user_data)
+        self.seen.add(ohlcvt["code"])
+        self.ltp[ohlcvt["code"]] = ohlcvt["c"]
+        state = self.get_strategy_state()
+        if state == base_strategy.StrategyState.WAITING and self.entry(ohlcvt):
+            self.set_strategy_state(base_strategy.StrategyState.PLACED)
+            strikes = dict(self.strikes)
+            strikes.update(
+                ce_ltp=self.ltp[strikes["ce_code"]],
+                pe_ltp=self.ltp[strikes["pe_code"]],
+            )
+            self.order_manager.place_short(strikes, self.tag)
+        elif state == base_strategy.StrategyState.EXECUTED and self.exit(ohlcvt):
+            self.order_manager.squareoff(tag=self.tag, strikes=dict(self.ltp))
+            self.set_strategy_state(base_strategy.StrategyState.STOPPED)
+            self.done.set()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.set_strategy_state(base_strategy.StrategyState.STOPPED)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("strategies", type=int, nargs="?", default=30)
+    parser.add_argument("--batch", action="store_true")
+    args = parser.parse_args()
+
+    client = Client({"slippage_ticks": 1})
+    order_manager = OrderManager(
+        client, {"QTY": 50, "FILL_TIMEOUT": 1.0, "FILL_POLL_INTERVAL": 0.01}
+    )
+    config = {"batch_mode": True, "batch_latency": 0.005} if args.batch else {}
+    engine = StrategyEngine(client, config)
+    ## 3 strategies per straddle, so scrips are shared
+    pairs = [(201945003 + 100 * i, 301945003 + 100 * i) for i in range(10)]
+    strategies = [
+        PaperStraddle(
+            index,
+            {"ce_code": pairs[index % 10][0], "pe_code": pairs[index % 10][1]},
+            order_manager,
+            engine.position_book,
+        )
+        for index in range(args.strategies)
+    ]
+    for strategy in strategies:
+        engine.register(strategy)
+    engine.start()
+
+    ## Flat premiums for the entries, then they decay and every target gets hit
+    start = time.perf_counter()
+    for step in range(300):
+        decay = max(step - 100, 0) * 0.1
+        for ce_code, pe_code in pairs:
+            client.push_price(ce_code, 100.0 - decay)
+            client.push_price(pe_code, 90.0 - decay)
+        time.sleep(0.002)
+    assert all(strategy.done.wait(5.0) for strategy in strategies)
+    elapsed = time.perf_counter() - start
+    stats = engine.get_stats()
+    engine.stop()
+
+    for strategy in strategies:
+        assert strategy.seen <= set(strategy.strikes.values())
+        tags = {order["RemoteOrderID"] for order in client.order_book()}
+        assert {strategy.tag, "sq" + strategy.tag} <= tags
+        assert strategy.get_pnl() > strategy.get_mtm_target()
+    print(
+        f"{args.strategies} strategies, {stats['ticks']} ticks, "
+        f"{stats['dispatches']} dispatches in {elapsed:.2f}s; "
+        f"{len(client.order_book())} orders"
+    )
+    mtm = engine.position_book.mtm_by_strategy().values()
+    print(f"Book MTM per strategy: min {min(mtm):.2f} max {max(mtm):.2f}")
@@ -9,6 +9,7 @@ from typing import Dict
 from src.strategy import base_strategy
 from src.common import live_feed_manager
 from src.common import order_manager
+from src.common import order_tracker
 from src.common import strikes_manager
 
 # from clients.client_dummy import Client as Client5Paisa
@@ -153,15 +154,14 @@ class StrangleStrategy(base_strategy.BaseStrategy):
                     self.set_strategy_state(base_strategy.StrategyState.SQUAREDOFF)
                     self.logger.info("Squaring off the trade")
                     ## Square off both legs. Square off needs the ltp of the scrip
-                    self.order_manager.squareoff(
+                    ## and cancel the sl orders, one order status request for both
+                    self.order_manager.squareoff_with_sl(
                         tag=self.tag,
                         strikes={
                             code: all_executed_orders[code]["ltp"]
                             for code in all_executed_orders
                         },
                     )
-                    self.logger.info("Cancelling off the sl order")
-                    self.order_manager.squareoff_sl_order(tag=self.tag)
                     ## Unsubscribe from the strikes
                     self.feed_manager.unsubscribe(scrip_codes=self.scrip_codes)
                     self.feed_manager.stop()
@@ -267,8 +267,11 @@ if __name__ == "__main__":
     ## Get config from argparse
     ## Create live feed and start the strategy monitor
     live_feed = live_feed_manager.LiveFeedManager(client, config)
+    ## Track fills from the order updates pushed on the same feed
+    tracker = order_tracker.OrderTracker()
+    tracker.attach(live_feed)
     ## Create order manager
-    om = order_manager.OrderManager(client, config)
+    om = order_manager.OrderManager(client, config, order_tracker=tracker)
     ## Create strikes manager
     sm = strikes_manager.StrikesManager(client, config)
     try:
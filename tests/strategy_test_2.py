@@ -100,14 +100,13 @@ class StrangleStrategy(base_strategy.BaseStrategy):
             if self.exit(ohlcvt):
                 ## Square off both legs. Square off needs the ltp of the scrip
                 all_executed_orders = self.get_all_executed_orders()
-                self.order_manager.squareoff(
+                self.order_manager.squareoff_with_sl(
                     tag=self.tag,
                     strikes={
                         code: all_executed_orders[code]["ltp"]
                         for code in all_executed_orders
                     },
                 )
-                self.order_manager.squareoff_sl_order(tag=self.tag)
                 ## Unsubscribe from the strikes
                 self.feed_manager.unsubscribe(scrip_codes=self.scrip_codes)
                 self.feed_manager.stop()